@@ -3,6 +3,7 @@ from api.v1.competencies import router as competencies_router
 from api.v1.comments import router as comments_router
 from api.v1.auth import router as auth_router
 from api.v1.users import router as users_router
+from api.v1.admin import router as admin_router
 
 router = APIRouter()
 
@@ -26,4 +27,9 @@ router.include_router(
     tags=["users"]
 )
 
+router.include_router(
+    admin_router,
+    tags=["admin"]
+)
+
 __all__ = ["router"]
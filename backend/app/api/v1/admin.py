@@ -0,0 +1,73 @@
+from typing import List
+from dependency_injector import wiring
+from fastapi import APIRouter, Depends, HTTPException
+import logging
+
+from dao.sparql import reset_template_stats, template_stats
+from models.admin import BulkheadStats, PasswordHasherStats, SparqlTemplateStats
+from services.bulkhead import Bulkhead
+from services.password_hasher import PasswordHasher
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/admin/sparql/stats", response_model=List[SparqlTemplateStats])
+async def get_sparql_stats() -> List[dict]:
+    """
+    Счётчики SPARQL-запросов по шаблонам: число вызовов, ошибок, строк и время выполнения.
+    Отсортированы по суммарному времени - сверху шаблоны, которые больше всего нагружают GraphDB.
+    """
+    try:
+        return template_stats()
+    except Exception as e:
+        logger.error(f"Error getting SPARQL stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/admin/sparql/stats")
+async def reset_sparql_stats() -> dict:
+    """Сбросить счётчики SPARQL-запросов (например, перед замером нагрузки)"""
+    try:
+        reset_template_stats()
+        logger.info("SPARQL template stats reset")
+        return {"status": "success"}
+    except Exception as e:
+        logger.error(f"Error resetting SPARQL stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/password-hasher/stats", response_model=PasswordHasherStats)
+@wiring.inject
+async def get_password_hasher_stats(
+    password_hasher: PasswordHasher = Depends(wiring.Provide["password_hasher"]),
+) -> dict:
+    """
+    Метрики пула хеширования паролей (регистрация и вход).
+    Рост rejected и avg_wait_ms - сигнал увеличить PASSWORD_HASH_WORKERS/PASSWORD_HASH_QUEUE.
+    """
+    try:
+        return password_hasher.stats()
+    except Exception as e:
+        logger.error(f"Error getting password hasher stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/bulkheads", response_model=List[BulkheadStats])
+@wiring.inject
+async def get_bulkhead_stats(
+    graphdb_bulkhead: Bulkhead = Depends(wiring.Provide["graphdb_bulkhead"]),
+    graphdb_stream_bulkhead: Bulkhead = Depends(wiring.Provide["graphdb_stream_bulkhead"]),
+    postgres_bulkhead: Bulkhead = Depends(wiring.Provide["postgres_bulkhead"]),
+    redis_bulkhead: Bulkhead = Depends(wiring.Provide["redis_bulkhead"]),
+) -> List[dict]:
+    """
+    Загрузка и очереди bulkhead по бэкендам (GraphDB и его потоковые чтения, PostgreSQL, Redis).
+    rejected_queue_full и shed_deadline - запросы, получившие 503 из-за перегрузки бэкенда.
+    """
+    try:
+        bulkheads = (graphdb_bulkhead, graphdb_stream_bulkhead, postgres_bulkhead, redis_bulkhead)
+        return [bulkhead.stats() for bulkhead in bulkheads]
+    except Exception as e:
+        logger.error(f"Error getting bulkhead stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -5,6 +5,7 @@ import asyncpg
 import logging
 
 from services.auth import TokenService
+from services.password_hasher import PasswordHasher, PasswordHasherBusy
 from dependencies.config import Config
 import redis.asyncio as redis
 
@@ -37,13 +38,19 @@ class RefreshRequest(BaseModel):
     refresh_token: str
 
 
+def _hasher_busy(e: PasswordHasherBusy) -> HTTPException:
+    """503 с Retry-After: пул bcrypt перегружен, клиенту стоит повторить позже"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
 @router.post("/auth/register", response_model=TokenResponse)
 @wiring.inject
 async def register(
     data: RegisterRequest,
     db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
     redis_client: redis.Redis = Depends(wiring.Provide["redis_client"]),
-    config: Config = Depends(wiring.Provide["config"])
+    config: Config = Depends(wiring.Provide["config"]),
+    password_hasher: PasswordHasher = Depends(wiring.Provide["password_hasher"])
 ):
     """Регистрация нового пользователя"""
     token_service = TokenService(redis_client, config)
@@ -57,8 +64,11 @@ async def register(
         logger.warning(f"Registration attempt for existing user: {data.email}")
         raise HTTPException(status_code=400, detail="User already exists")
 
-    # Хешируем пароль
-    hashed_password = token_service.hash_password(data.password)
+    # Хешируем пароль в отдельном пуле, не блокируя цикл событий
+    try:
+        hashed_password = await password_hasher.run(token_service.hash_password, data.password)
+    except PasswordHasherBusy as e:
+        raise _hasher_busy(e)
 
     # Создаем пользователя
     user = await db_pool.fetchrow(
@@ -89,7 +99,8 @@ async def login(
     data: LoginRequest,
     db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
     redis_client: redis.Redis = Depends(wiring.Provide["redis_client"]),
-    config: Config = Depends(wiring.Provide["config"])
+    config: Config = Depends(wiring.Provide["config"]),
+    password_hasher: PasswordHasher = Depends(wiring.Provide["password_hasher"])
 ):
     """Вход пользователя"""
     token_service = TokenService(redis_client, config)
@@ -103,8 +114,14 @@ async def login(
         logger.warning(f"Login attempt for non-existent user: {data.email}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # Проверяем пароль
-    if not token_service.verify_password(data.password, user["password_hash"]):
+    # Проверяем пароль в отдельном пуле, не блокируя цикл событий
+    try:
+        password_valid = await password_hasher.run(
+            token_service.verify_password, data.password, user["password_hash"]
+        )
+    except PasswordHasherBusy as e:
+        raise _hasher_busy(e)
+    if not password_valid:
         logger.warning(f"Failed login attempt for user: {data.email}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
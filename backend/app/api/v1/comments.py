@@ -1,46 +1,139 @@
-from fastapi import APIRouter, Request
+from typing import Any, Optional
+
+from dependency_injector import wiring
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
 import logging
 
 from dao.comments import CommentsDAO
-from models.comments import Comment
+from dao.competency_dao import CompetencyDAO
+from models.comments import (
+    MAX_TEXT_INDEX,
+    Comment,
+    CommentBatchItem,
+    CommentBatchResponse,
+    CommentCountsRequest,
+    CommentCountsResponse,
+)
 from dependencies.auth import get_current_user_email
+from services.bulkhead import bulk_priority
+from services.graph_snapshot import GraphSnapshotCache
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Максимум комментариев в одном запросе
+MAX_COMMENTS_BATCH = 1000
+# Максимум триплетов в одном запросе счётчиков
+MAX_COUNT_TRIPLES = 10000
+
+
+def _validation_error(e: ValidationError) -> str:
+    """Ошибки валидации одного элемента в одну строку"""
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in error['loc']) or 'item'}: {error['msg']}"
+        for error in e.errors()
+    )
+
+
 @router.post("/comments", response_model=list[Comment])
 async def create_comments(
     request: Request,
     data: list[Comment]
 ):
-    """Создать комментарии к RDF триплетам"""
+    """Создать комментарии к RDF триплетам (одним запросом к БД, в порядке входного списка)"""
+    if len(data) > MAX_COMMENTS_BATCH:
+        raise HTTPException(status_code=400, detail=f"Too many comments: {len(data)} > {MAX_COMMENTS_BATCH}")
+
     # Получаем email текущего пользователя из JWT токена
     author = get_current_user_email(request)
 
     logger.info(f"Creating {len(data)} comment(s) by {author}")
 
-    comments = []
-    for comment_data in data:
-        comment = await CommentsDAO.create(
-            filename=comment_data.filename,
-            start_index=comment_data.start_index,
-            end_index=comment_data.end_index,
-            subject=comment_data.subject,
-            predicate=comment_data.predicate,
-            object_=comment_data.object,
-            author=author,  # Используем автора из JWT
-            created_at=comment_data.created_at
-        )
-        comments.append(Comment.model_validate(comment))
-
-    return comments
+    comments = await CommentsDAO.create_many(data, author=author)  # Используем автора из JWT
+    return [Comment.model_validate(comment) for comment in comments]
+
+
+@router.post("/comments/batch", response_model=CommentBatchResponse, dependencies=[Depends(bulk_priority)])
+async def create_comments_batch(
+    request: Request,
+    data: list[Any] = Body(...)
+):
+    """
+    Создать пачку комментариев с валидацией каждого элемента.
+    Невалидные элементы не прерывают пачку: для них возвращается ошибка,
+    остальные создаются одним запросом к БД. Результаты - в порядке входного списка.
+    """
+    if len(data) > MAX_COMMENTS_BATCH:
+        raise HTTPException(status_code=400, detail=f"Too many comments: {len(data)} > {MAX_COMMENTS_BATCH}")
+
+    author = get_current_user_email(request)
+
+    items: list[CommentBatchItem] = []
+    valid: list[tuple[int, Comment]] = []
+    for index, raw in enumerate(data):
+        try:
+            valid.append((index, Comment.model_validate(raw)))
+            items.append(CommentBatchItem(index=index))
+        except ValidationError as e:
+            items.append(CommentBatchItem(index=index, error=_validation_error(e)))
+
+    logger.info(f"Creating {len(valid)} of {len(data)} comment(s) by {author}")
+
+    created = await CommentsDAO.create_many([comment for _, comment in valid], author=author)
+    for (index, _), comment in zip(valid, created):
+        items[index].comment = Comment.model_validate(comment)
+
+    return CommentBatchResponse(created=len(created), failed=len(data) - len(created), items=items)
+
+
+@router.post("/comments/counts", response_model=CommentCountsResponse)
+@wiring.inject
+async def count_comments(
+    data: CommentCountsRequest,
+    snapshot_cache: GraphSnapshotCache = Depends(wiring.Provide["graph_snapshot"]),
+):
+    """
+    Количество комментариев и время последнего комментария по триплетам (для бейджей на рёбрах).
+    Без triples - по всем связям текущего графа. Триплеты без комментариев не возвращаются.
+    """
+    if data.triples is not None:
+        if len(data.triples) > MAX_COUNT_TRIPLES:
+            raise HTTPException(status_code=400, detail=f"Too many triples: {len(data.triples)} > {MAX_COUNT_TRIPLES}")
+        triples = {(t.subject, t.predicate, t.object) for t in data.triples}
+    else:
+        try:
+            snapshot = await snapshot_cache.get(CompetencyDAO.load_graph_view)
+        except Exception as e:
+            logger.error(f"Error fetching graph for comment counts: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        triples = {(link["source"], link["predicate"], link["target"]) for link in snapshot.payload["links"]}
+
+    logger.info(f"Counting comments for {len(triples)} triple(s)")
+    counts = await CommentsDAO.count_by_triples(list(triples))
+    return CommentCountsResponse(counts=counts)
+
 
 @router.get("/comments/{filename}", response_model=list[Comment])
 async def get_comments(
     filename: str,
-    limit: int = 20
+    limit: int = 20,
+    range_from: Optional[int] = Query(None, alias="from", ge=0, le=MAX_TEXT_INDEX, description="Начало диапазона символов"),
+    range_to: Optional[int] = Query(None, alias="to", ge=0, le=MAX_TEXT_INDEX, description="Конец диапазона символов (не включается)"),
 ):
-    """Получить список комментариев для указанного файла"""
-    logger.info(f"Fetching comments for file: {filename} (limit={limit})")
-    comments = await CommentsDAO.get_by_filename(filename, limit)
+    """
+    Получить список комментариев для указанного файла.
+    С параметрами from/to - только комментарии, пересекающиеся с диапазоном [from, to)
+    (при from == to - содержащие позицию from), по порядку в тексте; без них - последние созданные.
+    """
+    if range_from is None and range_to is None:
+        logger.info(f"Fetching comments for file: {filename} (limit={limit})")
+        comments = await CommentsDAO.get_by_filename(filename, limit)
+        return [Comment.model_validate(c) for c in comments]
+
+    if range_from is not None and range_to is not None and range_from > range_to:
+        raise HTTPException(status_code=400, detail=f"Invalid range: from {range_from} > to {range_to}")
+
+    logger.info(f"Fetching comments for file: {filename} in range [{range_from}, {range_to}) (limit={limit})")
+    comments = await CommentsDAO.get_overlapping(filename, range_from, range_to, limit)
     return [Comment.model_validate(c) for c in comments]
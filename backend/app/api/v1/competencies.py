@@ -1,34 +1,193 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, Query, Body, Request
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Body, Request, Depends
+from fastapi.responses import Response, StreamingResponse
+from dependency_injector import wiring
 import logging
-
-from models.graph import GraphResponse, OntologyNode
+import orjson
+
+from models.graph import (
+    GraphChangesResponse,
+    GraphMigrationReport,
+    GraphPartResponse,
+    GraphPatchRequest,
+    GraphPatchResponse,
+    GraphResponse,
+    OntologyNode,
+    PathResponse,
+    PatchOperationType,
+    TriplePatchOperation,
+)
 from dao.competency_dao import CompetencyDAO
 from dao.version_dao import VersionDAO
+from dao.change_log_dao import ChangeLogDAO
+from dao import sparql
 from dependencies.auth import get_current_user_email, get_current_user_id
+from services.bulkhead import Priority, bulk_priority, use_priority
+from services.graph_snapshot import GraphSnapshotCache, GraphVersionConflict, etag_matches
+from services.hierarchy_index import MAX_LEVEL, HierarchyIndex
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Максимум узлов в одном пакетном запросе предков/потомков
+MAX_BATCH_NODES = 1000
+# Максимум операций в одном патче графа
+MAX_PATCH_OPERATIONS = 1000
+# Заголовок с курсором следующей страницы для эндпоинтов, отдающих список
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Записи в граф выполняются по одному: фиксация в GraphDB и _graph_changed (новое поколение
+# снимка) не перемежаются с другими записями, поэтому сохранение графа, проверяющее поколение
+# перед фиксацией, не затрёт запись, которая уже зафиксирована, но ещё не учтена
+_graph_write_lock = asyncio.Lock()
+
+
+@wiring.inject
+async def _graph_changed(
+    user_id: Optional[int],
+    added: Iterable[dict] = (),
+    removed: Iterable[dict] = (),
+    reset: bool = False,
+    reload: bool = False,
+    snapshot_cache: GraphSnapshotCache = Depends(wiring.Provide["graph_snapshot"]),
+    hierarchy_index: HierarchyIndex = Depends(wiring.Provide["hierarchy_index"]),
+) -> None:
+    """
+    Общая обработка записи в граф: обновление снимка и индекса иерархии по дельте
+    и запись в журнал изменений. Вызывается под _graph_write_lock вместе с самой записью.
+    reset - граф очищен; reload - граф изменён не дельтой (перенос данных): снимок
+    и индекс перечитываются из GraphDB, в журнал пишется reset.
+    Изменение в GraphDB уже применено, поэтому запись в журнал идёт с приоритетом CRITICAL
+    (bulkhead PostgreSQL её не сбрасывает), а её ошибка не роняет запрос. Если дельту записать
+    не удалось, в журнал пишется reset: клиенты дельта-синхронизации перезагрузят граф целиком.
+    """
+    added, removed = list(added), list(removed)
+    if reload:
+        reset = True
+        snapshot_cache.invalidate()
+        hierarchy_index.invalidate()
+        try:
+            await CompetencyDAO.load_hierarchy_index()
+        except Exception as e:
+            # Индекс остаётся выключенным: запросы иерархии идут в GraphDB
+            logger.error(f"Failed to reload hierarchy index: {e}")
+    else:
+        snapshot_cache.apply(CompetencyDAO.graph_rows(added), CompetencyDAO.graph_rows(removed), reset)
+        hierarchy_index.apply(added, removed, reset)
+    with use_priority(Priority.CRITICAL):
+        try:
+            if reset:
+                await ChangeLogDAO.record_reset(user_id)
+            else:
+                await ChangeLogDAO.record(user_id, added=added, removed=removed)
+            return
+        except Exception as e:
+            logger.error(f"Failed to record graph changes: {e}")
+        if not reset:
+            try:
+                await ChangeLogDAO.record_reset(user_id)
+                logger.warning("Recorded a graph reset instead of the lost changes")
+            except Exception as e:
+                logger.error(f"Failed to record graph reset: {e}")
+
 
-@router.get("/competencies/graph", response_model=GraphResponse)
-async def get_graph() -> dict:
-    """Получить весь граф компетенций из GraphDB"""
+@router.get("/competencies/graph", response_model=GraphResponse, dependencies=[Depends(bulk_priority)])
+@wiring.inject
+async def get_graph(
+    request: Request,
+    snapshot_cache: GraphSnapshotCache = Depends(wiring.Provide["graph_snapshot"]),
+) -> Response:
+    """
+    Получить весь граф компетенций из GraphDB.
+    Граф отдаётся из снимка в памяти процесса; ответ содержит ETag,
+    и при совпадении If-None-Match возвращается 304 без тела.
+    """
     try:
         logger.info("Fetching full competency graph")
-        return await CompetencyDAO.get_graph_from_db()
+        snapshot = await snapshot_cache.get(CompetencyDAO.load_graph_view)
     except Exception as e:
         logger.error(f"Error fetching graph: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
 
-@router.post("/competencies/graph")
-async def save_graph(request: Request, graph_data: dict = Body(...)) -> dict:
-    """Сохранить граф компетенций в GraphDB с версионированием"""
+async def _ndjson(events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Сериализует события в NDJSON; ошибка посреди потока передаётся последней строкой"""
+    try:
+        async for event in events:
+            yield orjson.dumps(event) + b"\n"
+    except Exception as e:
+        logger.error(f"Error streaming graph: {str(e)}")
+        yield orjson.dumps({"kind": "error", "detail": str(e)}) + b"\n"
+
+
+@router.get("/competencies/graph/stream", dependencies=[Depends(bulk_priority)])
+async def stream_graph(
+    cursor: Optional[str] = Query(None, description="Курсор продолжения из события end предыдущей страницы"),
+    page_size: int = Query(5000, ge=1, le=50000, description="Примерное количество триплетов на странице (страница заканчивается на границе субъекта)"),
+) -> StreamingResponse:
+    """
+    Потоковая выдача графа в формате NDJSON.
+    Каждая строка - событие: сначала узлы ({"kind": "node", ...}), затем связи ({"kind": "link", ...}),
+    последней строкой {"kind": "end", "next_cursor": ...}. Для следующей страницы
+    передайте next_cursor в параметр cursor; null означает, что граф прочитан целиком.
+    """
+    try:
+        logger.info(f"Streaming competency graph: cursor={cursor}, page_size={page_size}")
+        events = await CompetencyDAO.stream_graph_from_db(cursor=cursor, page_size=page_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error streaming graph: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(_ndjson(events), media_type="application/x-ndjson")
+
+
+@router.get("/competencies/graph/changes", response_model=GraphChangesResponse)
+async def get_graph_changes(
+    since: int = Query(..., ge=0, description="seq последнего применённого изменения (latest из прошлого ответа)"),
+    limit: int = Query(10000, ge=1, le=100000, description="Максимум записей журнала за один запрос"),
+) -> dict:
+    """
+    Дельта-синхронизация: добавленные и удалённые триплеты после seq=since.
+    Для каждого триплета возвращается только итоговая операция.
+    reset=true означает, что граф очищался и его нужно загрузить заново.
+    """
+    try:
+        logger.info(f"Fetching graph changes since {since}")
+        return await ChangeLogDAO.get_changes_since(since=since, limit=limit)
+    except Exception as e:
+        logger.error(f"Error fetching graph changes: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/competencies/graph", dependencies=[Depends(bulk_priority)])
+@wiring.inject
+async def save_graph(
+    request: Request,
+    response: Response,
+    graph_data: dict = Body(...),
+    snapshot_cache: GraphSnapshotCache = Depends(wiring.Provide["graph_snapshot"]),
+) -> dict:
+    """
+    Сохранить граф компетенций в GraphDB с версионированием.
+    Заголовок If-Match с ETag из GET /competencies/graph обязателен: если граф с тех пор
+    изменился, возвращается 409 и ничего не сохраняется. Ответ содержит ETag нового графа.
+    """
     try:
         # Получаем user_id из токена
         user_id = get_current_user_id(request)
 
+        if_match = request.headers.get("if-match")
+        if not if_match:
+            raise HTTPException(status_code=428, detail="If-Match header with the graph ETag is required")
+
         # Валидация данных перед сохранением
         nodes = graph_data.get("nodes", [])
         links = graph_data.get("links", [])
@@ -79,45 +238,59 @@ async def save_graph(request: Request, graph_data: dict = Body(...)) -> dict:
         links_count = len(valid_links)
         logger.info(f"Saving graph: {nodes_count} nodes, {links_count} links by user {user_id}")
 
-        # Сохраняем граф
-        await CompetencyDAO.save_graph_to_db(validated_data)
-
-        # Версионируем изменённые узлы
-        # Для каждого узла создаём или обновляем версию
-        for node in valid_nodes:
-            node_uri = node["id"]
+        # Сохраняем граф: в GraphDB уходит только разница с сохранёнными триплетами.
+        # Под общей блокировкой записи проверка ETag и фиксация не перемежаются с другими записями
+        async with _graph_write_lock:
             try:
-                await VersionDAO.create_or_update_version(
-                    node_uri=node_uri,
-                    user_id=user_id,
-                    change_type="UPDATE",
-                    old_value=None,  # Можно расширить для сохранения старых значений
-                    new_value={"label": node.get("label"), "type": node.get("type")}
-                )
-            except Exception as e:
-                logger.warning(f"Failed to version node {node_uri}: {e}")
+                result = await CompetencyDAO.save_graph_to_db(validated_data, if_match=if_match)
+            except GraphVersionConflict as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            added, removed = result["added"], result["removed"]
+            if added or removed:
+                await _graph_changed(user_id, added=added, removed=removed)
+            snapshot = await snapshot_cache.get(CompetencyDAO.load_graph_view, fresh=True)
+        response.headers["ETag"] = snapshot.etag
+
+        # Версионируем только узлы, чьи триплеты действительно изменились, одним пакетом
+        changed_subjects = [triple["subject"] for triple in removed + added]
+        try:
+            await VersionDAO.create_or_update_versions(
+                node_uris=changed_subjects,
+                user_id=user_id,
+                change_type="UPDATE"
+            )
+        except Exception as e:
+            logger.warning(f"Failed to version {len(set(changed_subjects))} nodes: {e}")
 
         return {
             "status": "success",
             "nodes": nodes_count,
             "links": links_count,
+            "added": len(added),
+            "removed": len(removed),
+            "unchanged": result["unchanged"],
             "versioned": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error saving graph: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 
-@router.get("/competencies/graph/part", response_model=GraphResponse)
+@router.get("/competencies/graph/part", response_model=GraphPartResponse)
 async def get_graph_part(
     node_id: str = Query(..., description="URI узла"),
     depth: int = Query(2, ge=1, le=5),
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Смещение (устаревший способ пагинации, см. cursor)"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
 ) -> dict:
     """
     Получает часть графа от указанного узла с заданной глубиной.
+    Для каждого узла возвращается distance - число переходов от node_id.
+    Узлы упорядочены по (distance, URI); следующая страница запрашивается с cursor=next_cursor.
     """
     try:
         logger.info(f"Fetching graph part: node={node_id}, depth={depth}, limit={limit}")
@@ -125,8 +298,11 @@ async def get_graph_part(
             start_from=node_id,
             depth=depth,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching graph part: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -148,18 +324,33 @@ async def get_graph_from_json(
 
 @router.get("/competencies/node/ancestors", response_model=List[OntologyNode])
 async def get_ancestors(
+    response: Response,
     node_id: str = Query(..., description="URI узла"),
     limit: int = Query(50, ge=1, le=100, description="Количество узлов на странице"),
-    offset: int = Query(0, ge=0, description="Смещение для пагинации"),
+    offset: int = Query(0, ge=0, description="Смещение для пагинации (устаревший способ, см. cursor)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    level: Optional[int] = Query(None, ge=1, le=MAX_LEVEL, description="Только узлы этого уровня"),
+    max_level: Optional[int] = Query(None, ge=1, le=MAX_LEVEL, description="Только узлы с уровнем не выше"),
 ) -> List[OntologyNode]:
-    """Получить всех предков компетенции"""
+    """
+    Получить всех предков компетенции (упорядочены по URI).
+    Если есть следующая страница, её курсор возвращается в заголовке X-Next-Cursor.
+    """
     try:
         logger.info(f"Fetching ancestors for node: {node_id}")
-        return await CompetencyDAO.get_ancestors(
+        page = await CompetencyDAO.get_ancestors(
             competency_id=node_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
+            level=level,
+            max_level=max_level
         )
+        if page["next_cursor"]:
+            response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+        return page["nodes"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching ancestors: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -167,23 +358,113 @@ async def get_ancestors(
 
 @router.get("/competencies/node/descendants", response_model=List[OntologyNode])
 async def get_descendants(
+    response: Response,
     node_id: str = Query(..., description="URI узла"),
     limit: int = Query(50, ge=1, le=100, description="Количество узлов на странице"),
-    offset: int = Query(0, ge=0, description="Смещение для пагинации"),
+    offset: int = Query(0, ge=0, description="Смещение для пагинации (устаревший способ, см. cursor)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    level: Optional[int] = Query(None, ge=1, le=MAX_LEVEL, description="Только узлы этого уровня"),
+    max_level: Optional[int] = Query(None, ge=1, le=MAX_LEVEL, description="Только узлы с уровнем не выше"),
 ) -> List[OntologyNode]:
-    """Получить всех потомков компетенции"""
+    """
+    Получить всех потомков компетенции (упорядочены по URI).
+    Если есть следующая страница, её курсор возвращается в заголовке X-Next-Cursor.
+    """
     try:
         logger.info(f"Fetching descendants for node: {node_id}")
-        return await CompetencyDAO.get_descendants(
+        page = await CompetencyDAO.get_descendants(
             competency_id=node_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
+            level=level,
+            max_level=max_level
         )
+        if page["next_cursor"]:
+            response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+        return page["nodes"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching descendants: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/competencies/nodes/ancestors", response_model=Dict[str, List[OntologyNode]])
+async def get_ancestors_many(
+    node_ids: List[str] = Body(..., description="Список URI узлов"),
+    limit: int = Query(100, ge=1, le=1000, description="Максимум предков на узел"),
+    level: Optional[int] = Query(None, ge=1, le=MAX_LEVEL, description="Только узлы этого уровня"),
+    max_level: Optional[int] = Query(None, ge=1, le=MAX_LEVEL, description="Только узлы с уровнем не выше"),
+) -> dict:
+    """
+    Получить предков сразу для многих узлов (batch operation).
+    Возвращает словарь {URI узла: [предки]}.
+    """
+    try:
+        if len(node_ids) > MAX_BATCH_NODES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_NODES} nodes per request")
+        logger.info(f"Fetching ancestors for {len(node_ids)} nodes")
+        return await CompetencyDAO.get_ancestors_many(
+            competency_ids=node_ids, limit=limit, level=level, max_level=max_level
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching ancestors: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/competencies/nodes/descendants", response_model=Dict[str, List[OntologyNode]])
+async def get_descendants_many(
+    node_ids: List[str] = Body(..., description="Список URI узлов"),
+    limit: int = Query(100, ge=1, le=1000, description="Максимум потомков на узел"),
+    level: Optional[int] = Query(None, ge=1, le=MAX_LEVEL, description="Только узлы этого уровня"),
+    max_level: Optional[int] = Query(None, ge=1, le=MAX_LEVEL, description="Только узлы с уровнем не выше"),
+) -> dict:
+    """
+    Получить потомков сразу для многих узлов (batch operation).
+    Возвращает словарь {URI узла: [потомки]}.
+    """
+    try:
+        if len(node_ids) > MAX_BATCH_NODES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_NODES} nodes per request")
+        logger.info(f"Fetching descendants for {len(node_ids)} nodes")
+        return await CompetencyDAO.get_descendants_many(
+            competency_ids=node_ids, limit=limit, level=level, max_level=max_level
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching descendants: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/competencies/node/is-descendant")
+async def is_descendant(
+    node_id: str = Query(..., description="URI проверяемого узла"),
+    ancestor_id: str = Query(..., description="URI предполагаемого предка"),
+) -> dict:
+    """Проверить, находится ли узел в поддереве другого узла (по hasSubCompetence)"""
+    try:
+        logger.info(f"Checking whether {node_id} is a descendant of {ancestor_id}")
+        result = await CompetencyDAO.is_descendant(node_id=node_id, ancestor_id=ancestor_id)
+        return {
+            "node_id": node_id,
+            "ancestor_id": ancestor_id,
+            "is_descendant": result
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error checking descendant: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/competencies/node/version")
 async def get_node_version(
     node_id: str = Query(..., description="URI узла"),
@@ -250,16 +531,23 @@ async def get_nodes_versions(
 
 @router.get("/competencies/node/history")
 async def get_node_history(
+    response: Response,
     node_id: str = Query(..., description="URI узла"),
     limit: int = Query(10, ge=1, le=100, description="Количество записей истории"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
 ) -> list[dict]:
     """
-    Получить историю изменений узла.
+    Получить историю изменений узла (новые изменения - первыми).
+    Если есть следующая страница, её курсор возвращается в заголовке X-Next-Cursor.
     """
     try:
         logger.info(f"Getting history for node: {node_id}")
-        history = await VersionDAO.get_node_history(node_id, limit)
-        return history
+        page = await VersionDAO.get_node_history(node_id, limit, cursor)
+        if page["next_cursor"]:
+            response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+        return page["history"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting node history: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -337,18 +625,25 @@ async def update_node_with_version(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/competencies/path", response_model=List[OntologyNode])
+@router.get("/competencies/path", response_model=PathResponse)
 async def find_path(
     start_id: str = Query(..., description="ID начальной компетенции"),
     end_id: str = Query(..., description="ID конечной компетенции"),
-) -> List[OntologyNode]:
-    """Найти путь между двумя компетенциями в графе"""
+    max_length: int = Query(20, ge=1, le=100, description="Максимальная длина пути в рёбрах"),
+) -> dict:
+    """
+    Найти кратчайший путь между двумя компетенциями по hasSubCompetence.
+    Узлы возвращаются в порядке пути, links - рёбра между соседними узлами.
+    """
     try:
         logger.info(f"Finding path from {start_id} to {end_id}")
         return await CompetencyDAO.find_path(
             start_id=start_id,
-            end_id=end_id
+            end_id=end_id,
+            max_length=max_length
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error finding path: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -390,7 +685,11 @@ async def add_triple(
         logger.info(f"Adding triple: <{subject}> <{predicate}> <{object_value}> by user {user_id}")
 
         # Добавляем триплет
-        await CompetencyDAO.add_triple(subject, predicate, object_value)
+        async with _graph_write_lock:
+            await CompetencyDAO.add_triple(subject, predicate, object_value)
+            await _graph_changed(
+                user_id, added=[CompetencyDAO.triple(subject, predicate, object_value)]
+            )
 
         # Версионируем изменение
         try:
@@ -426,6 +725,8 @@ async def add_triple(
         }
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error adding triple: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -480,14 +781,24 @@ async def update_triple(
                 status_code=400,
                 detail="All URIs must start with http:// or https://"
             )
+        # Оба триплета проверяются до записи, иначе старый удалится, а новый не добавится
+        for uri in (old_subject, old_predicate, old_object, new_subject, new_predicate, new_object):
+            sparql.iri(uri)
 
         logger.info(f"Updating triple by user {user_id}: OLD <{old_subject}> <{old_predicate}> <{old_object}> -> NEW <{new_subject}> <{new_predicate}> <{new_object}>")
 
-        # Удаляем старый триплет
-        await CompetencyDAO.delete_triple(old_subject, old_predicate, old_object)
+        async with _graph_write_lock:
+            # Удаляем старый триплет
+            await CompetencyDAO.delete_triple(old_subject, old_predicate, old_object)
+            await _graph_changed(
+                user_id, removed=[CompetencyDAO.triple(old_subject, old_predicate, old_object)]
+            )
 
-        # Добавляем новый триплет
-        await CompetencyDAO.add_triple(new_subject, new_predicate, new_object)
+            # Добавляем новый триплет
+            await CompetencyDAO.add_triple(new_subject, new_predicate, new_object)
+            await _graph_changed(
+                user_id, added=[CompetencyDAO.triple(new_subject, new_predicate, new_object)]
+            )
 
         # Версионируем изменение
         try:
@@ -523,11 +834,95 @@ async def update_triple(
         }
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error updating triple: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _patch_operation_error(operation: TriplePatchOperation) -> Optional[str]:
+    """Причина, по которой операцию патча нельзя применить, или None"""
+    triples = [operation.triple]
+    if operation.op == PatchOperationType.REPLACE:
+        if operation.new_triple is None:
+            return "new_triple is required for replace"
+        triples.append(operation.new_triple)
+    for triple in triples:
+        for uri in (triple.subject, triple.predicate, triple.object):
+            if not uri.startswith(("http://", "https://")):
+                return "All URIs must start with http:// or https://"
+            try:
+                sparql.iri(uri)
+            except ValueError as e:
+                return str(e)
+    return None
+
+
+@router.post("/competencies/graph/patch", response_model=GraphPatchResponse)
+async def patch_graph(request: Request, patch: GraphPatchRequest = Body(...)) -> dict:
+    """
+    Применить упорядоченный список операций add/remove/replace над триплетами атомарно.
+    Операции сводятся к итоговому набору изменений; в одной транзакции проверяется, какие
+    из них уже выполнены (такие операции получают статус noop), остальное отправляется одним
+    SPARQL UPDATE. Если хотя бы одна операция некорректна, не применяется ни одна.
+    Для каждого изменённого субъекта записывается одна версия.
+    """
+    try:
+        user_id = get_current_user_id(request)
+
+        if len(patch.operations) > MAX_PATCH_OPERATIONS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_PATCH_OPERATIONS} operations per patch")
+
+        errors = []
+        for index, operation in enumerate(patch.operations):
+            error = _patch_operation_error(operation)
+            if error:
+                errors.append({"index": index, "error": error})
+        if errors:
+            raise HTTPException(status_code=400, detail={"message": "Patch rejected", "operations": errors})
+
+        operations = [operation.model_dump(mode="json") for operation in patch.operations]
+        logger.info(f"Patching graph by user {user_id}: {len(operations)} operations")
+
+        # Если граф не изменился (все операции noop/superseded), нет ни журнала, ни версий
+        async with _graph_write_lock:
+            added, removed, statuses = await CompetencyDAO.patch_triples(operations)
+            if added or removed:
+                await _graph_changed(user_id, added=added, removed=removed)
+        logger.info(f"Patch applied: {len(removed)} removals, {len(added)} additions")
+
+        versions = {}
+        if added or removed:
+            # Одна версия на каждый затронутый субъект, одним пакетом
+            try:
+                versions = await VersionDAO.create_or_update_versions(
+                    node_uris=[triple["subject"] for triple in removed + added],
+                    user_id=user_id,
+                    change_type="UPDATE"
+                )
+            except Exception as e:
+                logger.warning(f"Failed to version patch: {e}")
+
+        return {
+            "status": "success",
+            "added": len(added),
+            "removed": len(removed),
+            "versions": versions,
+            "operations": [
+                {"index": index, "op": operation["op"], "status": status}
+                for index, (operation, status) in enumerate(zip(operations, statuses))
+            ]
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error patching graph: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.delete("/competencies/triple")
 async def delete_triple(
     request: Request,
@@ -556,7 +951,11 @@ async def delete_triple(
         logger.info(f"Deleting triple: <{subject}> <{predicate}> <{object_value}> by user {user_id}")
 
         # Удаляем триплет
-        await CompetencyDAO.delete_triple(subject, predicate, object_value)
+        async with _graph_write_lock:
+            await CompetencyDAO.delete_triple(subject, predicate, object_value)
+            await _graph_changed(
+                user_id, removed=[CompetencyDAO.triple(subject, predicate, object_value)]
+            )
 
         # Версионируем изменение
         try:
@@ -581,6 +980,8 @@ async def delete_triple(
         }
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error deleting triple: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -608,7 +1009,9 @@ async def delete_node(
         logger.info(f"Deleting node: <{node_id}> by user {user_id}")
 
         # Удаляем узел
-        await CompetencyDAO.delete_node(node_id)
+        async with _graph_write_lock:
+            removed = await CompetencyDAO.delete_node(node_id)
+            await _graph_changed(user_id, removed=removed)
 
         # Версионируем удаление
         try:
@@ -629,12 +1032,43 @@ async def delete_node(
         }
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error deleting node: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.delete("/competencies/graph/clear")
+@router.post(
+    "/competencies/graph/migrate-default-graph",
+    response_model=GraphMigrationReport,
+    dependencies=[Depends(bulk_priority)],
+)
+async def migrate_default_graph(request: Request) -> dict:
+    """
+    Перенести триплеты, сохранённые в граф по умолчанию, в именованный граф данных.
+    Выполняется внутри приложения, чтобы снимок графа и индекс иерархии перечитались сразу,
+    а в журнал изменений записался reset, - без перезапуска сервера.
+    """
+    try:
+        user_id = get_current_user_id(request)
+        logger.warning(f"Migrating the default graph into the data graph by user {user_id}")
+
+        async with _graph_write_lock:
+            report = await CompetencyDAO.migrate_default_graph()
+            if report["moved"]:
+                await _graph_changed(user_id, reload=True)
+
+        logger.info(f"Default graph migrated: {report['moved']} triple(s) moved")
+        return report
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error migrating default graph: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/competencies/graph/clear", dependencies=[Depends(bulk_priority)])
 async def clear_graph(
     request: Request,
     confirm: bool = Query(False, description="Подтверждение удаления ВСЕХ данных")
@@ -654,7 +1088,9 @@ async def clear_graph(
         logger.warning(f"CLEARING ENTIRE REPOSITORY by user {user_id}")
 
         # Очищаем репозиторий
-        await CompetencyDAO.clear_repository()
+        async with _graph_write_lock:
+            await CompetencyDAO.clear_repository()
+            await _graph_changed(user_id, reset=True)
 
         return {
             "status": "success",
@@ -0,0 +1,137 @@
+import asyncpg
+import logging
+from typing import Any, Dict, Iterable, Optional
+from dependency_injector import wiring
+from fastapi import Depends
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeLogDAO:
+    """DAO журнала изменений триплетов графа (лента дельта-синхронизации)"""
+
+    # Ключ advisory-блокировки: писатели журнала выстраиваются в очередь,
+    # поэтому seq видимых записей растёт в порядке коммитов и читатель ничего не пропускает
+    _LOCK_KEY = 6_006_001
+
+    @classmethod
+    @wiring.inject
+    async def record(
+        cls,
+        user_id: Optional[int],
+        added: Iterable[Dict[str, str]] = (),
+        removed: Iterable[Dict[str, str]] = (),
+        db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
+    ) -> Optional[int]:
+        """
+        Записать в журнал удалённые и добавленные триплеты (сначала удаления).
+        Триплет - словарь subject/predicate/object/object_type.
+        Возвращает seq последней записи или None, если записывать нечего.
+        """
+        changes = [("remove", t) for t in removed] + [("add", t) for t in added]
+        if not changes:
+            return None
+
+        async with db_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", cls._LOCK_KEY)
+                seq = await conn.fetchval(
+                    """
+                    WITH inserted AS (
+                        INSERT INTO graph_change_log (op, subject, predicate, object, object_type, user_id)
+                        SELECT c.op, c.subject, c.predicate, c.object, c.object_type, $6
+                        FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[])
+                            WITH ORDINALITY AS c(op, subject, predicate, object, object_type, n)
+                        ORDER BY c.n
+                        RETURNING seq
+                    )
+                    SELECT max(seq) FROM inserted
+                    """,
+                    [op for op, _ in changes],
+                    [t["subject"] for _, t in changes],
+                    [t["predicate"] for _, t in changes],
+                    [t["object"] for _, t in changes],
+                    [t.get("object_type", "uri") for _, t in changes],
+                    user_id,
+                )
+
+        logger.info(f"Recorded {len(changes)} graph change(s) up to seq {seq}")
+        return seq
+
+    @classmethod
+    @wiring.inject
+    async def record_reset(
+        cls,
+        user_id: Optional[int],
+        db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
+    ) -> int:
+        """Отметить в журнале полную очистку графа: клиентам нужно перезагрузить граф целиком"""
+        async with db_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", cls._LOCK_KEY)
+                return await conn.fetchval(
+                    "INSERT INTO graph_change_log (op, user_id) VALUES ('reset', $1) RETURNING seq",
+                    user_id,
+                )
+
+    @classmethod
+    @wiring.inject
+    async def get_changes_since(
+        cls,
+        since: int,
+        limit: int = 10000,
+        db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
+    ) -> Dict[str, Any]:
+        """
+        Сжатые изменения после seq=since: для каждого триплета берётся последняя операция.
+        За один вызов просматривается не больше limit записей журнала; если их больше,
+        has_more=True и следующий вызов делается с since=latest.
+        Если в окне есть очистка графа, reset=True и триплеты не возвращаются.
+        """
+        async with db_pool.acquire() as conn:
+            window = await conn.fetchrow(
+                """
+                SELECT max(seq) AS latest, count(*) AS total, bool_or(op = 'reset') AS has_reset
+                FROM (
+                    SELECT seq, op FROM graph_change_log
+                    WHERE seq > $1
+                    ORDER BY seq
+                    LIMIT $2
+                ) w
+                """,
+                since,
+                limit,
+            )
+
+            result: Dict[str, Any] = {
+                "since": since,
+                "latest": window["latest"] if window["latest"] is not None else since,
+                "has_more": window["total"] >= limit,
+                "reset": bool(window["has_reset"]),
+                "added": [],
+                "removed": [],
+            }
+            if window["latest"] is None or result["reset"]:
+                return result
+
+            rows = await conn.fetch(
+                """
+                SELECT DISTINCT ON (subject, predicate, object, object_type)
+                    op, subject, predicate, object, object_type
+                FROM graph_change_log
+                WHERE seq > $1 AND seq <= $2
+                ORDER BY subject, predicate, object, object_type, seq DESC
+                """,
+                since,
+                window["latest"],
+            )
+
+        for row in rows:
+            triple = {
+                "subject": row["subject"],
+                "predicate": row["predicate"],
+                "object": row["object"],
+                "object_type": row["object_type"],
+            }
+            result["added" if row["op"] == "add" else "removed"].append(triple)
+        return result
@@ -3,6 +3,8 @@ import typing as tp
 from datetime import datetime
 import dependency_injector.wiring as wiring
 
+from models.comments import Comment
+
 class CommentDB(tp.TypedDict):
     id: int
     filename: str
@@ -14,6 +16,13 @@ class CommentDB(tp.TypedDict):
     created_at: datetime
     author: str
 
+class TripleCountDB(tp.TypedDict):
+    subject: str
+    predicate: str
+    object: str
+    count: int
+    latest_at: datetime
+
 class CommentsDAO:
     @classmethod
     async def create(
@@ -46,6 +55,49 @@ class CommentsDAO:
         )
         return tp.cast(CommentDB, dict(row))
 
+    @classmethod
+    async def create_many(
+        cls,
+        comments: tp.Sequence[Comment],
+        author: str,
+        db_pool: asyncpg.Pool = wiring.Provide["db_pool"]
+    ) -> list[CommentDB]:
+        """
+        Создает пачку комментариев одним INSERT в транзакции.
+        id выделяются заранее, поэтому результат возвращается в порядке входного списка.
+        """
+        if not comments:
+            return []
+        now = datetime.now().astimezone()
+        async with db_pool.acquire() as conn:
+            async with conn.transaction():
+                ids = await conn.fetchval(
+                    "SELECT array_agg(nextval('comments_id_seq')) FROM generate_series(1, $1)",
+                    len(comments)
+                )
+                rows = await conn.fetch(
+                    """
+                    INSERT INTO comments (id, filename, start_index, end_index, subject, predicate, object, author, created_at)
+                    SELECT id, filename, start_index, end_index, subject, predicate, object, $9, created_at
+                    FROM unnest(
+                        $1::int[], $2::varchar[], $3::int[], $4::int[],
+                        $5::varchar[], $6::varchar[], $7::varchar[], $8::timestamptz[]
+                    ) AS t(id, filename, start_index, end_index, subject, predicate, object, created_at)
+                    RETURNING id, filename, start_index, end_index, subject, predicate, object, created_at, author
+                    """,
+                    ids,
+                    [c.filename for c in comments],
+                    [c.start_index for c in comments],
+                    [c.end_index for c in comments],
+                    [c.subject for c in comments],
+                    [c.predicate for c in comments],
+                    [c.object for c in comments],
+                    [c.created_at or now for c in comments],
+                    author
+                )
+        by_id = {row["id"]: tp.cast(CommentDB, dict(row)) for row in rows}
+        return [by_id[comment_id] for comment_id in ids]
+
     @classmethod
     async def get_by_filename(
         cls,
@@ -75,3 +127,71 @@ class CommentsDAO:
             limit
         )
         return [tp.cast(CommentDB, dict(row)) for row in rows]
+
+    @classmethod
+    async def get_overlapping(
+        cls,
+        filename: str,
+        range_from: tp.Optional[int] = None,
+        range_to: tp.Optional[int] = None,
+        limit: int = 500,
+        db_pool: asyncpg.Pool = wiring.Provide["db_pool"]
+    ) -> list[CommentDB]:
+        """
+        Получает комментарии файла, пересекающиеся с диапазоном символов [range_from, range_to),
+        по порядку в тексте. Не заданная граница - диапазон открыт с этой стороны;
+        range_from == range_to - точка, как и span комментария с start_index == end_index.
+        Выборка идёт по GiST-индексу (filename, span).
+        """
+        rows = await db_pool.fetch(
+            """
+            SELECT
+                id,
+                filename,
+                start_index,
+                end_index,
+                subject,
+                predicate,
+                object,
+                created_at,
+                author
+            FROM comments
+            WHERE filename = $1
+              AND span && int4range($2::int, $3::int, CASE WHEN $2::int = $3::int THEN '[]' ELSE '[)' END)
+            ORDER BY start_index, id
+            LIMIT $4
+            """,
+            filename,
+            range_from,
+            range_to,
+            limit
+        )
+        return [tp.cast(CommentDB, dict(row)) for row in rows]
+
+    @classmethod
+    async def count_by_triples(
+        cls,
+        triples: tp.Sequence[tuple[str, str, str]],
+        db_pool: asyncpg.Pool = wiring.Provide["db_pool"]
+    ) -> list[TripleCountDB]:
+        """
+        Количество комментариев и время последнего из них по каждому триплету одним запросом.
+        Триплеты без комментариев не возвращаются.
+        Агрегат читается из индекса (subject, predicate, object) INCLUDE (created_at).
+        """
+        if not triples:
+            return []
+        rows = await db_pool.fetch(
+            """
+            SELECT c.subject, c.predicate, c.object, COUNT(*) AS count, MAX(c.created_at) AS latest_at
+            FROM comments c
+            WHERE (c.subject, c.predicate, c.object) IN (
+                SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::varchar[])
+            )
+            GROUP BY c.subject, c.predicate, c.object
+            """,
+            [t[0] for t in triples],
+            [t[1] for t in triples],
+            [t[2] for t in triples]
+        )
+        return [tp.cast(TripleCountDB, dict(row)) for row in rows]
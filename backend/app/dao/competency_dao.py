@@ -1,41 +1,330 @@
-from typing import List
+from contextlib import aclosing
+from typing import AsyncIterator, Iterable, List, Optional, Union
+import asyncio
 import re
 import logging
 from fastapi import Depends
 from dependency_injector import wiring
-from SPARQLWrapper import SPARQLWrapper, SPARQLExceptions
-
-import requests
 
 from models.graph import OntologyNode, NodeType
 from dependencies.config import Config
+from dependencies.graphdb import GraphDBClient, GraphDBError, GraphDBTransaction, NULL_CONTEXT, parse_n_triples
+from dao.pagination import decode_cursor, encode_cursor
+from dao import sparql
+from dao.sparql import EMPTY, STANDARD_PREFIXES, Fragment, SparqlFragment, SparqlTemplate
+from services.graph_part import GraphPartCache
+from services.graph_snapshot import GraphRow, GraphSnapshotCache, GraphVersionConflict, GraphView, etag_matches
+from services.hierarchy_index import (
+    HAS_SUB_COMPETENCE,
+    HierarchyIndex,
+    level_matches,
+    level_predicates,
+    shortest_path_search,
+)
 
 logger = logging.getLogger(__name__)
 
+# Куда отправляются SPARQL-запросы: клиент GraphDB или открытая транзакция RDF4J
+SparqlTarget = Union[GraphDBClient, GraphDBTransaction]
+
 
 class CompetencyDAO:
-    @classmethod
-    def _get_prefixes(cls, config: Config) -> dict[str, str]:
-        return {
-            "": f"<{config.graphdb.url}/repositories/{config.graphdb.repository}#>",
-            "rdf": "<http://www.w3.org/1999/02/22-rdf-syntax-ns#>",
-            "rdfs": "<http://www.w3.org/2000/01/rdf-schema#>",
-            "owl": "<http://www.w3.org/2002/07/owl#>",
+    # Системные namespace RDF/RDFS/OWL: такие триплеты не показываются как узлы и связи графа
+    _SYSTEM_NAMESPACES = (
+        "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+        "http://www.w3.org/2000/01/rdf-schema#",
+        "http://www.w3.org/2002/07/owl#",
+        "http://www.w3.org/XML/1998/namespace",
+        "http://www.w3.org/2001/XMLSchema#",
+        "http://proton.semanticweb.org/protonsys#",
+    )
+    _RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+    _RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+    _XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+    # Тип узла фронтенда -> класс RDF
+    _NODE_TYPES = {
+        "class": "http://www.w3.org/2000/01/rdf-schema#Class",
+        "property": "http://www.w3.org/1999/02/22-rdf-syntax-ns#Property"
+    }
+    # Сколько узлов фронтира раскрывается одним запросом при обходе в ширину
+    _BFS_BATCH_SIZE = 500
+    # Сколько узлов объединяется через UNION в одном пакетном запросе предков/потомков
+    _UNION_BATCH_SIZE = 50
+    # Сколько оставленных в графе по умолчанию строк показывается в отчёте миграции
+    _MIGRATION_SAMPLES = 10
+    # Верхняя граница числа раскрытых узлов при поиске пути через GraphDB
+    _PATH_MAX_VISITED = 50000
+
+    # Шаблоны запросов компилируются один раз; $iri/$iris/$literal/$int проверяются до запроса
+    _GRAPH_TRIPLES = SparqlTemplate("graph.triples", """
+        SELECT ?s ?p ?o
+        WHERE { GRAPH $iri:graph { ?s ?p ?o . } }
+    """)
+    _GRAPH_PREDICATES = SparqlTemplate("graph.predicates", """
+        SELECT DISTINCT ?p
+        WHERE { GRAPH $iri:graph { ?s ?p ?o . } }
+    """)
+    # Страница - целые субъекты: не больше $int:limit субъектов после курсора, все их триплеты.
+    # Субъекты данных - URI, у них STR однозначен, поэтому курсором служит один последний субъект
+    _GRAPH_PAGE = SparqlTemplate("graph.page", """
+        SELECT ?s ?p ?o
+        WHERE {
+            {
+                SELECT DISTINCT ?s
+                WHERE {
+                    GRAPH $iri:graph { ?s ?_p ?_o . }
+                    FILTER (isIRI(?s))
+                    $fragment:after
+                }
+                ORDER BY STR(?s)
+                LIMIT $int:limit
+            }
+            GRAPH $iri:graph { ?s ?p ?o . }
         }
+        ORDER BY STR(?s)
+    """)
+    _GRAPH_PAGE_AFTER = SparqlFragment("FILTER (STR(?s) > $literal:s)")
+    _GRAPH_CLEAR = SparqlTemplate("graph.clear", "CLEAR SILENT GRAPH $iri:graph")
+    _TRIPLE_INSERT = SparqlTemplate("triple.insert", """
+        INSERT DATA { GRAPH $iri:graph { $iri:subject $iri:predicate $iri:object . } }
+    """)
+    _TRIPLE_DELETE = SparqlTemplate("triple.delete", """
+        DELETE DATA { GRAPH $iri:graph { $iri:subject $iri:predicate $iri:object . } }
+    """)
+    # DELETE DATA и INSERT DATA одним запросом: патч применяется целиком или не применяется
+    _TRIPLES_PATCH = SparqlTemplate("triples.patch", """
+        DELETE DATA { GRAPH $iri:graph { $fragment:removed } } ;
+        INSERT DATA { GRAPH $iri:graph { $fragment:added } }
+    """)
+    _TRIPLE_DATA = SparqlFragment("$iri:subject $iri:predicate $iri:object .")
+    _TRIPLES_EXISTING = SparqlTemplate("triples.existing", """
+        SELECT ?s ?p ?o
+        WHERE {
+            VALUES (?s ?p ?o) { $fragment:triples }
+            GRAPH $iri:graph { ?s ?p ?o . }
+        }
+    """)
+    _TRIPLE_VALUES = SparqlFragment("($iri:subject $iri:predicate $iri:object)")
+    _NODE_DESCRIPTIONS = SparqlTemplate("node.descriptions", """
+        SELECT ?s ?p ?o
+        WHERE {
+            VALUES ?s { $iris:nodes }
+            VALUES ?p { rdf:type rdfs:label }
+            GRAPH $iri:graph { ?s ?p ?o . }
+        }
+    """, prefixes=STANDARD_PREFIXES)
+    _NODE_TRIPLES = SparqlTemplate("node.triples", """
+        SELECT ?s ?p ?o WHERE {
+            GRAPH $iri:graph {
+                { $iri:node ?p ?o . BIND($iri:node AS ?s) }
+                UNION
+                { ?s ?p $iri:node . BIND($iri:node AS ?o) }
+            }
+        }
+    """)
+    # Оба DELETE WHERE отправляются одним запросом, т.е. в одной транзакции:
+    # сначала триплеты, где узел является субъектом, затем - объектом
+    _NODE_DELETE = SparqlTemplate("node.delete", """
+        DELETE WHERE { GRAPH $iri:graph { $iri:node ?p ?o . } } ;
+        DELETE WHERE { GRAPH $iri:graph { ?s ?p $iri:node . } }
+    """)
+    _OUT_EDGES = SparqlTemplate("node.out_edges", """
+        SELECT ?s ?p ?o
+        WHERE {
+            VALUES ?s { $iris:nodes }
+            GRAPH $iri:graph { ?s ?p ?o . }
+        }
+    """)
+    _NODE_LABELS = SparqlTemplate("node.labels", """
+        SELECT ?node ?label
+        WHERE {
+            VALUES ?node { $iris:nodes }
+            GRAPH $iri:graph { ?node rdfs:label ?label . }
+        }
+    """, prefixes=STANDARD_PREFIXES)
+    _NODE_LEVELS = SparqlTemplate("node.levels", """
+        SELECT ?node ?predicate
+        WHERE {
+            VALUES ?node { $iris:nodes }
+            VALUES ?predicate { $iris:predicates }
+            GRAPH $iri:graph { ?node ?predicate ?value . }
+        }
+    """)
+    _INDEX_EDGES = SparqlTemplate("index.edges", f"""
+        SELECT ?parent ?child
+        WHERE {{ GRAPH $iri:graph {{ ?parent <{HAS_SUB_COMPETENCE}> ?child . FILTER(isIRI(?child)) }} }}
+    """)
+    _INDEX_LABELS = SparqlTemplate("index.labels", """
+        SELECT ?node ?label
+        WHERE { GRAPH $iri:graph { ?node rdfs:label ?label . } }
+    """, prefixes=STANDARD_PREFIXES)
+    _INDEX_LEVELS = SparqlTemplate("index.levels", """
+        SELECT ?node ?predicate ?value
+        WHERE {
+            VALUES ?predicate { $iris:predicates }
+            GRAPH $iri:graph { ?node ?predicate ?value . }
+        }
+    """)
+    _ANCESTORS_PAGE = SparqlTemplate("hierarchy.ancestors_page", f"""
+        SELECT DISTINCT ?related
+        WHERE {{
+            GRAPH $iri:graph {{
+                ?related <{HAS_SUB_COMPETENCE}>+ $iri:node .
+                $fragment:level_filter
+            }}
+            $fragment:after
+        }}
+        ORDER BY STR(?related)
+        LIMIT $int:limit
+    """)
+    _DESCENDANTS_PAGE = SparqlTemplate("hierarchy.descendants_page", f"""
+        SELECT DISTINCT ?related
+        WHERE {{
+            GRAPH $iri:graph {{
+                $iri:node <{HAS_SUB_COMPETENCE}>+ ?related .
+                $fragment:level_filter
+            }}
+            $fragment:after
+        }}
+        ORDER BY STR(?related)
+        LIMIT $int:limit
+    """)
+    _RELATED_AFTER = SparqlFragment("FILTER(STR(?related) > $literal:after)")
+    # Пакетные предки/потомки: подзапрос на узел со своим ORDER BY и LIMIT (ограничение на узел),
+    # подзапросы пачки объединяются через UNION
+    _ANCESTORS_OF_NODE = SparqlFragment(f"""
+        {{
+            SELECT DISTINCT ?node ?related
+            WHERE {{
+                GRAPH $iri:graph {{
+                    ?related <{HAS_SUB_COMPETENCE}>+ $iri:node .
+                    $fragment:level_filter
+                }}
+                BIND ($iri:node AS ?node)
+            }}
+            ORDER BY STR(?related)
+            LIMIT $int:limit
+        }}
+    """)
+    _DESCENDANTS_OF_NODE = SparqlFragment(f"""
+        {{
+            SELECT DISTINCT ?node ?related
+            WHERE {{
+                GRAPH $iri:graph {{
+                    $iri:node <{HAS_SUB_COMPETENCE}>+ ?related .
+                    $fragment:level_filter
+                }}
+                BIND ($iri:node AS ?node)
+            }}
+            ORDER BY STR(?related)
+            LIMIT $int:limit
+        }}
+    """)
+    _ANCESTORS_MANY = SparqlTemplate("hierarchy.ancestors_many", """
+        SELECT ?node ?related
+        WHERE { $fragment:nodes }
+        ORDER BY STR(?node) STR(?related)
+    """)
+    _DESCENDANTS_MANY = SparqlTemplate("hierarchy.descendants_many", """
+        SELECT ?node ?related
+        WHERE { $fragment:nodes }
+        ORDER BY STR(?node) STR(?related)
+    """)
+    _LEVEL_EXACT = SparqlFragment("FILTER EXISTS { ?related $iri:predicate ?_level }")
+    _LEVEL_NOT_LOWER = SparqlFragment(
+        "FILTER NOT EXISTS { VALUES ?_lower { $iris:predicates } ?related ?_lower ?_lowerValue }"
+    )
+    _LEVEL_AT_MOST = SparqlFragment(
+        "FILTER EXISTS { VALUES ?_allowed { $iris:predicates } ?related ?_allowed ?_allowedValue }"
+    )
+    _IS_DESCENDANT = SparqlTemplate("hierarchy.is_descendant", f"""
+        ASK {{ GRAPH $iri:graph {{ $iri:ancestor <{HAS_SUB_COMPETENCE}>+ $iri:node . }} }}
+    """)
+    _CHILDREN = SparqlTemplate("hierarchy.children", f"""
+        SELECT ?parent ?child
+        WHERE {{
+            VALUES ?parent {{ $iris:nodes }}
+            GRAPH $iri:graph {{ ?parent <{HAS_SUB_COMPETENCE}> ?child . FILTER(isIRI(?child)) }}
+        }}
+    """)
+    _PARENTS = SparqlTemplate("hierarchy.parents", f"""
+        SELECT ?parent ?child
+        WHERE {{
+            VALUES ?child {{ $iris:nodes }}
+            GRAPH $iri:graph {{ ?parent <{HAS_SUB_COMPETENCE}> ?child . FILTER(isIRI(?child)) }}
+        }}
+    """)
+
+    @classmethod
+    async def _select(cls, client: SparqlTarget, template: SparqlTemplate, **params) -> dict:
+        """
+        SELECT/ASK по шаблону; ValueError - если параметры не прошли проверку (до запроса).
+        client - клиент GraphDB или открытая транзакция
+        """
+        return await cls._select_rendered(client, template, template.render(**params))
+
+    @classmethod
+    async def _select_batches(
+        cls,
+        client: GraphDBClient,
+        template: SparqlTemplate,
+        nodes: list[str],
+        **params
+    ) -> list[dict]:
+        """
+        SELECT по шаблону с параметром $iris:nodes, разбитым на пачки по _BFS_BATCH_SIZE.
+        Все пачки проверяются до первого запроса, затем выполняются параллельно.
+        """
+        queries = [
+            template.render(nodes=nodes[i:i + cls._BFS_BATCH_SIZE], **params)
+            for i in range(0, len(nodes), cls._BFS_BATCH_SIZE)
+        ]
+        return await asyncio.gather(*(cls._select_rendered(client, template, query) for query in queries))
+
+    @classmethod
+    async def _select_rendered(cls, client: SparqlTarget, template: SparqlTemplate, query: str) -> dict:
+        with template.execution() as execution:
+            data = await cls._execute_stmt(client, query)
+            execution.rows = len(data.get("results", {}).get("bindings", ()))
+        return data
+
+    @classmethod
+    def _stream(cls, client: GraphDBClient, template: SparqlTemplate, **params) -> AsyncIterator[dict]:
+        """Потоковый SELECT по шаблону; параметры проверяются сразу, а не при первой строке"""
+        return cls._stream_rows(client, template, template.render(**params))
 
     @classmethod
-    def _prefix_str(cls, config: Config) -> str:
-        prefixes = cls._get_prefixes(config)
-        return "\n".join(f"PREFIX {k}: {v}" for k, v in prefixes.items())
+    async def _stream_rows(cls, client: GraphDBClient, template: SparqlTemplate, query: str) -> AsyncIterator[dict]:
+        with template.execution() as execution:
+            async with aclosing(client.stream_query(query)) as rows:
+                async for row in rows:
+                    execution.rows += 1
+                    yield row
 
     @classmethod
-    async def _execute_stmt(cls, client: SPARQLWrapper, stmt: str) -> dict:
+    async def _update(cls, client: SparqlTarget, template: SparqlTemplate, **params) -> None:
+        """SPARQL UPDATE по шаблону; ValueError - если параметры не прошли проверку (до запроса)"""
+        await cls._update_rendered(client, template, template.render(**params))
 
-        client.setQuery(stmt)
+    @classmethod
+    async def _update_rendered(cls, client: SparqlTarget, template: SparqlTemplate, update: str) -> None:
+        with template.execution():
+            await cls._execute_update(client, update)
+
+    @classmethod
+    async def _execute_stmt(cls, client: SparqlTarget, stmt: str) -> dict:
         try:
-            result = client.query().convert()
-            return result
-        except SPARQLExceptions.EndPointInternalError as e:
+            return await client.query(stmt)
+        except GraphDBError as e:
+            raise RuntimeError(f"Ошибка GraphDB: {e}")
+        except Exception as e:
+            raise RuntimeError(f"Ошибка выполнения SPARQL-запроса: {e}")
+
+    @classmethod
+    async def _execute_update(cls, client: SparqlTarget, stmt: str) -> None:
+        try:
+            await client.update(stmt)
+        except GraphDBError as e:
             raise RuntimeError(f"Ошибка GraphDB: {e}")
         except Exception as e:
             raise RuntimeError(f"Ошибка выполнения SPARQL-запроса: {e}")
@@ -54,367 +343,650 @@ class CompetencyDAO:
 
 
     @classmethod
-    async def get_graph_from_db(
+    @wiring.inject
+    async def load_graph_view(
         cls,
-        client: SPARQLWrapper = Depends(wiring.Provide["graphdb_client"]),
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
         config: Config = Depends(wiring.Provide["config"])
-    ) -> dict:
+    ) -> GraphView:
         """
-        Получает весь граф из GraphDB (только пользовательские данные, без системных RDF/RDFS)
+        Читает именованный граф пользовательских данных в GraphView (загрузчик снимка графа).
+        Служебные триплеты (rdf:type, rdfs:label и т.п.) не показываются как узлы и связи.
         """
-        prefixes = cls._prefix_str(config)
-
-        # Фильтруем системные триплеты RDF/RDFS/OWL
-        # Получаем только данные, которые НЕ относятся к системным namespace
-        query = f"""
-        {prefixes}
-        SELECT ?s ?p ?o
-        WHERE {{
-            ?s ?p ?o .
-            # Исключаем системные namespace для субъектов
-            FILTER (!STRSTARTS(STR(?s), "http://www.w3.org/1999/02/22-rdf-syntax-ns#"))
-            FILTER (!STRSTARTS(STR(?s), "http://www.w3.org/2000/01/rdf-schema#"))
-            FILTER (!STRSTARTS(STR(?s), "http://www.w3.org/2002/07/owl#"))
-            FILTER (!STRSTARTS(STR(?s), "http://www.w3.org/XML/1998/namespace"))
-            FILTER (!STRSTARTS(STR(?s), "http://www.w3.org/2001/XMLSchema#"))
-            FILTER (!STRSTARTS(STR(?s), "http://proton.semanticweb.org/protonsys#"))
-            
-            # Исключаем системные namespace для предикатов
-            FILTER (!STRSTARTS(STR(?p), "http://www.w3.org/1999/02/22-rdf-syntax-ns#"))
-            FILTER (!STRSTARTS(STR(?p), "http://www.w3.org/2000/01/rdf-schema#"))
-            FILTER (!STRSTARTS(STR(?p), "http://www.w3.org/2002/07/owl#"))
-            FILTER (!STRSTARTS(STR(?p), "http://www.w3.org/XML/1998/namespace"))
-            FILTER (!STRSTARTS(STR(?p), "http://www.w3.org/2001/XMLSchema#"))
-            FILTER (!STRSTARTS(STR(?p), "http://proton.semanticweb.org/protonsys#"))
-            
-            # Исключаем системные namespace для объектов (только если это URI)
-            FILTER (
-                !(isURI(?o) && (
-                    STRSTARTS(STR(?o), "http://www.w3.org/1999/02/22-rdf-syntax-ns#") ||
-                    STRSTARTS(STR(?o), "http://www.w3.org/2000/01/rdf-schema#") ||
-                    STRSTARTS(STR(?o), "http://www.w3.org/2002/07/owl#") ||
-                    STRSTARTS(STR(?o), "http://www.w3.org/XML/1998/namespace") ||
-                    STRSTARTS(STR(?o), "http://www.w3.org/2001/XMLSchema#") ||
-                    STRSTARTS(STR(?o), "http://proton.semanticweb.org/protonsys#")
-                ))
-            )
-        }}
-        """
-
         try:
-            data = await cls._execute_stmt(client, query)
+            data = await cls._select(client, cls._GRAPH_TRIPLES, graph=config.graphdb.data_graph)
         except Exception as e:
             raise RuntimeError(f"Ошибка при получении графа: {str(e)}")
 
-        # Преобразование в нужный формат
-        nodes_dict = {}
-        links = []
-        predicates_set = set()  # Собираем все предикаты
-
-        # Первый проход - собираем предикаты
-        for binding in data["results"]["bindings"]:
-            p = binding["p"]["value"]
-            predicates_set.add(p)
-
-        # Второй проход - собираем узлы и связи
+        view = GraphView(cls._make_node)
         for binding in data["results"]["bindings"]:
             s = binding["s"]["value"]
             p = binding["p"]["value"]
             o = binding["o"]["value"]
+            is_uri = binding["o"]["type"] == "uri"
+            if not cls._is_system_triple(s, p, o, is_uri):
+                view.add((s, p, o, is_uri))
+        return view
 
-            # Добавляем субъект как узел (если это не предикат)
-            if s not in nodes_dict and s not in predicates_set:
-                nodes_dict[s] = {
-                    "id": s,
-                    "label": s.split("#")[-1].split("/")[-1],
-                    "type": "class"
-                }
-
-            # Если объект - URI, добавляем как узел (если это не предикат)
-            if binding["o"]["type"] == "uri" and o not in nodes_dict and o not in predicates_set:
-                nodes_dict[o] = {
-                    "id": o,
-                    "label": o.split("#")[-1].split("/")[-1],
-                    "type": "class"
-                }
+    @classmethod
+    async def get_graph_from_db(cls) -> dict:
+        """
+        Получает весь граф из именованного графа пользовательских данных: {nodes, links}.
+        Узлы - субъекты и URI-объекты, не используемые как предикаты; связи - триплеты с URI-объектом.
+        """
+        return (await cls.load_graph_view()).payload()
 
-            # Добавляем связь (только если объект - URI)
-            if binding["o"]["type"] == "uri":
-                links.append({
-                    "source": s,
-                    "target": o,
-                    "predicate": p
-                })
+    @classmethod
+    def graph_rows(cls, triples: Iterable[dict]) -> list[GraphRow]:
+        """Триплеты журнала изменений, видимые в графе, как строки GraphView"""
+        rows = []
+        for triple in triples:
+            is_uri = triple.get("object_type", "uri") == "uri"
+            if not cls._is_system_triple(triple["subject"], triple["predicate"], triple["object"], is_uri):
+                rows.append((triple["subject"], triple["predicate"], triple["object"], is_uri))
+        return rows
 
+    @classmethod
+    def _make_node(cls, uri: str) -> dict:
+        """Узел для фронтенда: метка - локальное имя URI"""
         return {
-            "nodes": list(nodes_dict.values()),
-            "links": links
+            "id": uri,
+            "label": uri.split("#")[-1].split("/")[-1],
+            "type": "class"
         }
 
     @classmethod
-    def _is_system_uri(cls, uri: str) -> bool:
-        """Проверяет, является ли URI системным (RDF/RDFS/OWL)"""
-        system_namespaces = [
-            "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
-            "http://www.w3.org/2000/01/rdf-schema#",
-            "http://www.w3.org/2002/07/owl#",
-            "http://www.w3.org/XML/1998/namespace",
-            "http://www.w3.org/2001/XMLSchema#",
-            "http://proton.semanticweb.org/protonsys#"
-        ]
-        return any(uri.startswith(ns) for ns in system_namespaces)
+    @wiring.inject
+    async def load_graph_predicates(
+        cls,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"])
+    ) -> set[str]:
+        """Несистемные предикаты именованного графа пользовательских данных"""
+        try:
+            data = await cls._select(client, cls._GRAPH_PREDICATES, graph=config.graphdb.data_graph)
+        except Exception as e:
+            raise RuntimeError(f"Ошибка при получении графа: {str(e)}")
+        return {
+            binding["p"]["value"]
+            for binding in data["results"]["bindings"]
+            if not cls._is_system_uri(binding["p"]["value"])
+        }
 
     @classmethod
-    async def save_graph_to_db(
+    @wiring.inject
+    async def stream_graph_from_db(
         cls,
-        graph_data: dict,
-        config: Config = Depends(wiring.Provide["config"])
-    ) -> bool:
+        cursor: Optional[str] = None,
+        page_size: int = 5000,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        graph_snapshot: GraphSnapshotCache = Depends(wiring.Provide["graph_snapshot"])
+    ) -> AsyncIterator[dict]:
         """
-        Сохраняет граф в GraphDB через прямой HTTP запрос
-        Фильтрует системные RDF/RDFS/OWL узлы и связи
+        Потоковое чтение графа страницами примерно по page_size триплетов.
+        Страница содержит все триплеты своих субъектов (субъект с большим числом триплетов
+        может её удлинить) и заканчивается на границе субъекта.
+        Возвращает асинхронный итератор событий:
+        сначала {"kind": "node", ...} по мере чтения строк, затем {"kind": "link", ...},
+        в конце {"kind": "end", "next_cursor": ...}. next_cursor = None на последней странице.
+        Узел может повториться на соседних страницах - клиент объединяет их по id.
         """
-        type_map = {
-            "class": "http://www.w3.org/2000/01/rdf-schema#Class",
-            "property": "http://www.w3.org/1999/02/22-rdf-syntax-ns#Property"
-        }
+        after = EMPTY
+        if cursor:
+            position = decode_cursor(cursor)
+            if not (isinstance(position, list) and len(position) == 1 and isinstance(position[0], str)):
+                raise ValueError(f"Invalid cursor: {cursor}")
+            after = cls._GRAPH_PAGE_AFTER.render(s=position[0])
 
-        # URL для GraphDB updates
-        graphdb_url = f"{config.graphdb.url}/repositories/{config.graphdb.repository}/statements"
-        auth = ("admin", "root")  # стандартные учетные данные GraphDB
+        # Лишний субъект сверх page_size показывает, что есть следующая страница
+        rows = cls._stream(client, cls._GRAPH_PAGE, graph=config.graphdb.data_graph, after=after, limit=page_size + 1)
 
-        successful = 0
-        total = 0
-        skipped_system = 0
+        # Предикаты нужны заранее: URI, встречающиеся как предикаты, узлами не считаются.
+        # Берутся из снимка графа или один раз на поколение, а не на каждой странице
+        predicates_set = await graph_snapshot.predicates(cls.load_graph_predicates)
 
-        # Обрабатываем узлы
-        for node in graph_data.get("nodes", []):
-            node_uri = node["id"]
-            
-            # Пропускаем системные URI
-            if cls._is_system_uri(node_uri):
-                logger.debug(f"Skipping system URI: {node_uri}")
-                skipped_system += 1
-                continue
-            
-            # Проверяем, что URI валидный (начинается с http:// или https://)
-            if not node_uri.startswith(("http://", "https://")):
-                logger.warning(f"Skipping invalid URI: {node_uri} (must start with http:// or https://)")
-                total += 1
-                continue
+        return cls._graph_events(rows, predicates_set, page_size)
 
-            node_type = type_map.get(node["type"], node["type"])
-            label = node["label"].replace('"', '\\"')
+    @classmethod
+    async def _graph_events(
+        cls,
+        rows: AsyncIterator[dict],
+        predicates_set: frozenset[str],
+        page_size: int
+    ) -> AsyncIterator[dict]:
+        seen_nodes = set()
+        links = []
+        last = None
+        rows_read = 0
+        has_more = False
 
-            query = f"""
-            PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-            INSERT DATA {{ <{node_uri}> a <{node_type}>; rdfs:label "{label}". }}
-            """
+        async with aclosing(rows):
+            async for binding in rows:
+                s = binding["s"]["value"]
+                # Страница обрывается только между субъектами: курсор - последний отданный субъект
+                if s != last and rows_read >= page_size:
+                    has_more = True
+                    break
 
-            try:
-                response = requests.post(
-                    graphdb_url,
-                    data={"update": query},
-                    auth=auth,
-                    headers={"Accept": "application/json"}
-                )
-                response.raise_for_status()
-                successful += 1
-            except Exception as e:
-                logger.warning(f"Failed to save node {node_uri}: {e}")
+                p = binding["p"]["value"]
+                o = binding["o"]["value"]
+                is_uri = binding["o"]["type"] == "uri"
+
+                # Позиция курсора сдвигается и на служебных триплетах
+                last = s
+                rows_read += 1
+
+                if cls._is_system_triple(s, p, o, is_uri):
+                    continue
+
+                if s not in seen_nodes and s not in predicates_set:
+                    seen_nodes.add(s)
+                    yield {"kind": "node", **cls._make_node(s)}
+
+                if is_uri and o not in seen_nodes and o not in predicates_set:
+                    seen_nodes.add(o)
+                    yield {"kind": "node", **cls._make_node(o)}
+
+                if is_uri:
+                    links.append({"source": s, "target": o, "predicate": p})
+
+        for link in links:
+            yield {"kind": "link", **link}
+
+        yield {"kind": "end", "next_cursor": encode_cursor([last]) if has_more else None}
+
+    @classmethod
+    def _is_system_uri(cls, uri: str) -> bool:
+        """Проверяет, является ли URI системным (RDF/RDFS/OWL)"""
+        return uri.startswith(cls._SYSTEM_NAMESPACES)
+
+    @classmethod
+    def _is_system_triple(cls, s: str, p: str, o: str, o_is_uri: bool) -> bool:
+        """Служебный триплет: системный субъект, предикат или URI-объект"""
+        return (
+            s.startswith(cls._SYSTEM_NAMESPACES)
+            or p.startswith(cls._SYSTEM_NAMESPACES)
+            or (o_is_uri and o.startswith(cls._SYSTEM_NAMESPACES))
+        )
+
+    @classmethod
+    def _nt_literal(cls, value: str) -> str:
+        """Сериализует строку в литерал N-Triples с экранированием"""
+        escaped = (
+            value.replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+        return f'"{escaped}"'
 
-            total += 1
+    @classmethod
+    def triple(cls, subject: str, predicate: str, object_value: str, object_type: str = "uri") -> dict:
+        """Триплет в формате журнала изменений"""
+        return {"subject": subject, "predicate": predicate, "object": object_value, "object_type": object_type}
 
-        # Обрабатываем связи
+    @classmethod
+    def graph_data_triples(cls, graph_data: dict) -> list[dict]:
+        """
+        Триплеты, которыми save_graph_to_db представляет узлы и связи graph_data.
+        rdf:type записывается только для типов из _NODE_TYPES: остальные типы фронтенда
+        (например, literal) классами RDF не являются, у таких узлов сохраняется только метка.
+        """
+        triples = []
+        for node in graph_data.get("nodes", []):
+            node_uri = node["id"]
+            if node["type"] in cls._NODE_TYPES:
+                triples.append(cls.triple(node_uri, cls._RDF_TYPE, cls._NODE_TYPES[node["type"]]))
+            triples.append(cls.triple(node_uri, cls._RDFS_LABEL, node["label"], "literal"))
         for link in graph_data.get("links", []):
-            source = link['source']
-            predicate = link['predicate']
-            target = link['target']
-
-            # Пропускаем связи с системными URI
-            if cls._is_system_uri(source) or cls._is_system_uri(target) or cls._is_system_uri(predicate):
-                logger.debug(f"Skipping system link: {source} -> {target} ({predicate})")
-                skipped_system += 1
-                continue
+            triples.append(cls.triple(link["source"], link["predicate"], link["target"]))
+        return triples
 
-            # Проверяем, что все URI валидные (начинаются с http:// или https://)
-            if not source.startswith(("http://", "https://")):
-                logger.warning(f"Skipping invalid source URI: {source} (must start with http:// or https://)")
-                total += 1
-                continue
+    @classmethod
+    def _nt_triple(cls, triple: dict) -> str:
+        """Триплет журнала изменений в формате N-Triples"""
+        if triple["object_type"] == "literal":
+            object_value = cls._nt_literal(triple["object"])
+        else:
+            object_value = f"<{triple['object']}>"
+        return f"<{triple['subject']}> <{triple['predicate']}> {object_value} .\n"
+
+    @classmethod
+    def _valid_graph_triples(cls, graph_data: dict) -> dict[tuple, dict]:
+        """
+        Триплеты graph_data без повторов: {(s, p, o, object_type): триплет}.
+        Узлы и связи с некорректными URI пропускаются с предупреждением.
+        """
+        def invalid(uri: str) -> bool:
+            if not uri.startswith(("http://", "https://")):
+                return True
+            try:
+                sparql.iri(uri)
+                return False
+            except ValueError:
+                return True
 
-            if not predicate.startswith(("http://", "https://")):
-                logger.warning(f"Skipping invalid predicate URI: {predicate} (must start with http:// or https://)")
-                total += 1
+        triples: dict[tuple, dict] = {}
+        for node in graph_data.get("nodes", []):
+            if invalid(node["id"]):
+                logger.warning(f"Skipping invalid URI: {node['id']} (must be an absolute http(s) IRI)")
                 continue
+            for triple in cls.graph_data_triples({"nodes": [node]}):
+                triples[cls._triple_key(triple)] = triple
 
-            if not target.startswith(("http://", "https://")):
-                logger.warning(f"Skipping invalid target URI: {target} (must start with http:// or https://)")
-                total += 1
+        for link in graph_data.get("links", []):
+            uris = (link["source"], link["predicate"], link["target"])
+            if any(invalid(uri) for uri in uris):
+                logger.warning(f"Skipping invalid link: {link['source']} -> {link['target']} (predicate: {link['predicate']})")
                 continue
+            triple = cls.triple(*uris)
+            triples[cls._triple_key(triple)] = triple
+        return triples
 
-            query = f"""
-            INSERT DATA {{ <{source}> <{predicate}> <{target}>. }}
-            """
+    @classmethod
+    def _triple_key(cls, triple: dict) -> tuple:
+        return triple["subject"], triple["predicate"], triple["object"], triple["object_type"]
 
-            try:
-                response = requests.post(
-                    graphdb_url,
-                    data={"update": query},
-                    auth=auth,
-                    headers={"Accept": "application/json"}
-                )
-                response.raise_for_status()
-                successful += 1
-            except Exception as e:
-                logger.warning(f"Failed to save link {source} -> {target}: {e}")
+    @classmethod
+    async def _stored_graph_triples(
+        cls,
+        client: GraphDBClient,
+        config: Config,
+        graph_snapshot: GraphSnapshotCache,
+        node_uris: list[str],
+        if_match: Optional[str]
+    ) -> tuple[dict[tuple, dict], int]:
+        """
+        Сохранённые триплеты узлов node_uris, которыми управляет save_graph_to_db, и поколение снимка.
+        Связи - несистемные триплеты с URI-объектом, исходящие из node_uris (то, что клиент видит
+        в GET /graph), берутся из актуального снимка графа; rdf:type и rdfs:label - из GraphDB,
+        причём учитываются лишь типы из _NODE_TYPES и метки без языка.
+        if_match - ETag снимка, который видел клиент; при несовпадении GraphVersionConflict.
+        """
+        snapshot = await graph_snapshot.get(cls.load_graph_view, fresh=True)
+        if if_match is not None and not etag_matches(if_match, snapshot.etag):
+            raise GraphVersionConflict(f"Graph changed since it was read: current ETag is {snapshot.etag}")
+
+        stored: dict[tuple, dict] = {}
+        for link in graph_snapshot.links_from(snapshot, node_uris):
+            triple = cls.triple(link["source"], link["predicate"], link["target"])
+            stored[cls._triple_key(triple)] = triple
+
+        results = await cls._select_batches(client, cls._NODE_DESCRIPTIONS, node_uris, graph=config.graphdb.data_graph)
+        managed_types = set(cls._NODE_TYPES.values())
+        for data in results:
+            for binding in data["results"]["bindings"]:
+                s, p, o = binding["s"]["value"], binding["p"]["value"], binding["o"]
+                if p == cls._RDF_TYPE and o["type"] == "uri" and o["value"] in managed_types:
+                    triple = cls.triple(s, p, o["value"])
+                elif (p == cls._RDFS_LABEL and o["type"] == "literal" and "xml:lang" not in o
+                      and o.get("datatype", cls._XSD_STRING) == cls._XSD_STRING):
+                    triple = cls.triple(s, p, o["value"], "literal")
+                else:
+                    continue
+                stored[cls._triple_key(triple)] = triple
+        return stored, snapshot.generation
+
+    @classmethod
+    @wiring.inject
+    async def save_graph_to_db(
+        cls,
+        graph_data: dict,
+        if_match: Optional[str] = None,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        graph_snapshot: GraphSnapshotCache = Depends(wiring.Provide["graph_snapshot"])
+    ) -> dict:
+        """
+        Сохраняет граф как разницу с уже сохранёнными триплетами одной транзакцией.
+        Записываются только недостающие триплеты; удаляются связи, исходящие из присланных узлов,
+        которых клиент больше не прислал, и изменившиеся тип/метка этих узлов.
+        Триплеты узлов, не попавших в graph_data, не трогаются.
+        if_match - ETag графа, на котором основан graph_data: если граф с тех пор изменился
+        (или изменится до фиксации), бросается GraphVersionConflict и ничего не записывается.
+        Изменения отправляются крупными кусками N-Triples по очереди: действия одной транзакции
+        RDF4J выполняет последовательно; если хотя бы один кусок не записан, транзакция откатывается целиком.
+        Возвращает {"added": [...], "removed": [...], "unchanged": n} (триплеты в формате журнала).
+        """
+        desired = cls._valid_graph_triples(graph_data)
+        # У каждого принятого узла есть триплет метки
+        node_uris = list(dict.fromkeys(key[0] for key in desired if key[1] == cls._RDFS_LABEL))
+        stored, generation = await cls._stored_graph_triples(client, config, graph_snapshot, node_uris, if_match)
+
+        added = [triple for key, triple in desired.items() if key not in stored]
+        removed = [triple for key, triple in stored.items() if key not in desired]
+        unchanged = len(desired) - len(added)
+        result = {"added": added, "removed": removed, "unchanged": unchanged}
+
+        if not added and not removed:
+            logger.info(f"Saved graph to GraphDB: nothing changed ({unchanged} triples unchanged)")
+            return result
 
-            total += 1
+        chunk_size = config.graphdb.upload_chunk_size
+        data_graph = config.graphdb.data_graph
 
-        logger.info(f"Saved graph to GraphDB: {successful}/{total} successful, {skipped_system} system URIs skipped")
-        return successful > 0
+        transaction = await client.begin_transaction()
+
+        try:
+            # Сначала удаления, затем добавления: множества не пересекаются, но так порядок очевиден
+            for action, triples in ((transaction.delete, removed), (transaction.add, added)):
+                for i in range(0, len(triples), chunk_size):
+                    data = "".join(cls._nt_triple(triple) for triple in triples[i:i + chunk_size]).encode("utf-8")
+                    await action(data, context=data_graph)
+            # Другая запись, зафиксированная после чтения снимка, сделала разницу неверной
+            if graph_snapshot.generation != generation:
+                raise GraphVersionConflict("Graph changed while it was being saved")
+            await transaction.commit()
+        except Exception as e:
+            logger.error(f"Failed to save graph: {e}")
+            try:
+                await transaction.rollback()
+            except Exception as rollback_error:
+                logger.warning(f"Failed to roll back transaction: {rollback_error}")
+            if isinstance(e, GraphVersionConflict):
+                raise
+            raise RuntimeError(f"Failed to save graph: {e}")
+
+        logger.info(
+            f"Saved graph to GraphDB: {len(added)} triples added, {len(removed)} removed, {unchanged} unchanged"
+        )
+        return result
 
     @classmethod
+    @wiring.inject
     async def add_triple(
         cls,
         subject: str,
         predicate: str,
         object_value: str,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
         config: Config = Depends(wiring.Provide["config"])
     ) -> bool:
         """
         Добавить один триплет в GraphDB
         """
-        graphdb_url = f"{config.graphdb.url}/repositories/{config.graphdb.repository}/statements"
-        auth = ("admin", "root")
-
-        query = f"""
-        INSERT DATA {{ <{subject}> <{predicate}> <{object_value}>. }}
-        """
-
         try:
-            response = requests.post(
-                graphdb_url,
-                data={"update": query},
-                auth=auth,
-                headers={"Accept": "application/json"}
+            await cls._update(
+                client, cls._TRIPLE_INSERT,
+                graph=config.graphdb.data_graph, subject=subject, predicate=predicate, object=object_value
             )
-            response.raise_for_status()
             logger.info(f"Added triple: <{subject}> <{predicate}> <{object_value}>")
             return True
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Failed to add triple: {e}")
             raise RuntimeError(f"Failed to add triple: {e}")
 
     @classmethod
+    @wiring.inject
     async def delete_triple(
         cls,
         subject: str,
         predicate: str,
         object_value: str,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
         config: Config = Depends(wiring.Provide["config"])
     ) -> bool:
         """
         Удалить один триплет из GraphDB
         """
-        graphdb_url = f"{config.graphdb.url}/repositories/{config.graphdb.repository}/statements"
-        auth = ("admin", "root")
-
-        query = f"""
-        DELETE DATA {{ <{subject}> <{predicate}> <{object_value}>. }}
-        """
-
         try:
-            response = requests.post(
-                graphdb_url,
-                data={"update": query},
-                auth=auth,
-                headers={"Accept": "application/json"}
+            await cls._update(
+                client, cls._TRIPLE_DELETE,
+                graph=config.graphdb.data_graph, subject=subject, predicate=predicate, object=object_value
             )
-            response.raise_for_status()
             logger.info(f"Deleted triple: <{subject}> <{predicate}> <{object_value}>")
             return True
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Failed to delete triple: {e}")
             raise RuntimeError(f"Failed to delete triple: {e}")
 
     @classmethod
-    async def delete_node(
+    def net_patch(
         cls,
-        node_uri: str,
-        config: Config = Depends(wiring.Provide["config"])
-    ) -> bool:
+        operations: list[dict],
+        existing: Optional[set[tuple[str, str, str]]] = None
+    ) -> tuple[list[dict], list[dict], list[str]]:
         """
-        Удалить узел и все связанные с ним триплеты из GraphDB
-        Удаляет все триплеты, где узел является субъектом или объектом
+        Сводит упорядоченные операции патча (add/remove/replace) к итоговым изменениям:
+        для каждого триплета важна только последняя затронувшая его операция.
+        existing - те из затронутых триплетов, что уже есть в графе: если задан, в изменения
+        попадает только то, что меняет граф, а операция без эффекта получает статус noop.
+        Возвращает (добавляемые триплеты, удаляемые триплеты, статус каждой операции):
+        applied, superseded (перекрыта более поздней операцией) или noop.
         """
-        graphdb_url = f"{config.graphdb.url}/repositories/{config.graphdb.repository}/statements"
-        auth = ("admin", "root")
+        # (s, p, o) -> (триплет присутствует после патча, индекс последней операции)
+        final: dict[tuple[str, str, str], tuple[bool, int]] = {}
+        for index, operation in enumerate(operations):
+            old = operation["triple"]
+            if operation["op"] == "add":
+                final[(old["subject"], old["predicate"], old["object"])] = (True, index)
+            else:
+                final[(old["subject"], old["predicate"], old["object"])] = (False, index)
+            if operation["op"] == "replace":
+                new = operation["new_triple"]
+                final[(new["subject"], new["predicate"], new["object"])] = (True, index)
+
+        added, removed = [], []
+        statuses = ["superseded"] * len(operations)
+        for key, (present, index) in final.items():
+            if existing is not None and (key in existing) == present:
+                if statuses[index] == "superseded":
+                    statuses[index] = "noop"
+                continue
+            (added if present else removed).append(cls.triple(*key))
+            statuses[index] = "applied"
+        return added, removed, statuses
 
-        # Удаляем все триплеты, где узел является субъектом
-        query1 = f"""
-        DELETE WHERE {{ <{node_uri}> ?p ?o . }}
-        """
+    @classmethod
+    def patch_keys(cls, operations: list[dict]) -> list[tuple[str, str, str]]:
+        """Все триплеты, которые затрагивают операции патча"""
+        keys = {}
+        for operation in operations:
+            for triple in (operation["triple"], operation.get("new_triple")):
+                if triple:
+                    keys[(triple["subject"], triple["predicate"], triple["object"])] = None
+        return list(keys)
 
-        # Удаляем все триплеты, где узел является объектом
-        query2 = f"""
-        DELETE WHERE {{ ?s ?p <{node_uri}> . }}
+    @classmethod
+    @wiring.inject
+    async def patch_triples(
+        cls,
+        operations: List[dict],
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"])
+    ) -> tuple[list[dict], list[dict], list[str]]:
         """
+        Применить операции патча атомарно: в одной транзакции RDF4J читается, какие из затронутых
+        триплетов уже есть в графе, и одним SPARQL UPDATE удаляется и добавляется только то,
+        что граф меняет. Либо применяются все изменения, либо ни одно.
+        Возвращает фактически добавленные и удалённые триплеты и статусы операций (см. net_patch).
+        """
+        keys = cls.patch_keys(operations)
+        if not keys:
+            return [], [], []
+        data_graph = config.graphdb.data_graph
+        # Запрос проверяется до транзакции: некорректный URI - ValueError без обращения к GraphDB
+        existing_query = cls._TRIPLES_EXISTING.render(
+            graph=data_graph,
+            triples=Fragment("\n".join(
+                cls._TRIPLE_VALUES.render(subject=s, predicate=p, object=o) for s, p, o in keys
+            ))
+        )
+
+        def data(triples: List[dict]) -> Fragment:
+            return Fragment("\n".join(
+                cls._TRIPLE_DATA.render(subject=t["subject"], predicate=t["predicate"], object=t["object"])
+                for t in triples
+            ))
 
         try:
-            # Выполняем первый запрос
-            response = requests.post(
-                graphdb_url,
-                data={"update": query1},
-                auth=auth,
-                headers={"Accept": "application/json"}
-            )
-            response.raise_for_status()
-
-            # Выполняем второй запрос
-            response = requests.post(
-                graphdb_url,
-                data={"update": query2},
-                auth=auth,
-                headers={"Accept": "application/json"}
-            )
-            response.raise_for_status()
+            transaction = await client.begin_transaction()
+        except Exception as e:
+            logger.error(f"Failed to patch graph: {e}")
+            raise RuntimeError(f"Failed to patch graph: {e}")
+        try:
+            results = await cls._select_rendered(transaction, cls._TRIPLES_EXISTING, existing_query)
+            existing = {
+                (row["s"]["value"], row["p"]["value"], row["o"]["value"])
+                for row in results["results"]["bindings"]
+            }
+            added, removed, statuses = cls.net_patch(operations, existing)
+            if added or removed:
+                await cls._update(
+                    transaction, cls._TRIPLES_PATCH, graph=data_graph, removed=data(removed), added=data(added)
+                )
+            await transaction.commit()
+        except Exception as e:
+            logger.error(f"Failed to patch graph: {e}")
+            try:
+                await transaction.rollback()
+            except Exception as rollback_error:
+                logger.warning(f"Failed to roll back transaction: {rollback_error}")
+            raise RuntimeError(f"Failed to patch graph: {e}")
 
-            logger.info(f"Deleted node: <{node_uri}> and all related triples")
-            return True
+        logger.info(f"Patched graph: {len(removed)} triples removed, {len(added)} added")
+        return added, removed, statuses
+
+    @classmethod
+    @wiring.inject
+    async def delete_node(
+        cls,
+        node_uri: str,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"])
+    ) -> List[dict]:
+        """
+        Удалить узел и все связанные с ним триплеты из GraphDB
+        Удаляет все триплеты, где узел является субъектом или объектом.
+        Возвращает удалённые триплеты (для журнала изменений).
+        """
+        data_graph = config.graphdb.data_graph
+        # Запросы собираются до транзакции: некорректный URI - ValueError без обращения к GraphDB
+        select = cls._NODE_TRIPLES.render(graph=data_graph, node=node_uri)
+        delete = cls._NODE_DELETE.render(graph=data_graph, node=node_uri)
+
+        # Чтение и удаление в одной транзакции: удаляется ровно то, что прочитано для журнала
+        try:
+            transaction = await client.begin_transaction()
         except Exception as e:
             logger.error(f"Failed to delete node: {e}")
             raise RuntimeError(f"Failed to delete node: {e}")
+        try:
+            results = await cls._select_rendered(transaction, cls._NODE_TRIPLES, select)
+            removed = [
+                cls.triple(
+                    row["s"]["value"],
+                    row["p"]["value"],
+                    row["o"]["value"],
+                    "uri" if row["o"]["type"] == "uri" else "literal",
+                )
+                for row in results["results"]["bindings"]
+            ]
+            await cls._update_rendered(transaction, cls._NODE_DELETE, delete)
+            await transaction.commit()
+        except Exception as e:
+            logger.error(f"Failed to delete node: {e}")
+            try:
+                await transaction.rollback()
+            except Exception as rollback_error:
+                logger.warning(f"Failed to roll back transaction: {rollback_error}")
+            raise RuntimeError(f"Failed to delete node: {e}")
+
+        logger.info(f"Deleted node: <{node_uri}> and {len(removed)} related triples")
+        return removed
 
     @classmethod
+    @wiring.inject
     async def clear_repository(
         cls,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
         config: Config = Depends(wiring.Provide["config"])
     ) -> bool:
         """
-        Очистить весь репозиторий GraphDB
+        Очистить граф пользовательских данных GraphDB
         ВНИМАНИЕ: Удаляет ВСЕ данные!
         """
-        graphdb_url = f"{config.graphdb.url}/repositories/{config.graphdb.repository}/statements"
-        auth = ("admin", "root")
-
-        query = """
-        DELETE WHERE { ?s ?p ?o . }
-        """
-
         try:
-            response = requests.post(
-                graphdb_url,
-                data={"update": query},
-                auth=auth,
-                headers={"Accept": "application/json"}
-            )
-            response.raise_for_status()
-            logger.warning("Cleared entire repository!")
+            await cls._update(client, cls._GRAPH_CLEAR, graph=config.graphdb.data_graph)
+            logger.warning(f"Cleared data graph {config.graphdb.data_graph}!")
             return True
         except Exception as e:
             logger.error(f"Failed to clear repository: {e}")
             raise RuntimeError(f"Failed to clear repository: {e}")
+
+    @classmethod
+    @wiring.inject
+    async def migrate_default_graph(
+        cls,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"])
+    ) -> dict:
+        """
+        Переносит явные триплеты из графа по умолчанию в именованный граф данных
+        одной транзакцией. Строка N-Triples разбирается на термы, и в графе по умолчанию
+        остаются триплеты с blank node в субъекте или объекте (их метки не переживают
+        перенос по частям), с системным субъектом и строки, которые не удалось разобрать.
+        Возвращает отчёт: {"moved", "skipped_blank_nodes", "skipped_system", "unparsed", "samples"},
+        где samples - несколько оставленных строк для проверки.
+        """
+        data_graph = config.graphdb.data_graph
+        chunk_size = config.graphdb.upload_chunk_size
+        chunk: list[str] = []
+        report = {"moved": 0, "skipped_blank_nodes": 0, "skipped_system": 0, "unparsed": 0, "samples": []}
+
+        def leave(reason: str, line: str) -> None:
+            report[reason] += 1
+            if len(report["samples"]) < cls._MIGRATION_SAMPLES:
+                report["samples"].append(line)
+
+        async def flush() -> None:
+            data = "".join(chunk).encode("utf-8")
+            await transaction.add(data, context=data_graph)
+            await transaction.delete(data, context=NULL_CONTEXT)
+            chunk.clear()
+
+        transaction = await client.begin_transaction()
+        try:
+            async with aclosing(client.stream_statements(context=NULL_CONTEXT)) as lines:
+                async for line in lines:
+                    terms = parse_n_triples(line)
+                    if terms is None:
+                        leave("unparsed", line)
+                        continue
+                    subject, _, object_term = terms
+                    if subject["type"] == "bnode" or object_term["type"] == "bnode":
+                        leave("skipped_blank_nodes", line)
+                        continue
+                    if cls._is_system_uri(subject["value"]):
+                        leave("skipped_system", line)
+                        continue
+                    chunk.append(line + "\n")
+                    report["moved"] += 1
+                    if len(chunk) >= chunk_size:
+                        await flush()
+            if chunk:
+                await flush()
+            await transaction.commit()
+        except Exception as e:
+            logger.error(f"Failed to migrate default graph: {e}")
+            try:
+                await transaction.rollback()
+            except Exception as rollback_error:
+                logger.warning(f"Failed to roll back transaction: {rollback_error}")
+            raise RuntimeError(f"Failed to migrate default graph: {e}")
+
+        left = report["skipped_blank_nodes"] + report["skipped_system"] + report["unparsed"]
+        logger.info(
+            f"Moved {report['moved']} triples from the default graph to <{data_graph}>, {left} left behind "
+            f"({report['skipped_blank_nodes']} with blank nodes, {report['skipped_system']} system, "
+            f"{report['unparsed']} unparsed)"
+        )
+        return report
     #11111111111111111111111111111111111111111111111111111111111111111111111111111111111111111111111111111111
 
 
@@ -426,133 +998,111 @@ class CompetencyDAO:
         depth: int = 2,
         limit: int = 50,
         offset: int = 0,
-        client: SPARQLWrapper = Depends(wiring.Provide["graphdb_client"]),
-        config: Config = Depends(wiring.Provide["config"])
+        cursor: Optional[str] = None,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        graph_snapshot: GraphSnapshotCache = Depends(wiring.Provide["graph_snapshot"]),
+        graph_parts: GraphPartCache = Depends(wiring.Provide["graph_part_cache"])
     ) -> dict:
         """
-        Возвращает часть графа в формате:
+        Возвращает часть графа, достижимую из start_from не более чем за depth переходов.
+        Обход в ширину по исходящим связям: уровни раскрываются пачками (VALUES) и только пока
+        не набралась страница. Обход запоминается (GraphPartCache) до следующей записи в граф,
+        так что следующая страница продолжает его с курсора, а не обходит граф заново.
+        Узлы упорядочены по ключу (distance, URI); cursor - ключ последнего узла предыдущей
+        страницы, offset используется для совместимости, только если cursor не передан.
+        ValueError - если курсор повреждён.
+        Формат:
         {
             "nodes": [
-                {"id": "...", "label": "...", "type": "..."}
+                {"id": "...", "label": "...", "type": "...", "distance": 0}
             ],
             "links": [
                 {"source": "...", "target": "...", "predicate": "..."}
-            ]
+            ],
+            "next_cursor": "..."
         }
         """
-        prefixes = cls._prefix_str(config)
         repo = config.graphdb.repository
 
         # Обработка URI
         if start_from.startswith(("http://", "https://")):
-            start_uri = f"<{start_from}>"
+            start_uri = start_from
         else:
-            start_uri = f"<http://example.org/{repo}#{start_from}>"
+            start_uri = f"http://example.org/{repo}#{start_from}"
 
-        # Упрощённый запрос для получения части графа
-        query = f"""
-        {prefixes}
-
-        SELECT DISTINCT ?id ?label ?type
-        WHERE {{
-            {{
-                # Получаем начальный узел
-                BIND({start_uri} AS ?id)
-                OPTIONAL {{ ?id rdfs:label ?label . }}
-            }}
-            UNION
-            {{
-                # Получаем узлы напрямую связанные (глубина 1)
-                {start_uri} ?p1 ?id .
-                OPTIONAL {{ ?id rdfs:label ?label . }}
-            }}
-            UNION
-            {{
-                # Получаем узлы на глубине 2
-                {start_uri} ?p1 ?mid1 .
-                ?mid1 ?p2 ?id .
-                OPTIONAL {{ ?id rdfs:label ?label . }}
-            }}
+        after = None
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            if not (isinstance(position, list) and len(position) == 2
+                    and isinstance(position[0], int) and isinstance(position[1], str)):
+                raise ValueError(f"Invalid cursor: {cursor}")
+            after = (position[0], position[1])
+            offset = 0
 
-            # Определяем тип узла
-            BIND(
-                IF(EXISTS {{ ?id a rdfs:Class }}, "class",
-                IF(EXISTS {{ ?id a rdf:Property }}, "property",
-                "literal")) AS ?type)
-        }}
-        OFFSET {offset}
-        LIMIT {limit}
-        """
+        traversal = graph_parts.traversal(start_uri, depth, graph_snapshot.generation, cls._is_graph_part_link)
 
-        data = await cls._execute_stmt(client, query)
+        async def load_edges(uris: list[str]) -> list[tuple[str, str, str, bool]]:
+            return await cls._get_out_edges(client, config, uris)
 
-        # Собираем результаты - только узлы
+        page, has_more = await traversal.page(load_edges, limit, after, offset)
+        page_set = set(page)
         nodes = []
-        seen_nodes = set()
-
-        for binding in data["results"]["bindings"]:
-            # Обработка узлов
-            if "id" in binding:
-                node_id = binding["id"]["value"]
-                if node_id not in seen_nodes:
-                    seen_nodes.add(node_id)
-                    nodes.append({
-                        "id": node_id,
-                        "label": binding.get("label", {}).get("value", node_id),
-                        "type": binding.get("type", {}).get("value", "class")
-                    })
-
-        # Получаем связи между найденными узлами
-        links = await cls._get_links_between_nodes(client, config, list(seen_nodes))
+        links = []
+        for uri in page:
+            node_types = set()
+            label = None
+            for s, p, o, is_uri in traversal.edges(uri):
+                if p == cls._RDF_TYPE:
+                    node_types.add(o)
+                elif p == cls._RDFS_LABEL and not is_uri:
+                    label = label or o
+                elif s != o and o in page_set and cls._is_graph_part_link(s, p, o, is_uri):
+                    links.append({"source": s, "target": o, "predicate": p})
+
+            if "http://www.w3.org/2000/01/rdf-schema#Class" in node_types:
+                node_type = "class"
+            elif "http://www.w3.org/1999/02/22-rdf-syntax-ns#Property" in node_types:
+                node_type = "property"
+            else:
+                node_type = "literal"
+            nodes.append({
+                "id": uri,
+                "label": label or uri,
+                "type": node_type,
+                "distance": traversal.distance(uri)
+            })
 
         return {
             "nodes": nodes,
-            "links": links
+            "links": links,
+            "next_cursor": encode_cursor([traversal.distance(page[-1]), page[-1]]) if has_more else None
         }
 
     @classmethod
-    async def _get_links_between_nodes(
+    def _is_graph_part_link(cls, s: str, p: str, o: str, is_uri: bool) -> bool:
+        """Связь части графа: несистемный триплет с URI-объектом (rdf:type и метки - свойства узла)"""
+        return is_uri and not cls._is_system_triple(s, p, o, is_uri)
+
+    @classmethod
+    async def _get_out_edges(
         cls,
-        client: SPARQLWrapper,
+        client: GraphDBClient,
         config: Config,
         node_uris: list[str]
-    ) -> list[dict]:
-        """Получить связи между указанными узлами"""
-        if not node_uris:
-            return []
-
-        prefixes = cls._prefix_str(config)
-
-        # Формируем VALUES для узлов
-        values_clause = " ".join([f"<{uri}>" for uri in node_uris])
-
-        query = f"""
-        {prefixes}
-
-        SELECT DISTINCT ?source ?target ?predicate
-        WHERE {{
-            VALUES ?source {{ {values_clause} }}
-            VALUES ?target {{ {values_clause} }}
-            ?source ?predicate ?target .
-            FILTER(?source != ?target)
-        }}
-        """
-
-        try:
-            data = await cls._execute_stmt(client, query)
-            links = []
-            for binding in data["results"]["bindings"]:
-                if "source" in binding and "target" in binding:
-                    links.append({
-                        "source": binding["source"]["value"],
-                        "target": binding["target"]["value"],
-                        "predicate": binding.get("predicate", {}).get("value",
-                            "http://www.w3.org/1999/02/22-rdf-syntax-ns#type")
-                    })
-            return links
-        except Exception as e:
-            logger.warning(f"Error getting links between nodes: {e}")
-            return []
+    ) -> list[tuple[str, str, str, bool]]:
+        """Все исходящие триплеты указанных узлов (пачками VALUES): (s, p, o, объект - URI)"""
+        results = await cls._select_batches(client, cls._OUT_EDGES, node_uris, graph=config.graphdb.data_graph)
+        return [
+            (
+                binding["s"]["value"],
+                binding["p"]["value"],
+                binding["o"]["value"],
+                binding["o"]["type"] == "uri",
+            )
+            for data in results
+            for binding in data["results"]["bindings"]
+        ]
 
     @classmethod
     async def get_graph_part_from_json(
@@ -588,6 +1138,83 @@ class CompetencyDAO:
 
 
 
+    @classmethod
+    def _competency_uri(cls, competency_id: str, config: Config) -> str:
+        """Полный URI компетенции: локальные имена дополняются namespace репозитория"""
+        if competency_id.startswith("http://") or competency_id.startswith("https://"):
+            return competency_id
+        return f"http://example.org/{config.graphdb.repository}#{competency_id}"
+
+    @classmethod
+    def _index_nodes(cls, hierarchy_index: HierarchyIndex, uris: list[str]) -> List[OntologyNode]:
+        return [
+            OntologyNode(id=uri, label=hierarchy_index.label(uri), type=NodeType.CLASS, level=hierarchy_index.level(uri))
+            for uri in uris
+        ]
+
+    @classmethod
+    async def _db_nodes(cls, client: GraphDBClient, config: Config, uris: list[str]) -> dict[str, OntologyNode]:
+        """Узлы иерархии с метками и уровнями из GraphDB: {uri: узел}"""
+        labels, levels = await asyncio.gather(
+            cls._get_labels(client, config, uris),
+            cls._get_levels(client, config, uris),
+        )
+        return {
+            uri: OntologyNode(id=uri, label=labels.get(uri, uri), type=NodeType.CLASS, level=levels.get(uri))
+            for uri in uris
+        }
+
+    @classmethod
+    def _level_filter(cls, config: Config, level: Optional[int], max_level: Optional[int]) -> Fragment:
+        """
+        FILTER по уровню ?related (уровень - наименьший N из :hasLevelN) для SPARQL-пути.
+        Соединения с предикатами уровней появляются в запросе, только если фильтр задан.
+        """
+        predicates = {n: uri for uri, n in level_predicates(config.graphdb.ontology_namespace).items()}
+        clauses = []
+        if level is not None:
+            clauses.append(cls._LEVEL_EXACT.render(predicate=predicates[level]))
+            if level > 1:
+                clauses.append(cls._LEVEL_NOT_LOWER.render(predicates=[predicates[n] for n in range(1, level)]))
+        if max_level is not None:
+            clauses.append(cls._LEVEL_AT_MOST.render(predicates=[predicates[n] for n in range(1, max_level + 1)]))
+        return Fragment("\n".join(clauses))
+
+    @classmethod
+    @wiring.inject
+    async def load_hierarchy_index(
+        cls,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        hierarchy_index: HierarchyIndex = Depends(wiring.Provide["hierarchy_index"])
+    ) -> None:
+        """
+        Загружает в индекс иерархии все рёбра hasSubCompetence, метки и уровни узлов.
+        Изменения, пришедшие во время загрузки, индекс переигрывает сам.
+        """
+        data_graph = config.graphdb.data_graph
+        predicates = level_predicates(config.graphdb.ontology_namespace)
+
+        hierarchy_index.begin_build()
+        try:
+            edges = [
+                (row["parent"]["value"], row["child"]["value"])
+                async for row in cls._stream(client, cls._INDEX_EDGES, graph=data_graph)
+            ]
+            labels = [
+                (row["node"]["value"], row["label"]["value"])
+                async for row in cls._stream(client, cls._INDEX_LABELS, graph=data_graph)
+                if "label" in row
+            ]
+            levels = [
+                (row["node"]["value"], predicates[row["predicate"]["value"]], row["value"]["value"])
+                async for row in cls._stream(client, cls._INDEX_LEVELS, graph=data_graph, predicates=list(predicates))
+            ]
+        except Exception:
+            hierarchy_index.abort_build()
+            raise
+        hierarchy_index.finish_build(edges, labels, levels)
+
     @classmethod
     @wiring.inject
     async def get_ancestors(
@@ -595,68 +1222,21 @@ class CompetencyDAO:
         competency_id: str,
         limit: int = 50,
         offset: int = 0,
-        client: SPARQLWrapper = Depends(wiring.Provide["graphdb_client"]),
-        config: Config = Depends(wiring.Provide["config"])
-    ) -> List[OntologyNode]:
-        """
-        Возвращает предков компетенции с идентификатором `competency_id`,
-        с учетом лимита и смещения (offset).
+        cursor: Optional[str] = None,
+        level: Optional[int] = None,
+        max_level: Optional[int] = None,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        hierarchy_index: HierarchyIndex = Depends(wiring.Provide["hierarchy_index"])
+    ) -> dict:
         """
-        prefixes = cls._prefix_str(config)
-
-        if competency_id.startswith("http://") or competency_id.startswith("https://"):
-            comp_uri = f"<{competency_id}>"
-        else:
-            comp_uri = f"<http://example.org/{config.graphdb.repository}#{competency_id}>"
-
-        query = f"""
-        {prefixes}
-
-        SELECT DISTINCT ?ancestor ?label ?level
-        WHERE {{
-        ?ancestor (<http://example.org/hasSubCompetence>)+ {comp_uri} .
-        OPTIONAL {{ ?ancestor rdfs:label ?label . }}
-        OPTIONAL {{
-            ?ancestor :hasLevel1 ?_ .
-            BIND(1 AS ?level)
-        }}
-        OPTIONAL {{
-            ?ancestor :hasLevel2 ?_ .
-            BIND(2 AS ?level)
-        }}
-        OPTIONAL {{
-            ?ancestor :hasLevel3 ?_ .
-            BIND(3 AS ?level)
-        }}
-        OPTIONAL {{
-            ?ancestor :hasLevel4 ?_ .
-            BIND(4 AS ?level)
-        }}
-        OPTIONAL {{
-            ?ancestor :hasLevel5 ?_ .
-            BIND(5 AS ?level)
-        }}
-        }}
-        OFFSET {offset}
-        LIMIT {limit}
+        Возвращает страницу предков компетенции с идентификатором `competency_id`:
+        {"nodes": [...], "next_cursor": ...}. Подробнее - _get_hierarchy_page.
         """
-
-        data = await cls._execute_stmt(client, query)
-
-        ancestors = []
-        for binding in data["results"]["bindings"]:
-            ancestor_uri = binding["ancestor"]["value"]
-            label = binding.get("label", {}).get("value", ancestor_uri)
-
-            ancestors.append(
-                OntologyNode(
-                    id=ancestor_uri,
-                    label=label,
-                    type=NodeType.CLASS
-                )
-            )
-
-        return ancestors
+        return await cls._get_hierarchy_page(
+            client, config, hierarchy_index, competency_id, limit, offset, cursor,
+            level, max_level, ancestors=True
+        )
 
     @classmethod
     @wiring.inject
@@ -665,68 +1245,194 @@ class CompetencyDAO:
         competency_id: str,
         limit: int = 50,
         offset: int = 0,
-        client: SPARQLWrapper = Depends(wiring.Provide["graphdb_client"]),
-        config: Config = Depends(wiring.Provide["config"])
-    ) -> List[OntologyNode]:
+        cursor: Optional[str] = None,
+        level: Optional[int] = None,
+        max_level: Optional[int] = None,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        hierarchy_index: HierarchyIndex = Depends(wiring.Provide["hierarchy_index"])
+    ) -> dict:
         """
-        Возвращает потомков компетенции с идентификатором `competency_id`,
-        с учетом лимита и смещения (offset).
+        Возвращает страницу потомков компетенции с идентификатором `competency_id`:
+        {"nodes": [...], "next_cursor": ...}. Подробнее - _get_hierarchy_page.
         """
-        prefixes = cls._prefix_str(config)
+        return await cls._get_hierarchy_page(
+            client, config, hierarchy_index, competency_id, limit, offset, cursor,
+            level, max_level, ancestors=False
+        )
 
-        if competency_id.startswith("http://") or competency_id.startswith("https://"):
-            comp_uri = f"<{competency_id}>"
+    @classmethod
+    async def _get_hierarchy_page(
+        cls,
+        client: GraphDBClient,
+        config: Config,
+        hierarchy_index: HierarchyIndex,
+        competency_id: str,
+        limit: int,
+        offset: int,
+        cursor: Optional[str],
+        level: Optional[int],
+        max_level: Optional[int],
+        ancestors: bool
+    ) -> dict:
+        """
+        Страница предков/потомков, упорядоченных по URI, с фильтром по уровню (level/max_level).
+        Keyset-пагинация: cursor - непрозрачный ключ последнего узла предыдущей страницы,
+        страницы не пересекаются и не теряют узлы; offset оставлен для совместимости
+        и используется, только если cursor не передан.
+        Отвечает из индекса иерархии в памяти (страница - бинарный поиск курсора в отсортированном
+        замыкании узла); пока индекс не построен - запросом в GraphDB.
+        ValueError - если курсор повреждён.
+        """
+        comp_uri = cls._competency_uri(competency_id, config)
+        after = None
+        if cursor is not None:
+            after = decode_cursor(cursor)
+            if not isinstance(after, str):
+                raise ValueError(f"Invalid cursor: {cursor}")
+            offset = 0
+
+        if hierarchy_index.ready:
+            keep = None
+            if level is not None or max_level is not None:
+                keep = lambda uri: level_matches(hierarchy_index.level(uri), level, max_level)
+            page, has_more = hierarchy_index.related_page(comp_uri, ancestors, limit, after, offset, keep)
+            nodes = cls._index_nodes(hierarchy_index, page)
         else:
-            comp_uri = f"<http://example.org/{config.graphdb.repository}#{competency_id}>"
+            # Без индекса страница ищется от курсора (FILTER по ключу + LIMIT);
+            # offset без курсора - только для совместимости, его строки отбрасываются здесь
+            data = await cls._select(
+                client,
+                cls._ANCESTORS_PAGE if ancestors else cls._DESCENDANTS_PAGE,
+                graph=config.graphdb.data_graph,
+                node=comp_uri,
+                level_filter=cls._level_filter(config, level, max_level),
+                after=cls._RELATED_AFTER.render(after=after) if after is not None else EMPTY,
+                limit=offset + limit + 1
+            )
+            page = [binding["related"]["value"] for binding in data["results"]["bindings"]][offset:]
+            has_more = len(page) > limit
+            found = await cls._db_nodes(client, config, page[:limit])
+            nodes = list(found.values())
 
-        query = f"""
-        {prefixes}
+        return {
+            "nodes": nodes,
+            "next_cursor": encode_cursor(nodes[-1].id) if has_more else None
+        }
 
-        SELECT DISTINCT ?descendant ?label ?level
-        WHERE {{
-        {comp_uri} (<http://example.org/hasSubCompetence>)+ ?descendant .
-        OPTIONAL {{ ?descendant rdfs:label ?label . }}
-        OPTIONAL {{
-            ?descendant :hasLevel1 ?_ .
-            BIND(1 AS ?level)
-        }}
-        OPTIONAL {{
-            ?descendant :hasLevel2 ?_ .
-            BIND(2 AS ?level)
-        }}
-        OPTIONAL {{
-            ?descendant :hasLevel3 ?_ .
-            BIND(3 AS ?level)
-        }}
-        OPTIONAL {{
-            ?descendant :hasLevel4 ?_ .
-            BIND(4 AS ?level)
-        }}
-        OPTIONAL {{
-            ?descendant :hasLevel5 ?_ .
-            BIND(5 AS ?level)
-        }}
-        }}
-        OFFSET {offset}
-        LIMIT {limit}
+    @classmethod
+    @wiring.inject
+    async def get_ancestors_many(
+        cls,
+        competency_ids: List[str],
+        limit: int = 100,
+        level: Optional[int] = None,
+        max_level: Optional[int] = None,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        hierarchy_index: HierarchyIndex = Depends(wiring.Provide["hierarchy_index"])
+    ) -> dict[str, List[OntologyNode]]:
+        """Предки сразу для многих компетенций: {id: [узлы]}, не больше limit на узел"""
+        return await cls._get_hierarchy_many(
+            client, config, hierarchy_index, competency_ids, limit, level, max_level, ancestors=True
+        )
+
+    @classmethod
+    @wiring.inject
+    async def get_descendants_many(
+        cls,
+        competency_ids: List[str],
+        limit: int = 100,
+        level: Optional[int] = None,
+        max_level: Optional[int] = None,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        hierarchy_index: HierarchyIndex = Depends(wiring.Provide["hierarchy_index"])
+    ) -> dict[str, List[OntologyNode]]:
+        """Потомки сразу для многих компетенций: {id: [узлы]}, не больше limit на узел"""
+        return await cls._get_hierarchy_many(
+            client, config, hierarchy_index, competency_ids, limit, level, max_level, ancestors=False
+        )
+
+    @classmethod
+    async def _get_hierarchy_many(
+        cls,
+        client: GraphDBClient,
+        config: Config,
+        hierarchy_index: HierarchyIndex,
+        competency_ids: List[str],
+        limit: int,
+        level: Optional[int],
+        max_level: Optional[int],
+        ancestors: bool
+    ) -> dict[str, List[OntologyNode]]:
+        """
+        Общая часть пакетных запросов предков/потомков: на узел - первые по URI limit найденных.
+        Из индекса каждый узел обходится один раз с отбором limit лучших по ходу обхода.
+        Без индекса узлы пачки объединяются через UNION подзапросов со своим LIMIT в один запрос,
+        а метки найденных узлов запрашиваются один раз для всего ответа.
         """
+        uris = {competency_id: cls._competency_uri(competency_id, config) for competency_id in competency_ids}
+
+        if hierarchy_index.ready:
+            keep = None
+            if level is not None or max_level is not None:
+                keep = lambda uri: level_matches(hierarchy_index.level(uri), level, max_level)
+            related = hierarchy_index.related_many(uris.values(), ancestors, limit, keep)
+            return {
+                competency_id: cls._index_nodes(hierarchy_index, related[uri])
+                for competency_id, uri in uris.items()
+            }
+
+        distinct = list(dict.fromkeys(uris.values()))
+        level_filter = cls._level_filter(config, level, max_level)
+        node_query = cls._ANCESTORS_OF_NODE if ancestors else cls._DESCENDANTS_OF_NODE
+        template = cls._ANCESTORS_MANY if ancestors else cls._DESCENDANTS_MANY
+        # Все пачки проверяются до первого запроса, затем выполняются параллельно
+        queries = []
+        for i in range(0, len(distinct), cls._UNION_BATCH_SIZE):
+            parts = [
+                node_query.render(graph=config.graphdb.data_graph, node=uri, level_filter=level_filter, limit=limit)
+                for uri in distinct[i:i + cls._UNION_BATCH_SIZE]
+            ]
+            queries.append(template.render(nodes=Fragment("\nUNION\n".join(parts))))
+        results = await asyncio.gather(*(cls._select_rendered(client, template, query) for query in queries))
 
-        data = await cls._execute_stmt(client, query)
+        related: dict[str, list[str]] = {uri: [] for uri in distinct}
+        for data in results:
+            for binding in data["results"]["bindings"]:
+                related[binding["node"]["value"]].append(binding["related"]["value"])
 
-        descendants = []
-        for binding in data["results"]["bindings"]:
-            descendant_uri = binding["descendant"]["value"]
-            label = binding.get("label", {}).get("value", descendant_uri)
-
-            descendants.append(
-                OntologyNode(
-                    id=descendant_uri,
-                    label=label,
-                    type=NodeType.CLASS
-                )
-            )
+        nodes = await cls._db_nodes(client, config, list({uri for found in related.values() for uri in found}))
+        return {
+            competency_id: [nodes[found] for found in related[uri]]
+            for competency_id, uri in uris.items()
+        }
+
+    @classmethod
+    @wiring.inject
+    async def is_descendant(
+        cls,
+        node_id: str,
+        ancestor_id: str,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        hierarchy_index: HierarchyIndex = Depends(wiring.Provide["hierarchy_index"])
+    ) -> bool:
+        """
+        Проверяет, находится ли node_id в поддереве ancestor_id по связям :hasSubCompetence.
+        Из индекса иерархии - сравнение интервалов; пока индекс не построен - ASK в GraphDB.
+        """
+        node_uri = cls._competency_uri(node_id, config)
+        ancestor_uri = cls._competency_uri(ancestor_id, config)
+
+        if hierarchy_index.ready:
+            return hierarchy_index.is_descendant(node_uri, ancestor_uri)
 
-        return descendants
+        data = await cls._select(
+            client, cls._IS_DESCENDANT, graph=config.graphdb.data_graph, ancestor=ancestor_uri, node=node_uri
+        )
+        return bool(data.get("boolean"))
 
     @classmethod
     @wiring.inject
@@ -734,57 +1440,106 @@ class CompetencyDAO:
         cls,
         start_id: str,
         end_id: str,
-        client: SPARQLWrapper = Depends(wiring.Provide["graphdb_client"]),
-        config: Config = Depends(wiring.Provide["config"])
-    ) -> List[OntologyNode]:
+        max_length: Optional[int] = None,
+        client: GraphDBClient = Depends(wiring.Provide["graphdb_client"]),
+        config: Config = Depends(wiring.Provide["config"]),
+        hierarchy_index: HierarchyIndex = Depends(wiring.Provide["hierarchy_index"])
+    ) -> dict:
         """
-        Находит путь от start_id до end_id по связям :hasSubCompetence.
-        Возвращает список узлов на пути или пустой список, если путь не найден.
+        Находит кратчайший путь от start_id до end_id по связям :hasSubCompetence
+        (не длиннее max_length рёбер). Возвращает узлы в порядке пути и связи между ними;
+        если путь не найден - пустые списки.
+        Отвечает из индекса иерархии в памяти; пока он не построен - двунаправленным
+        обходом в GraphDB, где каждый уровень раскрывается пачками VALUES.
         """
-        prefixes = cls._prefix_str(config)
-
         if start_id.startswith("http://") or start_id.startswith("https://"):
-            start_uri = f"<{start_id}>"
+            start_uri = start_id
         else:
-            start_uri = f"<http://example.org/{config.graphdb.repository}#{start_id}>"
+            start_uri = f"http://example.org/{config.graphdb.repository}#{start_id}"
 
         if end_id.startswith("http://") or end_id.startswith("https://"):
-            end_uri = f"<{end_id}>"
+            end_uri = end_id
         else:
-            end_uri = f"<http://example.org/{config.graphdb.repository}#{end_id}>"
-
-        query = f"""
-        {prefixes}
-
-        SELECT ?node ?label
-        WHERE {{
-        VALUES (?start ?end) {{ ({start_uri} {end_uri}) }}
+            end_uri = f"http://example.org/{config.graphdb.repository}#{end_id}"
 
-        ?start (<http://example.org/hasSubCompetence>)+ ?end .
-
-        ?node ( ^<http://example.org/hasSubCompetence>* | <http://example.org/hasSubCompetence>* ) ?end .
+        if hierarchy_index.ready:
+            path = hierarchy_index.find_path(start_uri, end_uri, max_length)
+            nodes = cls._index_nodes(hierarchy_index, path)
+        else:
+            path = await cls._find_path_in_db(client, config, start_uri, end_uri, max_length)
+            found = await cls._db_nodes(client, config, path)
+            nodes = [found[uri] for uri in path]
 
-        OPTIONAL {{ ?node rdfs:label ?label . }}
-        }}
-        """
+        return {
+            "nodes": nodes,
+            "links": [
+                {"source": source, "target": target, "predicate": HAS_SUB_COMPETENCE}
+                for source, target in zip(path, path[1:])
+            ]
+        }
 
-        data = await cls._execute_stmt(client, query)
+    @classmethod
+    async def _find_path_in_db(
+        cls,
+        client: GraphDBClient,
+        config: Config,
+        start_uri: str,
+        end_uri: str,
+        max_length: Optional[int]
+    ) -> list[str]:
+        """Двунаправленный обход в ширину, рёбра фронтира запрашиваются у GraphDB пачками"""
+        search = shortest_path_search(start_uri, end_uri, max_length)
+        visited = 0
+        try:
+            frontier, forward = next(search)
+            while True:
+                visited += len(frontier)
+                if visited > cls._PATH_MAX_VISITED:
+                    logger.warning(f"Path search {start_uri} -> {end_uri} stopped after {visited} nodes")
+                    return []
+                neighbors = await cls._get_hierarchy_neighbors(client, config, frontier, forward)
+                frontier, forward = search.send(neighbors)
+        except StopIteration as stop:
+            return stop.value
 
-        nodes = []
-        seen = set()
+    @classmethod
+    async def _get_hierarchy_neighbors(
+        cls,
+        client: GraphDBClient,
+        config: Config,
+        node_uris: list[str],
+        forward: bool
+    ) -> dict[str, list[str]]:
+        """Соседи узлов по hasSubCompetence (пачками VALUES): потомки (forward) или родители"""
+        template, node, neighbor = (cls._CHILDREN, "parent", "child") if forward else (cls._PARENTS, "child", "parent")
+        results = await cls._select_batches(client, template, node_uris, graph=config.graphdb.data_graph)
+        neighbors: dict[str, list[str]] = {}
+        for data in results:
+            for binding in data["results"]["bindings"]:
+                neighbors.setdefault(binding[node]["value"], []).append(binding[neighbor]["value"])
+        return neighbors
 
-        for binding in data["results"]["bindings"]:
-            node_uri = binding["node"]["value"]
-            label = binding.get("label", {}).get("value", node_uri)
-
-            if node_uri not in seen:
-                seen.add(node_uri)
-                nodes.append(
-                    OntologyNode(
-                        id=node_uri,
-                        label=label,
-                        type=NodeType.CLASS
-                    )
-                )
+    @classmethod
+    async def _get_labels(cls, client: GraphDBClient, config: Config, node_uris: list[str]) -> dict[str, str]:
+        """Метки узлов (пачками VALUES): {uri: метка}"""
+        results = await cls._select_batches(client, cls._NODE_LABELS, node_uris, graph=config.graphdb.data_graph)
+        labels = {}
+        for data in results:
+            for binding in data["results"]["bindings"]:
+                labels.setdefault(binding["node"]["value"], binding["label"]["value"])
+        return labels
 
-        return nodes
+    @classmethod
+    async def _get_levels(cls, client: GraphDBClient, config: Config, node_uris: list[str]) -> dict[str, int]:
+        """Уровни узлов (наименьший N из :hasLevelN, пачками VALUES): {uri: уровень}"""
+        predicates = level_predicates(config.graphdb.ontology_namespace)
+        results = await cls._select_batches(
+            client, cls._NODE_LEVELS, node_uris, graph=config.graphdb.data_graph, predicates=list(predicates)
+        )
+        levels: dict[str, int] = {}
+        for data in results:
+            for binding in data["results"]["bindings"]:
+                uri = binding["node"]["value"]
+                level = predicates[binding["predicate"]["value"]]
+                levels[uri] = min(level, levels.get(uri, level))
+        return levels
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Скрипт переноса пользовательских триплетов из графа по умолчанию
+в именованный граф данных (GRAPHDB_DATA_GRAPH)
+Использование: python -m dao.migrate_graph
+Запускается отдельным процессом, поэтому только при остановленном приложении:
+снимок графа и индекс иерархии работающего сервера о переносе не узнают.
+На работающем сервере используйте POST /api/v1/competencies/graph/migrate-default-graph.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from dao.competency_dao import CompetencyDAO
+from dependencies.config import Config
+from dependencies.graphdb import create_graphdb_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run_migration():
+    """Перенести данные графа по умолчанию в именованный граф"""
+    config = Config()
+    logger.info(f"Migrating default graph of '{config.graphdb.repository}' into <{config.graphdb.data_graph}>")
+
+    async with asynccontextmanager(create_graphdb_client)(config) as client:
+        report = await CompetencyDAO.migrate_default_graph(client=client, config=config)
+
+    logger.info(f"✓ Migration finished: {report['moved']} triple(s) moved")
+    left = report["skipped_blank_nodes"] + report["skipped_system"] + report["unparsed"]
+    if left:
+        logger.warning(
+            f"{left} triple(s) left in the default graph: {report['skipped_blank_nodes']} with blank nodes, "
+            f"{report['skipped_system']} with a system subject, {report['unparsed']} unparsed"
+        )
+        for line in report["samples"]:
+            logger.warning(f"  left behind: {line}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
@@ -0,0 +1,19 @@
+import base64
+import binascii
+from typing import Any
+
+import orjson
+
+
+def encode_cursor(position: Any) -> str:
+    """Упаковывает позицию последнего отданного элемента в непрозрачный курсор"""
+    return base64.urlsafe_b64encode(orjson.dumps(position)).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Any:
+    """Распаковывает курсор, выданный encode_cursor; ValueError, если курсор повреждён"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return orjson.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeEncodeError, orjson.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,204 @@
+import re
+import textwrap
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Iterable, Iterator, Optional
+
+
+# Стандартные префиксы: блок PREFIX собирается один раз при компиляции шаблона
+STANDARD_PREFIXES = {
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
+    "owl": "http://www.w3.org/2002/07/owl#",
+}
+
+# Параметр шаблона: $вид:имя, например $iri:subject или $iris:nodes
+_PLACEHOLDER_RE = re.compile(r"\$(iri|iris|literal|int|fragment):([A-Za-z_][A-Za-z0-9_]*)")
+# IRIREF из грамматики SPARQL 1.1 плюс обязательная схема (только абсолютные IRI)
+_IRI_RE = re.compile(r'[A-Za-z][A-Za-z0-9+.\-]*:[^<>"{}|^`\\\x00-\x20]*')
+_SURROGATE_RE = re.compile(r"[\ud800-\udfff]")
+
+
+def iri(value: str) -> str:
+    """IRI в синтаксисе SPARQL (<...>); ValueError, если значение не является абсолютным IRI"""
+    if not isinstance(value, str) or not _IRI_RE.fullmatch(value):
+        raise ValueError(f"Invalid IRI: {value!r}")
+    return f"<{value}>"
+
+
+def literal(value: str) -> str:
+    """Строковый литерал SPARQL с экранированием; ValueError для нестроковых значений"""
+    if not isinstance(value, str) or _SURROGATE_RE.search(value):
+        raise ValueError(f"Invalid literal: {value!r}")
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+    return f'"{escaped}"'
+
+
+def _integer(value: int) -> str:
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"Invalid integer: {value!r}")
+    return str(value)
+
+
+class Fragment(str):
+    """Готовый кусок запроса, собранный из SparqlFragment; только его можно вставить как $fragment"""
+
+
+EMPTY = Fragment("")
+
+
+def _fragment(value: Fragment) -> str:
+    if not isinstance(value, Fragment):
+        raise TypeError(f"Expected a rendered Fragment, got {type(value).__name__}")
+    return value
+
+
+def _iris(values: Iterable[str]) -> str:
+    if isinstance(values, str):
+        raise TypeError("Expected a collection of IRIs, got a string")
+    return " ".join(iri(value) for value in values)
+
+
+_RENDERERS = {
+    "iri": iri,
+    "iris": _iris,
+    "literal": literal,
+    "int": _integer,
+    "fragment": _fragment,
+}
+
+
+class _Compiled:
+    """Текст запроса, заранее разбитый на неизменные куски и параметры"""
+
+    def __init__(self, text: str, prefixes: Optional[dict[str, str]] = None):
+        text = textwrap.dedent(text).strip()
+        if prefixes:
+            header = "\n".join(f"PREFIX {name}: <{namespace}>" for name, namespace in prefixes.items())
+            text = f"{header}\n{text}"
+
+        self._chunks: list[str] = []
+        self._slots: list[tuple[str, str]] = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(text):
+            self._chunks.append(text[position:match.start()])
+            self._slots.append((match.group(1), match.group(2)))
+            position = match.end()
+        self._chunks.append(text[position:])
+
+        self._kinds: dict[str, str] = {}
+        for kind, name in self._slots:
+            if self._kinds.setdefault(name, kind) != kind:
+                raise ValueError(f"Parameter {name} is used with different kinds")
+        self.params = frozenset(self._kinds)
+
+    def _render(self, params: dict) -> str:
+        if params.keys() != self.params:
+            missing = sorted(self.params - params.keys())
+            extra = sorted(params.keys() - self.params)
+            raise TypeError(f"Template parameters mismatch: missing {missing}, unexpected {extra}")
+        rendered = {name: _RENDERERS[kind](params[name]) for name, kind in self._kinds.items()}
+        parts = [self._chunks[0]]
+        for (_, name), chunk in zip(self._slots, self._chunks[1:]):
+            parts.append(rendered[name])
+            parts.append(chunk)
+        return "".join(parts)
+
+
+class SparqlFragment(_Compiled):
+    """Часть запроса (например, необязательный FILTER), подставляемая в шаблон как $fragment"""
+
+    def render(self, **params) -> Fragment:
+        return Fragment(self._render(params))
+
+
+@dataclass
+class TemplateStats:
+    """Счётчики выполнения одного шаблона"""
+    calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, seconds: float, rows: int, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.rows += rows
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+class Execution:
+    """Текущее выполнение шаблона: вызывающий код дописывает число прочитанных строк"""
+
+    def __init__(self):
+        self.rows = 0
+
+
+_templates: dict[str, "SparqlTemplate"] = {}
+
+
+class SparqlTemplate(_Compiled):
+    """
+    Именованный шаблон SPARQL-запроса.
+    Компилируется один раз при импорте; параметры подставляются по виду ($iri, $iris,
+    $literal, $int, $fragment) с проверкой и экранированием до обращения к GraphDB.
+    Некорректный IRI или литерал - ValueError.
+    """
+
+    def __init__(self, name: str, text: str, prefixes: Optional[dict[str, str]] = None):
+        super().__init__(text, prefixes)
+        if name in _templates:
+            raise ValueError(f"SPARQL template {name} is already registered")
+        self.name = name
+        self.stats = TemplateStats()
+        _templates[name] = self
+
+    def render(self, **params) -> str:
+        return self._render(params)
+
+    @contextmanager
+    def execution(self) -> Iterator[Execution]:
+        """Замеряет выполнение запроса по шаблону и обновляет его счётчики"""
+        execution = Execution()
+        started = perf_counter()
+        failed = False
+        try:
+            yield execution
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Досрочно закрытый поток строк (GeneratorExit) ошибкой не считается
+            self.stats.record(perf_counter() - started, execution.rows, failed)
+
+
+def template_stats() -> list[dict]:
+    """Счётчики всех шаблонов, самые затратные по суммарному времени - первыми"""
+    stats = [
+        {
+            "template": template.name,
+            "calls": template.stats.calls,
+            "errors": template.stats.errors,
+            "rows": template.stats.rows,
+            "total_ms": round(template.stats.total_seconds * 1000, 3),
+            "avg_ms": round(template.stats.total_seconds * 1000 / template.stats.calls, 3)
+            if template.stats.calls else 0.0,
+            "max_ms": round(template.stats.max_seconds * 1000, 3),
+        }
+        for template in _templates.values()
+    ]
+    return sorted(stats, key=lambda item: item["total_ms"], reverse=True)
+
+
+def reset_template_stats() -> None:
+    """Обнуляет счётчики всех шаблонов"""
+    for template in _templates.values():
+        template.stats = TemplateStats()
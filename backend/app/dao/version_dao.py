@@ -1,10 +1,13 @@
 import asyncpg
 import logging
 import json
+from datetime import datetime
 from typing import Optional, Dict, Any
 from dependency_injector import wiring
 from fastapi import Depends
 
+from dao.pagination import decode_cursor, encode_cursor
+
 logger = logging.getLogger(__name__)
 
 
@@ -91,7 +94,7 @@ class VersionDAO:
                             version = node_version.version + 1,
                             last_modified = CURRENT_TIMESTAMP,
                             last_modified_by = $2
-                        RETURNING version
+                        RETURNING version, (xmax = 0) AS inserted
                         """,
                         node_uri,
                         user_id
@@ -111,6 +114,8 @@ class VersionDAO:
                         new_version
                     )
 
+                    await cls._add_statistics(conn, user_id, nodes=int(row["inserted"]), changes=1)
+
                     logger.info(f"Successfully updated version for {node_uri}: v{new_version}")
                     return new_version
 
@@ -118,16 +123,126 @@ class VersionDAO:
             logger.error(f"Error updating node version: {e}")
             raise
 
+    @classmethod
+    @wiring.inject
+    async def create_or_update_versions(
+        cls,
+        node_uris: list[str],
+        user_id: int,
+        change_type: str,  # CREATE, UPDATE, DELETE
+        db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
+    ) -> Dict[str, int]:
+        """
+        Создать или обновить версии многих узлов и записать их в историю (batch operation).
+        Одна транзакция: upsert версий через unnest со вставкой истории по результату upsert
+        одним запросом и обновление счётчиков статистики. Возвращает {uri: новая версия}
+        """
+        uris = sorted(set(node_uris))
+        if not uris:
+            return {}
+
+        try:
+            logger.info(f"Updating versions for {len(uris)} nodes by user {user_id}")
+
+            async with db_pool.acquire() as conn:
+                async with conn.transaction():
+                    # URI упорядочены: конкурентные пакеты блокируют строки node_version в одном порядке
+                    rows = await conn.fetch(
+                        """
+                        WITH upserted AS (
+                            INSERT INTO node_version (node_uri, version, last_modified, last_modified_by)
+                            SELECT uri, 1, CURRENT_TIMESTAMP, $2
+                            FROM unnest($1::text[]) AS uri
+                            ORDER BY uri
+                            ON CONFLICT (node_uri)
+                            DO UPDATE SET
+                                version = node_version.version + 1,
+                                last_modified = CURRENT_TIMESTAMP,
+                                last_modified_by = $2
+                            RETURNING node_uri, version, (xmax = 0) AS inserted
+                        ), history AS (
+                            INSERT INTO node_change_history
+                            (node_uri, user_id, change_type, version, changed_at)
+                            SELECT node_uri, $2, $3, version, CURRENT_TIMESTAMP
+                            FROM upserted
+                        )
+                        SELECT node_uri, version, inserted FROM upserted
+                        """,
+                        uris,
+                        user_id,
+                        change_type
+                    )
+                    await cls._add_statistics(
+                        conn, user_id, nodes=sum(row["inserted"] for row in rows), changes=len(rows)
+                    )
+
+            versions = {row["node_uri"]: row["version"] for row in rows}
+            logger.info(f"Successfully updated versions for {len(versions)} nodes")
+            return versions
+
+        except Exception as e:
+            logger.error(f"Error updating node versions: {e}")
+            raise
+
+    @classmethod
+    async def _add_statistics(cls, conn: asyncpg.Connection, user_id: Optional[int], nodes: int, changes: int) -> None:
+        """
+        Прибавить к счётчикам статистики в транзакции записи версии.
+        Каждое изменение добавляет одну версию. Строка version_statistics блокируется первой:
+        на этом порядке блокировок держится сверка reconcile_statistics.
+        """
+        await conn.execute(
+            """
+            INSERT INTO version_statistics (id, total_nodes, total_versions, total_changes)
+            VALUES (TRUE, $1, $2, $2)
+            ON CONFLICT (id) DO UPDATE SET
+                total_nodes = version_statistics.total_nodes + EXCLUDED.total_nodes,
+                total_versions = version_statistics.total_versions + EXCLUDED.total_versions,
+                total_changes = version_statistics.total_changes + EXCLUDED.total_changes
+            """,
+            nodes,
+            changes
+        )
+        if user_id is not None:
+            await conn.execute(
+                """
+                INSERT INTO user_change_statistics (user_id, changes_count)
+                VALUES ($1, $2)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    changes_count = user_change_statistics.changes_count + EXCLUDED.changes_count
+                """,
+                user_id,
+                changes
+            )
+
     @classmethod
     @wiring.inject
     async def get_node_history(
         cls,
         node_uri: str,
         limit: int = 10,
+        cursor: Optional[str] = None,
         db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
-    ) -> list[Dict[str, Any]]:
-        """Получить историю изменений узла с информацией об авторах"""
+    ) -> Dict[str, Any]:
+        """
+        Получить страницу истории изменений узла с информацией об авторах (новые - первыми).
+        Keyset-пагинация по (changed_at, id): cursor - next_cursor предыдущей страницы.
+        Граница по changed_at отсекает месячные секции новее курсора.
+        """
+        changed_before, id_before = None, None
+        if cursor:
+            position = decode_cursor(cursor)
+            if not (isinstance(position, list) and len(position) == 2
+                    and isinstance(position[0], str) and isinstance(position[1], int)):
+                raise ValueError(f"Invalid cursor: {cursor}")
+            try:
+                changed_before = datetime.fromisoformat(position[0])
+            except ValueError as e:
+                raise ValueError(f"Invalid cursor: {cursor}") from e
+            id_before = position[1]
+
         try:
+            # Лишняя строка сверх limit показывает, что есть следующая страница
             rows = await db_pool.fetch(
                 """
                 SELECT
@@ -143,13 +258,20 @@ class VersionDAO:
                 FROM node_change_history nch
                 LEFT JOIN "user" u ON nch.user_id = u.id
                 WHERE nch.node_uri = $1
-                ORDER BY nch.changed_at DESC
+                  AND ($3::timestamptz IS NULL OR (
+                      nch.changed_at <= $3 AND (nch.changed_at, nch.id) < ($3, $4::bigint)
+                  ))
+                ORDER BY nch.changed_at DESC, nch.id DESC
                 LIMIT $2
                 """,
                 node_uri,
-                limit
+                limit + 1,
+                changed_before,
+                id_before
             )
-            return [
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            history = [
                 {
                     "id": row["id"],
                     "node_uri": row["node_uri"],
@@ -167,6 +289,10 @@ class VersionDAO:
                 }
                 for row in rows
             ]
+            return {
+                "history": history,
+                "next_cursor": encode_cursor([history[-1]["changed_at"], history[-1]["id"]]) if has_more else None
+            }
         except Exception as e:
             logger.error(f"Error getting node history: {e}")
             raise
@@ -274,19 +400,15 @@ class VersionDAO:
         - Общее количество изменений
         - Топ активных пользователей
         - Последние изменения
+        Счётчики читаются из таблиц статистики, последние изменения - по индексу changed_at,
+        поэтому время ответа не зависит от размера истории.
         """
         try:
             # Общая статистика
             stats = await db_pool.fetchrow("""
-                SELECT
-                    COUNT(DISTINCT node_uri) as total_nodes,
-                    SUM(version) as total_versions
-                FROM node_version
-            """)
-
-            # Количество изменений
-            changes_count = await db_pool.fetchval("""
-                SELECT COUNT(*) FROM node_change_history
+                SELECT total_nodes, total_versions, total_changes
+                FROM version_statistics
+                WHERE id
             """)
 
             # Топ активных пользователей (по количеству изменений)
@@ -296,11 +418,10 @@ class VersionDAO:
                     u.first_name,
                     u.last_name,
                     u.email,
-                    COUNT(*) as changes_count
-                FROM node_change_history nch
-                JOIN "user" u ON nch.user_id = u.id
-                GROUP BY u.id, u.first_name, u.last_name, u.email
-                ORDER BY changes_count DESC
+                    ucs.changes_count
+                FROM user_change_statistics ucs
+                JOIN "user" u ON ucs.user_id = u.id
+                ORDER BY ucs.changes_count DESC
                 LIMIT 10
             """)
 
@@ -320,9 +441,9 @@ class VersionDAO:
             """)
 
             return {
-                "total_nodes": stats["total_nodes"] or 0,
-                "total_versions": stats["total_versions"] or 0,
-                "total_changes": changes_count or 0,
+                "total_nodes": stats["total_nodes"] if stats else 0,
+                "total_versions": stats["total_versions"] if stats else 0,
+                "total_changes": stats["total_changes"] if stats else 0,
                 "top_users": [
                     {
                         "id": row["id"],
@@ -345,3 +466,111 @@ class VersionDAO:
         except Exception as e:
             logger.error(f"Error getting version statistics: {e}")
             raise
+
+    @classmethod
+    @wiring.inject
+    async def reconcile_statistics(
+        cls,
+        db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
+    ) -> bool:
+        """
+        Пересчитать счётчики статистики по node_version и node_change_history
+        и исправить накопившееся расхождение. Возвращает True, если счётчики расходились.
+        Строка version_statistics блокируется до пересчёта: транзакции записи версий,
+        уже обновившие счётчики, успевают закоммититься и попадают в пересчёт,
+        а остальные прибавят своё изменение уже к исправленным значениям.
+        """
+        try:
+            async with db_pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(
+                        "INSERT INTO version_statistics (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING"
+                    )
+                    current = await conn.fetchrow(
+                        """
+                        SELECT total_nodes, total_versions, total_changes
+                        FROM version_statistics
+                        WHERE id
+                        FOR UPDATE
+                        """
+                    )
+
+                    actual = await conn.fetchrow(
+                        """
+                        SELECT
+                            (SELECT COUNT(*) FROM node_version) AS total_nodes,
+                            (SELECT COALESCE(SUM(version), 0) FROM node_version) AS total_versions,
+                            (SELECT COUNT(*) FROM node_change_history) AS total_changes
+                        """
+                    )
+                    await conn.execute(
+                        """
+                        UPDATE version_statistics SET
+                            total_nodes = $1,
+                            total_versions = $2,
+                            total_changes = $3,
+                            reconciled_at = CURRENT_TIMESTAMP
+                        WHERE id
+                        """,
+                        actual["total_nodes"],
+                        actual["total_versions"],
+                        actual["total_changes"]
+                    )
+
+                    # Счётчики пользователей: исправляются только расходящиеся строки
+                    users_fixed = await conn.fetchval(
+                        """
+                        WITH actual AS (
+                            SELECT user_id, COUNT(*) AS changes_count
+                            FROM node_change_history
+                            WHERE user_id IS NOT NULL
+                            GROUP BY user_id
+                        ), upserted AS (
+                            INSERT INTO user_change_statistics (user_id, changes_count)
+                            SELECT user_id, changes_count FROM actual
+                            ON CONFLICT (user_id) DO UPDATE SET changes_count = EXCLUDED.changes_count
+                            WHERE user_change_statistics.changes_count <> EXCLUDED.changes_count
+                            RETURNING user_id
+                        ), deleted AS (
+                            DELETE FROM user_change_statistics ucs
+                            WHERE NOT EXISTS (SELECT 1 FROM actual WHERE actual.user_id = ucs.user_id)
+                            RETURNING user_id
+                        )
+                        SELECT (SELECT COUNT(*) FROM upserted) + (SELECT COUNT(*) FROM deleted)
+                        """
+                    )
+
+            drifted = dict(current) != dict(actual) or users_fixed > 0
+            if drifted:
+                logger.warning(
+                    f"Version statistics drifted: {dict(current)} -> {dict(actual)}, "
+                    f"{users_fixed} user counters fixed"
+                )
+            return drifted
+        except Exception as e:
+            logger.error(f"Error reconciling version statistics: {e}")
+            raise
+
+    @classmethod
+    @wiring.inject
+    async def ensure_history_partitions(
+        cls,
+        months_ahead: int = 3,
+        db_pool: asyncpg.Pool = Depends(wiring.Provide["db_pool"]),
+    ) -> int:
+        """
+        Создать месячные секции node_change_history на months_ahead месяцев вперёд.
+        Строки, попавшие в default-секцию, переносятся в созданные секции.
+        Возвращает количество созданных секций.
+        """
+        try:
+            created = await db_pool.fetchval(
+                "SELECT ensure_node_change_history_partitions(CURRENT_TIMESTAMP, $1)",
+                months_ahead
+            )
+            if created:
+                logger.info(f"Created {created} node change history partitions")
+            return created
+        except Exception as e:
+            logger.error(f"Error creating node change history partitions: {e}")
+            raise
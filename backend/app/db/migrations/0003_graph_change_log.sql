@@ -0,0 +1,14 @@
+-- Журнал изменений триплетов графа для дельта-синхронизации редакторов
+-- Каждая запись - добавление или удаление одного триплета; seq монотонно растёт
+-- в порядке коммитов (запись в журнал сериализуется advisory-блокировкой)
+
+CREATE TABLE IF NOT EXISTS graph_change_log (
+    seq BIGSERIAL PRIMARY KEY,
+    op VARCHAR(10) NOT NULL CHECK (op IN ('add', 'remove', 'reset')), -- reset: граф очищен целиком
+    subject TEXT,
+    predicate TEXT,
+    object TEXT,
+    object_type VARCHAR(10), -- uri, literal
+    user_id INTEGER REFERENCES "user"(id),
+    changed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,41 @@
+-- Счётчики версионирования для dashboard
+-- Обновляются в той же транзакции, что и запись версии; расхождения исправляет
+-- периодическая сверка (VersionDAO.reconcile_statistics)
+
+-- Единственная строка с общими счётчиками
+CREATE TABLE IF NOT EXISTS version_statistics (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    total_nodes BIGINT NOT NULL DEFAULT 0,
+    total_versions BIGINT NOT NULL DEFAULT 0,
+    total_changes BIGINT NOT NULL DEFAULT 0,
+    reconciled_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Количество изменений по пользователям
+CREATE TABLE IF NOT EXISTS user_change_statistics (
+    user_id INTEGER PRIMARY KEY REFERENCES "user"(id) ON DELETE CASCADE,
+    changes_count BIGINT NOT NULL DEFAULT 0
+);
+
+-- Топ активных пользователей читается по индексу
+CREATE INDEX IF NOT EXISTS idx_user_change_statistics_count ON user_change_statistics(changes_count DESC);
+
+-- Последние изменения читаются по индексу, без сортировки всей истории
+CREATE INDEX IF NOT EXISTS idx_node_history_changed_at ON node_change_history(changed_at DESC);
+
+-- Начальные значения по уже накопленной истории
+INSERT INTO version_statistics (id, total_nodes, total_versions, total_changes, reconciled_at)
+SELECT
+    TRUE,
+    (SELECT COUNT(*) FROM node_version),
+    (SELECT COALESCE(SUM(version), 0) FROM node_version),
+    (SELECT COUNT(*) FROM node_change_history),
+    CURRENT_TIMESTAMP
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO user_change_statistics (user_id, changes_count)
+SELECT user_id, COUNT(*)
+FROM node_change_history
+WHERE user_id IS NOT NULL
+GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
@@ -0,0 +1,98 @@
+-- Секционирование истории изменений узлов по месяцам (changed_at, границы месяцев в UTC)
+-- Старые данные переносятся в новые секции, последовательность id сохраняется.
+-- Будущие секции создаёт ensure_node_change_history_partitions (приложение вызывает её раз в сутки);
+-- default-секция страхует вставки, если секция месяца ещё не создана.
+
+ALTER TABLE node_change_history RENAME TO node_change_history_old;
+-- Последовательность переживёт удаление старой таблицы
+ALTER SEQUENCE node_change_history_id_seq OWNED BY NONE;
+ALTER SEQUENCE node_change_history_id_seq AS BIGINT;
+
+DROP INDEX IF EXISTS idx_node_history_uri;
+DROP INDEX IF EXISTS idx_node_history_user;
+DROP INDEX IF EXISTS idx_node_history_changed_at;
+
+CREATE TABLE node_change_history (
+    id BIGINT NOT NULL DEFAULT nextval('node_change_history_id_seq'),
+    node_uri VARCHAR(255) NOT NULL,
+    user_id INTEGER REFERENCES "user"(id),
+    change_type VARCHAR(50) NOT NULL, -- CREATE, UPDATE, DELETE
+    old_value JSONB,
+    new_value JSONB,
+    version INTEGER NOT NULL,
+    changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, changed_at)
+) PARTITION BY RANGE (changed_at);
+
+ALTER SEQUENCE node_change_history_id_seq OWNED BY node_change_history.id;
+
+CREATE TABLE node_change_history_default PARTITION OF node_change_history DEFAULT;
+
+-- История узла и keyset-пагинация по (changed_at, id)
+CREATE INDEX idx_node_history_uri ON node_change_history(node_uri, changed_at DESC, id DESC);
+CREATE INDEX idx_node_history_user ON node_change_history(user_id);
+-- Последние изменения (ORDER BY changed_at DESC LIMIT n) - по btree последней секции
+CREATE INDEX idx_node_history_changed_at ON node_change_history(changed_at DESC);
+-- Выборки по диапазону времени внутри больших секций
+CREATE INDEX idx_node_history_changed_at_brin ON node_change_history USING BRIN (changed_at);
+
+-- Создаёт месячные секции от месяца since до текущего месяца + months_ahead
+-- (и для всех месяцев, строки которых уже лежат в default-секции). Строки, уже попавшие в default-секцию, переносятся
+-- в новую секцию до её подключения. Возвращает количество созданных секций.
+CREATE OR REPLACE FUNCTION ensure_node_change_history_partitions(
+    since TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    months_ahead INTEGER DEFAULT 3
+) RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start TIMESTAMP;
+    last_month TIMESTAMP;
+    lower_bound TIMESTAMP WITH TIME ZONE;
+    upper_bound TIMESTAMP WITH TIME ZONE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    SELECT
+        date_trunc('month', LEAST(MIN(changed_at), since) AT TIME ZONE 'UTC'),
+        GREATEST(
+            date_trunc('month', MAX(changed_at) AT TIME ZONE 'UTC'),
+            date_trunc('month', CURRENT_TIMESTAMP AT TIME ZONE 'UTC') + make_interval(months => months_ahead)
+        )
+    INTO month_start, last_month
+    FROM node_change_history_default;
+
+    WHILE month_start <= last_month LOOP
+        partition_name := format('node_change_history_%s', to_char(month_start, 'YYYY_MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            lower_bound := month_start AT TIME ZONE 'UTC';
+            upper_bound := (month_start + INTERVAL '1 month') AT TIME ZONE 'UTC';
+            EXECUTE format('CREATE TABLE %I (LIKE node_change_history INCLUDING DEFAULTS)', partition_name);
+            EXECUTE format(
+                'WITH moved AS (
+                    DELETE FROM node_change_history_default
+                    WHERE changed_at >= %L AND changed_at < %L
+                    RETURNING *
+                ) INSERT INTO %I SELECT * FROM moved',
+                lower_bound, upper_bound, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE node_change_history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, lower_bound, upper_bound
+            );
+            created := created + 1;
+        END IF;
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+SELECT ensure_node_change_history_partitions(
+    COALESCE((SELECT MIN(changed_at) FROM node_change_history_old), CURRENT_TIMESTAMP)
+);
+
+INSERT INTO node_change_history (id, node_uri, user_id, change_type, old_value, new_value, version, changed_at)
+SELECT id, node_uri, user_id, change_type, old_value, new_value, version, COALESCE(changed_at, CURRENT_TIMESTAMP)
+FROM node_change_history_old;
+
+DROP TABLE node_change_history_old;
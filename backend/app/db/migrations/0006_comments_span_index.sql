@@ -0,0 +1,18 @@
+-- Интервальный индекс комментариев: выборка комментариев файла, пересекающихся
+-- с диапазоном символов, без чтения всех комментариев файла.
+-- span - полуинтервал [start_index, end_index), как смещения выделения в редакторе;
+-- комментарий к точке (start_index = end_index) хранится как [start_index, start_index + 1),
+-- иначе диапазон пуст и && с ним всегда ложно.
+-- btree_gist нужен, чтобы filename (равенство) и span (пересечение) были в одном GiST-индексе.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE comments
+    ADD COLUMN IF NOT EXISTS span INT4RANGE
+    GENERATED ALWAYS AS (int4range(
+        LEAST(start_index, end_index),
+        GREATEST(start_index, end_index),
+        CASE WHEN start_index = end_index THEN '[]' ELSE '[)' END
+    )) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_comments_filename_span ON comments USING GIST (filename, span);
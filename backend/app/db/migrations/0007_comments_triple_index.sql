@@ -0,0 +1,3 @@
+-- Количество комментариев по триплетам (бейджи на рёбрах графа):
+-- агрегат по (subject, predicate, object) читается только из индекса
+CREATE INDEX IF NOT EXISTS idx_comments_triple ON comments(subject, predicate, object) INCLUDE (created_at);
@@ -1,11 +1,15 @@
 from dependency_injector import containers, providers
-from SPARQLWrapper import SPARQLWrapper
 import redis.asyncio as aioredis
 
 from dependencies.config import Config
-from dependencies.graphdb import create_graphdb_client
+from dependencies.graphdb import GraphDBClient, create_graphdb_client
 from dependencies.postgres import create_db_pool
 from dependencies.redis import create_redis_client
+from services.graph_part import GraphPartCache
+from services.graph_snapshot import GraphSnapshotCache
+from services.bulkhead import Bulkhead
+from services.hierarchy_index import HierarchyIndex
+from services.password_hasher import PasswordHasher
 
 
 class Container(containers.DeclarativeContainer):
@@ -17,17 +21,71 @@ class Container(containers.DeclarativeContainer):
 
     # request_context: providers.Provider[RequestContext] = providers.Singleton(RequestContext)
 
-    graphdb_client: providers.Provider[SPARQLWrapper] = providers.Resource(
+    # Ограничение параллельных обращений к каждому бэкенду
+    graphdb_bulkhead: providers.Provider[Bulkhead] = providers.Singleton(
+        Bulkhead,
+        name="graphdb",
+        limit=config.provided.bulkheads.graphdb.limit,
+        max_queue=config.provided.bulkheads.graphdb.max_queue,
+        max_wait=config.provided.bulkheads.graphdb.max_wait
+    )
+
+    # Отдельно для потоковых чтений: медленный клиент /graph/stream не занимает места обычных запросов
+    graphdb_stream_bulkhead: providers.Provider[Bulkhead] = providers.Singleton(
+        Bulkhead,
+        name="graphdb_streams",
+        limit=config.provided.bulkheads.graphdb_streams.limit,
+        max_queue=config.provided.bulkheads.graphdb_streams.max_queue,
+        max_wait=config.provided.bulkheads.graphdb_streams.max_wait
+    )
+
+    postgres_bulkhead: providers.Provider[Bulkhead] = providers.Singleton(
+        Bulkhead,
+        name="postgres",
+        limit=config.provided.bulkheads.postgres.limit,
+        max_queue=config.provided.bulkheads.postgres.max_queue,
+        max_wait=config.provided.bulkheads.postgres.max_wait
+    )
+
+    redis_bulkhead: providers.Provider[Bulkhead] = providers.Singleton(
+        Bulkhead,
+        name="redis",
+        limit=config.provided.bulkheads.redis.limit,
+        max_queue=config.provided.bulkheads.redis.max_queue,
+        max_wait=config.provided.bulkheads.redis.max_wait
+    )
+
+    graphdb_client: providers.Provider[GraphDBClient] = providers.Resource(
         create_graphdb_client,
-        config=config
+        config=config,
+        bulkhead=graphdb_bulkhead,
+        stream_bulkhead=graphdb_stream_bulkhead
     )
 
     db_pool = providers.Resource(
         create_db_pool,
-        config=config
+        config=config,
+        bulkhead=postgres_bulkhead
     )
 
     redis_client: providers.Provider[aioredis.Redis] = providers.Resource(
         create_redis_client,
-        config=config
+        config=config,
+        bulkhead=redis_bulkhead
+    )
+
+    graph_snapshot: providers.Provider[GraphSnapshotCache] = providers.Singleton(GraphSnapshotCache)
+
+    # Продолжаемые обходы /graph/part, действительные до следующей записи в граф
+    graph_part_cache: providers.Provider[GraphPartCache] = providers.Singleton(GraphPartCache)
+
+    hierarchy_index: providers.Provider[HierarchyIndex] = providers.Singleton(
+        HierarchyIndex,
+        level_namespace=config.provided.graphdb.ontology_namespace
+    )
+
+    password_hasher: providers.Provider[PasswordHasher] = providers.Singleton(
+        PasswordHasher,
+        workers=config.provided.auth.password_hash_workers,
+        max_queue=config.provided.auth.password_hash_queue
     )
@@ -24,6 +24,18 @@ class GraphDBConfig(BaseModel):
     repository: str
     username: Optional[str]
     password: Optional[str]
+    data_graph: str = "http://example.org/competencies/graph"  # именованный граф пользовательских данных
+    pool_size: int = 50  # максимум одновременных HTTP-соединений
+    keepalive_connections: int = 20  # сколько соединений держать открытыми
+    connect_timeout: float = 5.0  # секунды
+    read_timeout: float = 60.0  # секунды
+    pool_timeout: float = 10.0  # ожидание свободного соединения, секунды
+    upload_chunk_size: int = 5000  # элементов графа в одном куске bulk-загрузки
+
+    @property
+    def ontology_namespace(self) -> str:
+        """Namespace префикса ":" в SPARQL-запросах (предикаты :hasLevelN и т.п.)"""
+        return f"{self.url}/repositories/{self.repository}#"
 
 
 class HealthCheckConfig(BaseModel):
@@ -32,6 +44,25 @@ class HealthCheckConfig(BaseModel):
     retries: int = 3
 
 
+class VersioningConfig(BaseModel):
+    statistics_reconcile_interval: int = 3600  # период сверки счётчиков статистики, секунды
+    history_partitions_ahead: int = 3  # на сколько месяцев вперёд создавать секции истории
+    history_partitions_interval: int = 86400  # период проверки секций истории, секунды
+
+
+class BulkheadConfig(BaseModel):
+    limit: int  # одновременных обращений к бэкенду
+    max_queue: int  # ожидающих сверх limit, дальше - 503
+    max_wait: float  # предельное ожидание в очереди, секунды
+
+
+class BulkheadsConfig(BaseModel):
+    graphdb: BulkheadConfig
+    graphdb_streams: BulkheadConfig  # потоковые чтения GraphDB держат место, пока клиент читает ответ
+    postgres: BulkheadConfig
+    redis: BulkheadConfig
+
+
 class RedisConfig(BaseModel):
     url: str
     password: Optional[str] = None
@@ -42,6 +73,9 @@ class AuthConfig(BaseModel):
     algorithm: str = "HS256"
     access_token_expire: int = 900  # 15 минут
     refresh_token_expire: int = 604800  # 7 дней
+    token_cache_size: int = 10000  # проверенных access токенов в кэше middleware
+    password_hash_workers: int = 4  # потоков bcrypt
+    password_hash_queue: int = 32  # ожидающих bcrypt запросов сверх потоков, дальше - 503
 
 
 class Config:
@@ -57,6 +91,13 @@ class Config:
             repository=os.getenv("GRAPHDB_REPOSITORY", "competencies"),
             username=os.getenv("GRAPHDB_USERNAME"),
             password=os.getenv("GRAPHDB_PASSWORD"),
+            data_graph=os.getenv("GRAPHDB_DATA_GRAPH", "http://example.org/competencies/graph"),
+            pool_size=int(os.getenv("GRAPHDB_POOL_SIZE", 50)),
+            keepalive_connections=int(os.getenv("GRAPHDB_KEEPALIVE_CONNECTIONS", 20)),
+            connect_timeout=float(os.getenv("GRAPHDB_CONNECT_TIMEOUT", 5.0)),
+            read_timeout=float(os.getenv("GRAPHDB_READ_TIMEOUT", 60.0)),
+            pool_timeout=float(os.getenv("GRAPHDB_POOL_TIMEOUT", 10.0)),
+            upload_chunk_size=int(os.getenv("GRAPHDB_UPLOAD_CHUNK_SIZE", 5000)),
         )
 
     @cached_property
@@ -74,6 +115,32 @@ class Config:
             connections_amount=int(os.getenv("DATABASE_CONNECTIONS_AMOUNT", 2))
         )
 
+    @cached_property
+    def versioning(self) -> VersioningConfig:
+        return VersioningConfig(
+            statistics_reconcile_interval=int(os.getenv("VERSION_STATISTICS_RECONCILE_INTERVAL", 3600)),
+            history_partitions_ahead=int(os.getenv("VERSION_HISTORY_PARTITIONS_AHEAD", 3)),
+            history_partitions_interval=int(os.getenv("VERSION_HISTORY_PARTITIONS_INTERVAL", 86400)),
+        )
+
+    @cached_property
+    def bulkheads(self) -> BulkheadsConfig:
+        def bulkhead(backend: str, limit: int, max_queue: int, max_wait: float) -> BulkheadConfig:
+            return BulkheadConfig(
+                limit=int(os.getenv(f"BULKHEAD_{backend}_LIMIT", limit)),
+                max_queue=int(os.getenv(f"BULKHEAD_{backend}_QUEUE", max_queue)),
+                max_wait=float(os.getenv(f"BULKHEAD_{backend}_MAX_WAIT", max_wait))
+            )
+
+        return BulkheadsConfig(
+            # Лимиты GraphDB (вместе с потоковыми) ниже pool_size, PostgreSQL - не выше размера
+            # пула asyncpg (10): очередь должна копиться в bulkhead с приоритетами, а не в пуле соединений
+            graphdb=bulkhead("GRAPHDB", 32, 256, 5.0),
+            graphdb_streams=bulkhead("GRAPHDB_STREAMS", 8, 32, 5.0),
+            postgres=bulkhead("POSTGRES", 10, 256, 2.0),
+            redis=bulkhead("REDIS", 64, 512, 1.0)
+        )
+
     @cached_property
     def redis(self) -> RedisConfig:
         return RedisConfig(
@@ -87,5 +154,8 @@ class Config:
             secret_key=os.getenv("JWT_SECRET_KEY", "dev-secret-key-change-in-production"),
             algorithm=os.getenv("JWT_ALGORITHM", "HS256"),
             access_token_expire=int(os.getenv("ACCESS_TOKEN_EXPIRE", 900)),
-            refresh_token_expire=int(os.getenv("REFRESH_TOKEN_EXPIRE", 604800))
+            refresh_token_expire=int(os.getenv("REFRESH_TOKEN_EXPIRE", 604800)),
+            token_cache_size=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000)),
+            password_hash_workers=int(os.getenv("PASSWORD_HASH_WORKERS", 4)),
+            password_hash_queue=int(os.getenv("PASSWORD_HASH_QUEUE", 32))
         )
@@ -1,20 +1,297 @@
-from typing import AsyncGenerator
-from SPARQLWrapper import SPARQLWrapper, JSON, POST
+import logging
+import re
+from contextlib import AbstractAsyncContextManager, nullcontext
+from typing import AsyncGenerator, AsyncIterator, Callable, Optional
+import httpx
+import orjson
 
 from dependencies.config import Config
+from services.bulkhead import Bulkhead, Priority, use_priority
 
 
-async def create_graphdb_client(config: Config) -> AsyncGenerator[SPARQLWrapper, None]:
-    """Создание клиента GraphDB"""
+logger = logging.getLogger(__name__)
+
+
+class GraphDBError(RuntimeError):
+    """Ошибка, которую вернул GraphDB (HTTP статус и тело ответа)"""
+
+
+N_TRIPLES = "application/n-triples"
+SPARQL_QUERY = "application/sparql-query"
+SPARQL_UPDATE = "application/sparql-update"
+SPARQL_RESULTS_JSON = "application/sparql-results+json"
+# Значение параметра context, обозначающее граф по умолчанию (null context RDF4J)
+NULL_CONTEXT = "null"
+
+
+def _raise_for_status(response: httpx.Response) -> None:
+    if response.is_error:
+        raise GraphDBError(f"GraphDB responded {response.status_code}: {response.text.strip()}")
+
+
+_TSV_ESCAPE_RE = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+_TSV_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+
+def _unescape_tsv(value: str) -> str:
+    def replace(match: re.Match) -> str:
+        escape = match.group(1)
+        if escape[0] in "uU" and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return _TSV_ESCAPES.get(escape, escape)
+
+    return _TSV_ESCAPE_RE.sub(replace, value) if "\\" in value else value
+
+
+def _parse_tsv_term(term: str) -> dict:
+    """Разбирает RDF-терм из ответа SPARQL TSV в формат binding из SPARQL JSON"""
+    if term.startswith("<") and term.endswith(">"):
+        return {"type": "uri", "value": term[1:-1]}
+    if term.startswith("_:"):
+        return {"type": "bnode", "value": term[2:]}
+    if term.startswith('"'):
+        end = term.rindex('"')
+        binding = {"type": "literal", "value": _unescape_tsv(term[1:end])}
+        suffix = term[end + 1:]
+        if suffix.startswith("@"):
+            binding["xml:lang"] = suffix[1:]
+        elif suffix.startswith("^^<"):
+            binding["datatype"] = suffix[3:-1]
+        return binding
+    # Сокращённая запись чисел и булевых значений
+    return {"type": "literal", "value": term}
+
+
+# Термы N-Triples (RDF 1.1): IRI, blank node, литерал с языком или типом
+_NT_IRI = r'<(?:[^<>"{}|^`\\\x00-\x20]|\\u[0-9A-Fa-f]{4}|\\U[0-9A-Fa-f]{8})*>'
+_NT_BNODE = r'_:[A-Za-z0-9_](?:[A-Za-z0-9_.\-]*[A-Za-z0-9_\-])?'
+_NT_LITERAL = r'"(?:[^"\\\n\r]|\\.)*"(?:@[A-Za-z]+(?:-[A-Za-z0-9]+)*|\^\^' + _NT_IRI + ')?'
+_NT_STATEMENT_RE = re.compile(
+    rf'[ \t]*({_NT_IRI}|{_NT_BNODE})[ \t]*({_NT_IRI})[ \t]*({_NT_IRI}|{_NT_BNODE}|{_NT_LITERAL})[ \t]*\.[ \t]*(?:#.*)?'
+)
+
+
+def parse_n_triples(line: str) -> Optional[tuple[dict, dict, dict]]:
+    """
+    Разбирает строку N-Triples на субъект, предикат и объект в формате binding из SPARQL JSON.
+    None - строка не является триплетом N-Triples.
+    """
+    match = _NT_STATEMENT_RE.fullmatch(line)
+    if match is None:
+        return None
+    return _parse_tsv_term(match.group(1)), _parse_tsv_term(match.group(2)), _parse_tsv_term(match.group(3))
+
+
+class GraphDBTransaction:
+    """
+    Транзакция RDF4J: все изменения становятся видны только после commit().
+    query()/update() выполняются внутри транзакции, поэтому чтение видит её незафиксированные
+    изменения, а чтение и запись, сделанная по его результату, фиксируются вместе.
+    Каждое действие занимает место в bulkhead клиента, как обычный запрос. commit() и rollback()
+    идут с приоритетом CRITICAL: отказ на них оставил бы транзакцию открытой на сервере.
+    """
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        url: str,
+        slot: Callable[[], AbstractAsyncContextManager] = nullcontext
+    ):
+        self._http = http
+        self._url = url
+        self._slot = slot
+
+    async def _action(
+        self,
+        action: str,
+        data: Optional[bytes] = None,
+        content_type: str = N_TRIPLES,
+        context: Optional[str] = None,
+    ) -> None:
+        params = {"action": action}
+        if context is not None:
+            params["context"] = context if context == NULL_CONTEXT else f"<{context}>"
+        async with self._slot():
+            response = await self._http.put(
+                self._url,
+                params=params,
+                content=data,
+                headers={"Content-Type": content_type} if data is not None else None,
+            )
+        _raise_for_status(response)
+
+    async def add(self, data: bytes, content_type: str = N_TRIPLES, context: Optional[str] = None) -> None:
+        """Добавить сериализованные триплеты (по умолчанию N-Triples) в граф context"""
+        await self._action("ADD", data, content_type, context)
+
+    async def delete(self, data: bytes, content_type: str = N_TRIPLES, context: Optional[str] = None) -> None:
+        """Удалить сериализованные триплеты (по умолчанию N-Triples) из графа context"""
+        await self._action("DELETE", data, content_type, context)
+
+    async def query(self, query: str) -> dict:
+        """Выполнить SPARQL SELECT/ASK в транзакции и вернуть результат в формате SPARQL JSON"""
+        async with self._slot():
+            response = await self._http.put(
+                self._url,
+                params={"action": "QUERY"},
+                content=query.encode("utf-8"),
+                headers={"Content-Type": SPARQL_QUERY, "Accept": SPARQL_RESULTS_JSON},
+            )
+        _raise_for_status(response)
+        return orjson.loads(response.content)
+
+    async def update(self, update: str) -> None:
+        """Выполнить SPARQL UPDATE в транзакции"""
+        await self._action("UPDATE", update.encode("utf-8"), SPARQL_UPDATE)
+
+    async def commit(self) -> None:
+        with use_priority(Priority.CRITICAL):
+            await self._action("COMMIT")
+
+    async def rollback(self) -> None:
+        with use_priority(Priority.CRITICAL):
+            async with self._slot():
+                response = await self._http.delete(self._url)
+        _raise_for_status(response)
+
+
+class GraphDBClient:
+    """
+    Асинхронный клиент GraphDB поверх RDF4J REST API.
+    Все запросы идут через общий пул keep-alive соединений httpx,
+    поэтому event loop не блокируется, а соединения переиспользуются.
+    Число одновременных запросов ограничивает bulkhead, в том числе действий транзакций.
+    Потоковые запросы держат место до конца чтения, которое задаёт клиент API,
+    поэтому у них свой stream_bulkhead и обычным запросам они места не занимают.
+    """
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        repository_url: str,
+        bulkhead: Optional[Bulkhead] = None,
+        stream_bulkhead: Optional[Bulkhead] = None
+    ):
+        self._http = http
+        self._repository_url = repository_url
+        self._bulkhead = bulkhead
+        self._stream_bulkhead = stream_bulkhead
+
+    def _slot(self) -> AbstractAsyncContextManager:
+        return self._bulkhead.slot() if self._bulkhead is not None else nullcontext()
+
+    def _stream_slot(self) -> AbstractAsyncContextManager:
+        return self._stream_bulkhead.slot() if self._stream_bulkhead is not None else nullcontext()
+
+    @property
+    def repository_url(self) -> str:
+        return self._repository_url
+
+    @property
+    def statements_url(self) -> str:
+        return f"{self._repository_url}/statements"
+
+    async def query(self, query: str) -> dict:
+        """Выполнить SPARQL SELECT/ASK и вернуть результат в формате SPARQL JSON"""
+        async with self._slot():
+            response = await self._http.post(
+                self._repository_url,
+                data={"query": query},
+                headers={"Accept": SPARQL_RESULTS_JSON},
+            )
+        _raise_for_status(response)
+        return orjson.loads(response.content)
+
+    async def stream_query(self, query: str) -> AsyncIterator[dict]:
+        """
+        Выполнить SPARQL SELECT и отдавать строки результата по мере чтения ответа.
+        Используется формат TSV: он построчный, поэтому весь результат не держится в памяти.
+        Каждая строка - словарь {переменная: binding} как в SPARQL JSON.
+        """
+        async with self._stream_slot(), self._http.stream(
+            "POST",
+            self._repository_url,
+            data={"query": query},
+            headers={"Accept": "text/tab-separated-values"},
+        ) as response:
+            if response.is_error:
+                await response.aread()
+                _raise_for_status(response)
+
+            variables: Optional[list[str]] = None
+            async for line in response.aiter_lines():
+                line = line.rstrip("\r\n")
+                if variables is None:
+                    variables = [name.lstrip("?") for name in line.split("\t")]
+                    continue
+                if not line:
+                    continue
+                yield {
+                    var: _parse_tsv_term(cell)
+                    for var, cell in zip(variables, line.split("\t"))
+                    if cell
+                }
+
+    async def stream_statements(self, context: Optional[str] = None, infer: bool = False) -> AsyncIterator[str]:
+        """Построчно выгрузить триплеты репозитория (или графа context) в формате N-Triples"""
+        params = {"infer": "true" if infer else "false"}
+        if context is not None:
+            params["context"] = context if context == NULL_CONTEXT else f"<{context}>"
+        async with self._stream_slot(), self._http.stream(
+            "GET",
+            self.statements_url,
+            params=params,
+            headers={"Accept": N_TRIPLES},
+        ) as response:
+            if response.is_error:
+                await response.aread()
+                _raise_for_status(response)
+            async for line in response.aiter_lines():
+                line = line.rstrip("\r\n")
+                if line and not line.startswith("#"):
+                    yield line
+
+    async def update(self, update: str) -> None:
+        """Выполнить SPARQL UPDATE"""
+        async with self._slot():
+            response = await self._http.post(
+                self.statements_url,
+                data={"update": update},
+                headers={"Accept": "application/json"},
+            )
+        _raise_for_status(response)
+
+    async def begin_transaction(self) -> GraphDBTransaction:
+        """Открыть транзакцию RDF4J; вызывающий обязан сделать commit() или rollback()"""
+        async with self._slot():
+            response = await self._http.post(f"{self._repository_url}/transactions")
+        _raise_for_status(response)
+        return GraphDBTransaction(self._http, response.headers["Location"], self._slot)
+
+
+async def create_graphdb_client(
+    config: Config,
+    bulkhead: Optional[Bulkhead] = None,
+    stream_bulkhead: Optional[Bulkhead] = None
+) -> AsyncGenerator[GraphDBClient, None]:
+    """Создание клиента GraphDB с пулом соединений"""
     endpoint = f"{config.graphdb.url}/repositories/{config.graphdb.repository}"
-    client = SPARQLWrapper(endpoint)
-    client.setReturnFormat(JSON)
 
+    auth: Optional[httpx.BasicAuth] = None
     if config.graphdb.username and config.graphdb.password:
-        client.setCredentials(config.graphdb.username, config.graphdb.password)
+        auth = httpx.BasicAuth(config.graphdb.username, config.graphdb.password)
+
+    limits = httpx.Limits(
+        max_connections=config.graphdb.pool_size,
+        max_keepalive_connections=config.graphdb.keepalive_connections,
+    )
+    timeout = httpx.Timeout(
+        config.graphdb.read_timeout,
+        connect=config.graphdb.connect_timeout,
+        pool=config.graphdb.pool_timeout,
+    )
 
-    try:
-        yield client
-    finally:
-        # Здесь можно добавить cleanup код если потребуется
-        pass
+    async with httpx.AsyncClient(auth=auth, limits=limits, timeout=timeout) as http:
+        logger.info(f"GraphDB client created (pool size {config.graphdb.pool_size})")
+        yield GraphDBClient(http, endpoint, bulkhead, stream_bulkhead)
+    logger.info("GraphDB client closed")
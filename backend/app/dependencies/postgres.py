@@ -1,7 +1,10 @@
 import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 import asyncpg
 import orjson
 from dependencies.config import Config
+from services.bulkhead import Bulkhead
 
 
 logger = logging.getLogger(__name__)
@@ -23,7 +26,48 @@ async def init_connection(conn: asyncpg.Connection):
     )
 
 
-async def create_db_pool(config: Config):
+class GuardedPool:
+    """
+    Пул asyncpg за bulkhead: запросы fetch*/execute и acquire() сначала занимают место
+    в bulkhead (с приоритетом и сбросом нагрузки), а уже потом соединение пула.
+    Остальные атрибуты отдаются пулом как есть.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, bulkhead: Bulkhead):
+        self._pool = pool
+        self._bulkhead = bulkhead
+
+    async def fetch(self, *args, **kwargs):
+        async with self._bulkhead.slot():
+            return await self._pool.fetch(*args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        async with self._bulkhead.slot():
+            return await self._pool.fetchrow(*args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        async with self._bulkhead.slot():
+            return await self._pool.fetchval(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        async with self._bulkhead.slot():
+            return await self._pool.execute(*args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        async with self._bulkhead.slot():
+            return await self._pool.executemany(*args, **kwargs)
+
+    @asynccontextmanager
+    async def acquire(self, *args, **kwargs) -> AsyncIterator[asyncpg.Connection]:
+        async with self._bulkhead.slot():
+            async with self._pool.acquire(*args, **kwargs) as conn:
+                yield conn
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+async def create_db_pool(config: Config, bulkhead: Optional[Bulkhead] = None):
     """Создание пула подключений к PostgreSQL"""
     async with asyncpg.create_pool(
         dsn=config.database.dsn,
@@ -31,6 +75,6 @@ async def create_db_pool(config: Config):
         init=init_connection,
     ) as pool:
         logger.info("PostgreSQL connection pool created")
-        yield pool
+        yield GuardedPool(pool, bulkhead) if bulkhead is not None else pool
         pool.terminate()
     logger.info("PostgreSQL connection pool closed")
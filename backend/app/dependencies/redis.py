@@ -1,9 +1,39 @@
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 import redis.asyncio as redis
 from dependencies.config import Config
+from services.bulkhead import Bulkhead
 
 
-async def create_redis_client(config: Config) -> AsyncGenerator[redis.Redis, None]:
+class GuardedRedis:
+    """
+    Клиент Redis за bulkhead: используемые команды (get/set/delete) сначала занимают
+    место в bulkhead. Остальные атрибуты отдаются клиентом как есть.
+    """
+
+    def __init__(self, client: redis.Redis, bulkhead: Bulkhead):
+        self._client = client
+        self._bulkhead = bulkhead
+
+    async def get(self, *args, **kwargs):
+        async with self._bulkhead.slot():
+            return await self._client.get(*args, **kwargs)
+
+    async def set(self, *args, **kwargs):
+        async with self._bulkhead.slot():
+            return await self._client.set(*args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        async with self._bulkhead.slot():
+            return await self._client.delete(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+async def create_redis_client(
+    config: Config,
+    bulkhead: Optional[Bulkhead] = None
+) -> AsyncGenerator[redis.Redis, None]:
     """Создание клиента Redis"""
     client = redis.from_url(
         config.redis.url,
@@ -13,6 +43,6 @@ async def create_redis_client(config: Config) -> AsyncGenerator[redis.Redis, Non
     )
 
     try:
-        yield client
+        yield GuardedRedis(client, bulkhead) if bulkhead is not None else client
     finally:
         await client.aclose()
@@ -1,12 +1,18 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
+import asyncio
 import uvicorn
 import logging
 
 from api.v1 import router as api_router
+from dao.competency_dao import CompetencyDAO
+from dao.version_dao import VersionDAO
 from dependencies import Container
 from middlewares.auth import AuthMiddleware
+from middlewares.load_shedding import LoadSheddingMiddleware
+from services.bulkhead import Priority, use_priority
 
 # Настройка логирования
 logging.basicConfig(
@@ -55,6 +61,62 @@ def custom_openapi(app: FastAPI):
     return app.openapi_schema
 
 
+async def build_hierarchy_index():
+    """Построение индекса иерархии; пока GraphDB недоступен - повторные попытки с паузой"""
+    delay = 1
+    while True:
+        try:
+            await CompetencyDAO.load_hierarchy_index()
+            return
+        except Exception as e:
+            logger.warning(f"Failed to build hierarchy index, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+async def reconcile_version_statistics(interval: int):
+    """Периодическая сверка счётчиков статистики версионирования с историей"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await VersionDAO.reconcile_statistics()
+        except Exception as e:
+            logger.warning(f"Failed to reconcile version statistics: {e}")
+
+
+async def maintain_history_partitions(months_ahead: int, interval: int):
+    """Периодическое создание месячных секций истории изменений заранее"""
+    while True:
+        try:
+            await VersionDAO.ensure_history_partitions(months_ahead)
+        except Exception as e:
+            logger.warning(f"Failed to create node change history partitions: {e}")
+        await asyncio.sleep(interval)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    config = app.state.container.config()
+    # Фоновые задачи обращаются к бэкендам с приоритетом BULK - после запросов редактора
+    with use_priority(Priority.BULK):
+        # Индекс строится в фоне: до готовности запросы иерархии идут в GraphDB
+        index_task = asyncio.create_task(build_hierarchy_index())
+        statistics_task = asyncio.create_task(
+            reconcile_version_statistics(config.versioning.statistics_reconcile_interval)
+        )
+        partitions_task = asyncio.create_task(
+            maintain_history_partitions(
+                config.versioning.history_partitions_ahead,
+                config.versioning.history_partitions_interval
+            )
+        )
+    yield
+    index_task.cancel()
+    statistics_task.cancel()
+    partitions_task.cancel()
+    app.state.container.password_hasher().shutdown()
+
+
 def create_app() -> FastAPI:
     container = Container()
     container.wire(packages=["api.v1", "dao"])
@@ -63,6 +125,7 @@ def create_app() -> FastAPI:
         title="Competency Graph API",
         description="API для работы с графом компетенций",
         version="1.0.0",
+        lifespan=lifespan,
         swagger_ui_parameters={
             "persistAuthorization": True,  # Сохранять токен между обновлениями
         }
@@ -71,12 +134,18 @@ def create_app() -> FastAPI:
     # Устанавливаем кастомную OpenAPI схему
     app.openapi = lambda: custom_openapi(app)
 
+    # Отказы bulkhead (перегрузка GraphDB/PostgreSQL/Redis) - 503 с Retry-After.
+    # Добавляется раньше CORSMiddleware, чтобы тот оборачивал и эти ответы:
+    # без Access-Control-Allow-Origin браузер показал бы ошибку CORS вместо 503
+    app.add_middleware(LoadSheddingMiddleware)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", "X-Next-Cursor"],
     )
 
     # Добавляем middleware авторизации
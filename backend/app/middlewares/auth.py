@@ -1,22 +1,87 @@
-from typing import Optional
-from fastapi import Request
+import hashlib
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import redis.asyncio as redis
 
 from services.auth import TokenService
 from dependencies.config import Config
 
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    """Middleware для аутентификации пользователей"""
-
-    def __init__(self, app, container):
-        super().__init__(app)
+# Пути без аутентификации (сравнение по префиксу)
+SKIP_AUTH_PREFIXES = (
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+    "/health",
+    "/api/v1/auth/login",
+    "/api/v1/auth/register",
+    "/api/v1/auth/refresh",
+)
+
+
+class TokenIdentity(NamedTuple):
+    """Данные проверенного access токена, нужные запросу"""
+    user_id: int
+    email: Optional[str]
+    expires_at: float
+
+
+class VerifiedTokenCache:
+    """
+    LRU-кэш проверенных access токенов: ключ - SHA-256 токена, запись живёт до exp токена.
+    Access токены не отзываются (в Redis хранятся только refresh), поэтому до exp
+    повторная проверка подписи даёт тот же результат.
+    """
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._entries: OrderedDict[bytes, TokenIdentity] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[TokenIdentity]:
+        key = self._key(token)
+        identity = self._entries.get(key)
+        if identity is None:
+            return None
+        if identity.expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return identity
+
+    def put(self, token: str, identity: TokenIdentity) -> None:
+        if self._maxsize <= 0 or identity.expires_at <= time.time():
+            return
+        key = self._key(token)
+        self._entries[key] = identity
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AuthMiddleware:
+    """
+    ASGI middleware для аутентификации пользователей.
+    Проверенные access токены кэшируются до истечения, так что повторные запросы
+    с тем же токеном не декодируют JWT заново.
+    """
+
+    def __init__(self, app: ASGIApp, container):
+        self.app = app
         self.container = container
         self._config: Optional[Config] = None
         self._redis_client: Optional[redis.Redis] = None
         self._token_service: Optional[TokenService] = None
+        self._token_cache: Optional[VerifiedTokenCache] = None
 
     async def _init_dependencies(self):
         """Ленивая инициализация зависимостей"""
@@ -30,57 +95,84 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 decode_responses=True
             )
             self._token_service = TokenService(self._redis_client, self._config)
-
-    async def dispatch(self, request: Request, call_next):
-        if request.method == "OPTIONS":
-            return await call_next(request)
-
-        if self._should_skip_auth(request.url.path):
-            return await call_next(request)
+            self._token_cache = VerifiedTokenCache(self._config.auth.token_cache_size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"].startswith(SKIP_AUTH_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        token = self._extract_token(scope)
+        if not token:
+            await JSONResponse(
+                status_code=401,
+                content={"detail": "Missing authentication token"}
+            )(scope, receive, send)
+            return
 
         try:
-            token = self._extract_token(request)
-            if not token:
-                return JSONResponse(
-                    status_code=401,
-                    content={"detail": "Missing authentication token"}
-                )
+            identity = await self._verify(token)
+        except Exception as e:
+            await JSONResponse(status_code=500, content={"detail": str(e)})(scope, receive, send)
+            return
 
-            await self._init_dependencies()
+        if identity is None:
+            await JSONResponse(
+                status_code=401,
+                content={"detail": "Invalid or expired token"}
+            )(scope, receive, send)
+            return
 
-            payload = await self._token_service.verify_token(token)
-            if not payload or payload.get("type") != "access":
-                return JSONResponse(
-                    status_code=401,
-                    content={"detail": "Invalid or expired token"}
-                )
+        state = scope.setdefault("state", {})
+        state["user_id"] = identity.user_id
+        state["user_email"] = identity.email
 
-            request.state.user_id = int(payload.get("sub"))
-            request.state.user_email = payload.get("email")
+        response_started = False
 
-            response = await call_next(request)
-            return response
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            return JSONResponse(
-                status_code=500,
-                content={"detail": str(e)}
-            )
+            # Ответ уже начат - отдать ошибку телом нельзя, пусть её обработает сервер
+            if response_started:
+                raise
+            await JSONResponse(status_code=500, content={"detail": str(e)})(scope, receive, send)
+
+    async def _verify(self, token: str) -> Optional[TokenIdentity]:
+        """Данные access токена из кэша или после проверки JWT; None - токен недействителен"""
+        await self._init_dependencies()
+
+        identity = self._token_cache.get(token)
+        if identity is not None:
+            return identity
+
+        payload = await self._token_service.verify_token(token)
+        if not payload or payload.get("type") != "access":
+            return None
 
-    def _should_skip_auth(self, path: str) -> bool:
-        skip_paths = [
-            "/docs",
-            "/redoc",
-            "/openapi.json",
-            "/health",
-            "/api/v1/auth/login",
-            "/api/v1/auth/register",
-            "/api/v1/auth/refresh"
-        ]
-        return any(path.startswith(skip_path) for skip_path in skip_paths)
-
-    def _extract_token(self, request: Request) -> Optional[str]:
-        auth_header = request.headers.get("Authorization")
+        identity = TokenIdentity(
+            user_id=int(payload.get("sub")),
+            email=payload.get("email"),
+            expires_at=float(payload.get("exp", 0)),
+        )
+        self._token_cache.put(token, identity)
+        return identity
+
+    def _extract_token(self, scope: Scope) -> Optional[str]:
+        auth_header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
         if not auth_header:
             return None
 
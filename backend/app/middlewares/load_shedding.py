@@ -0,0 +1,45 @@
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.bulkhead import BulkheadRejected, track_rejections
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware: запрос, на котором bulkhead отказал в обращении к бэкенду,
+    получает 503 с Retry-After вместо 500.
+    Эндпоинты и DAO оборачивают ошибки в HTTPException(500) и RuntimeError,
+    поэтому отказ определяется по факту, записанному bulkhead в контекст запроса.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_rejections() as rejections:
+            response_started = False
+
+            async def send_wrapper(message: Message) -> None:
+                nonlocal response_started
+                if message["type"] == "http.response.start":
+                    response_started = True
+                    if message["status"] == 500 and rejections:
+                        headers = list(message.get("headers", []))
+                        headers.append((b"retry-after", str(rejections[-1].retry_after).encode()))
+                        message = {**message, "status": 503, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except BulkheadRejected as e:
+                if response_started:
+                    raise
+                await JSONResponse(
+                    status_code=503,
+                    content={"detail": str(e)},
+                    headers={"Retry-After": str(e.retry_after)}
+                )(scope, receive, send)
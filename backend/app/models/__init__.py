@@ -1,2 +1,3 @@
 from models.graph import *
 from models.comments import *
+from models.admin import *
@@ -0,0 +1,43 @@
+from pydantic import BaseModel
+
+
+class SparqlTemplateStats(BaseModel):
+    """Счётчики выполнения одного шаблона SPARQL-запроса с момента запуска (или сброса)"""
+    template: str
+    calls: int
+    errors: int
+    rows: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+
+
+class PasswordHasherStats(BaseModel):
+    """Метрики пула bcrypt с момента запуска: загрузка, очередь, отказы (503) и время"""
+    workers: int
+    max_queue: int
+    running: int
+    queued: int
+    completed: int
+    failed: int
+    rejected: int
+    avg_wait_ms: float
+    max_wait_ms: float
+    avg_hash_ms: float
+
+
+class BulkheadStats(BaseModel):
+    """Счётчики bulkhead одного бэкенда с момента запуска"""
+    backend: str
+    limit: int
+    max_queue: int
+    max_wait_ms: float
+    active: int
+    queued: int
+    admitted_critical: int
+    admitted_interactive: int
+    admitted_bulk: int
+    rejected_queue_full: int
+    shed_deadline: int
+    avg_queue_wait_ms: float
+    max_queue_wait_ms: float
@@ -1,17 +1,63 @@
 from datetime import datetime
 from pydantic import BaseModel, Field
 
+# Ограничения столбцов таблицы comments (VARCHAR(255), INTEGER)
+MAX_COMMENT_FIELD_LENGTH = 255
+INT4_MIN, INT4_MAX = -2**31, 2**31 - 1
+# Смещение в тексте: точечный span [x, x] хранится как [x, x + 1), поэтому x < INT4_MAX
+MAX_TEXT_INDEX = INT4_MAX - 1
+
+
 class Comment(BaseModel):
     id: int | None = None
-    filename: str
-    start_index: int = Field(alias="startIndex")
-    end_index: int = Field(alias="endIndex")
-    subject: str
-    predicate: str
-    object: str
+    filename: str = Field(max_length=MAX_COMMENT_FIELD_LENGTH)
+    start_index: int = Field(alias="startIndex", ge=INT4_MIN, le=MAX_TEXT_INDEX)
+    end_index: int = Field(alias="endIndex", ge=INT4_MIN, le=MAX_TEXT_INDEX)
+    subject: str = Field(max_length=MAX_COMMENT_FIELD_LENGTH)
+    predicate: str = Field(max_length=MAX_COMMENT_FIELD_LENGTH)
+    object: str = Field(max_length=MAX_COMMENT_FIELD_LENGTH)
     author: str | None = None  # Заполняется автоматически из JWT
     created_at: datetime | None = Field(default=None, alias="createdAt")
 
     class Config:
         from_attributes = True
         populate_by_name = True
+
+
+class CommentBatchItem(BaseModel):
+    """Результат для одного элемента пачки: созданный комментарий или ошибка валидации"""
+    index: int
+    comment: Comment | None = None
+    error: str | None = None
+
+
+class CommentBatchResponse(BaseModel):
+    created: int
+    failed: int
+    items: list[CommentBatchItem]  # в порядке входного списка
+
+
+class CommentTriple(BaseModel):
+    subject: str
+    predicate: str
+    object: str
+
+
+class CommentCountsRequest(BaseModel):
+    """Триплеты, для которых нужны счётчики; без triples - все связи текущего графа"""
+    triples: list[CommentTriple] | None = None
+
+
+class TripleCommentCount(BaseModel):
+    subject: str
+    predicate: str
+    object: str
+    count: int
+    latest_at: datetime = Field(alias="latestAt")
+
+    class Config:
+        populate_by_name = True
+
+
+class CommentCountsResponse(BaseModel):
+    counts: list[TripleCommentCount]  # только триплеты, у которых есть комментарии
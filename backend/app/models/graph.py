@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -15,6 +15,7 @@ class OntologyNode(BaseModel):
     id: str
     label: str
     type: NodeType = Field(default=NodeType.CLASS)
+    level: Optional[int] = None  # уровень компетенции (:hasLevelN), если задан
 
 
 class CompetencyEdge(BaseModel):
@@ -49,3 +50,82 @@ class GraphResponse(BaseModel):
     """Граф в формате, который принимает/отдаёт фронтенд"""
     nodes: List[RDFNode]
     links: List[RDFLink]
+
+class PathResponse(BaseModel):
+    """Путь в иерархии: узлы в порядке следования и связи между соседними узлами"""
+    nodes: List[OntologyNode]
+    links: List[RDFLink]
+
+class GraphPartNode(RDFNode):
+    """Узел части графа с расстоянием (в переходах) от стартового узла"""
+    distance: int
+
+class GraphPartResponse(BaseModel):
+    """Часть графа, найденная обходом в ширину"""
+    nodes: List[GraphPartNode]
+    links: List[RDFLink]
+    next_cursor: Optional[str] = None  # курсор следующей страницы, None - страниц больше нет
+
+
+class GraphTriple(BaseModel):
+    """Триплет из журнала изменений графа"""
+    subject: str
+    predicate: str
+    object: str
+    object_type: str  # "uri" или "literal"
+
+class GraphChangesResponse(BaseModel):
+    """Сжатые изменения графа после указанного seq"""
+    since: int
+    latest: int  # seq, с которого запрашивать следующую порцию
+    has_more: bool
+    reset: bool  # граф очищался: нужно перезагрузить его целиком
+    added: List[GraphTriple]
+    removed: List[GraphTriple]
+
+
+class PatchOperationType(str, Enum):
+    ADD = 'add'
+    REMOVE = 'remove'
+    REPLACE = 'replace'
+
+class PatchTriple(BaseModel):
+    """Триплет операции патча: все три терма - URI"""
+    subject: str
+    predicate: str
+    object: str
+
+class TriplePatchOperation(BaseModel):
+    """Одна операция патча; new_triple обязателен только для replace"""
+    op: PatchOperationType
+    triple: PatchTriple
+    new_triple: Optional[PatchTriple] = None
+
+class GraphPatchRequest(BaseModel):
+    """Упорядоченный список операций, применяемых к графу атомарно"""
+    operations: List[TriplePatchOperation]
+
+class PatchOperationResult(BaseModel):
+    """
+    Итог операции: applied - её эффект вошёл в патч, superseded - перекрыт более поздней операцией,
+    noop - граф уже был в нужном состоянии (добавляемый триплет есть, удаляемого нет)
+    """
+    index: int
+    op: PatchOperationType
+    status: str
+
+class GraphPatchResponse(BaseModel):
+    """Результат атомарного патча графа"""
+    status: str
+    added: int
+    removed: int
+    versions: Dict[str, int]  # новая версия каждого затронутого субъекта
+    operations: List[PatchOperationResult]
+
+class GraphMigrationReport(BaseModel):
+    """Итог переноса графа по умолчанию в именованный граф данных"""
+    moved: int
+    skipped_blank_nodes: int  # триплеты с blank node остаются в графе по умолчанию
+    skipped_system: int
+    unparsed: int
+    samples: List[str]  # несколько оставленных строк N-Triples для проверки
@@ -0,0 +1,176 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from time import perf_counter
+from typing import AsyncIterator, Iterator, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Приоритет запроса в очереди bulkhead: меньшее значение обслуживается раньше"""
+    CRITICAL = 0  # записи, которые нельзя потерять после фиксации в другом бэкенде; не сбрасываются
+    INTERACTIVE = 1  # чтения и правки из редактора
+    BULK = 2  # сохранение графа целиком, выгрузки, фоновые задачи
+
+
+class BulkheadRejected(Exception):
+    """Бэкенд перегружен: очередь заполнена или ожидание превысило срок"""
+
+    def __init__(self, backend: str, reason: str, retry_after: int):
+        super().__init__(f"{backend} is overloaded ({reason}), retry after {retry_after}s")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# Приоритет текущего запроса (задаётся зависимостью эндпоинта или фоновой задачей)
+_priority: ContextVar[Priority] = ContextVar("bulkhead_priority", default=Priority.INTERACTIVE)
+# Отказы bulkhead в текущем запросе - по ним LoadSheddingMiddleware отвечает 503
+_rejections: ContextVar[Optional[list[BulkheadRejected]]] = ContextVar("bulkhead_rejections", default=None)
+
+
+async def bulk_priority() -> None:
+    """Зависимость FastAPI: запросы эндпоинта к бэкендам идут с приоритетом BULK"""
+    _priority.set(Priority.BULK)
+
+
+@contextmanager
+def use_priority(priority: Priority) -> Iterator[None]:
+    """Приоритет для запросов к бэкендам внутри блока (для фоновых задач)"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def track_rejections() -> Iterator[list[BulkheadRejected]]:
+    """Собирает отказы bulkhead, случившиеся внутри блока (в том числе в дочерних задачах)"""
+    rejections: list[BulkheadRejected] = []
+    token = _rejections.set(rejections)
+    try:
+        yield rejections
+    finally:
+        _rejections.reset(token)
+
+
+class Bulkhead:
+    """
+    Ограничение параллельных обращений к одному бэкенду (GraphDB, PostgreSQL, Redis).
+    Не больше limit вызовов одновременно; остальные ждут в очереди по приоритету
+    (INTERACTIVE раньше BULK, внутри приоритета - по порядку прихода).
+    Если очередь заполнена или ожидание дольше max_wait секунд, вызов сразу получает
+    BulkheadRejected вместо того, чтобы копить запросы до общего таймаута.
+    Вызовы с приоритетом CRITICAL не отклоняются: они встают в начало очереди и ждут места.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._admitted = {priority: 0 for priority in Priority}
+        self._rejected_queue_full = 0
+        self._shed_deadline = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Занять место на время вызова бэкенда; приоритет берётся из контекста запроса"""
+        await self._acquire(_priority.get())
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: Priority) -> None:
+        if self._active < self.limit and not self._queued:
+            self._active += 1
+            self._admitted[priority] += 1
+            return
+        critical = priority == Priority.CRITICAL
+        if self._queued >= self.max_queue and not critical:
+            self._rejected_queue_full += 1
+            self._reject("queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self._queued += 1
+        started = perf_counter()
+        try:
+            await asyncio.wait({waiter}, timeout=None if critical else self.max_wait)
+        except asyncio.CancelledError:
+            self._leave_queue(waiter)
+            raise
+        finally:
+            self._record_wait(perf_counter() - started)
+
+        if not waiter.done():
+            self._leave_queue(waiter)
+            self._shed_deadline += 1
+            self._reject(f"queue wait exceeded {self.max_wait}s")
+        # Место передано освободившим вызовом (_release), _active уже учтён
+        self._admitted[priority] += 1
+
+    def _leave_queue(self, waiter: asyncio.Future) -> None:
+        """Ожидание прервано: место, если его успели передать, возвращается следующему"""
+        if waiter.done() and not waiter.cancelled():
+            self._release()
+            return
+        waiter.cancel()
+        self._queued -= 1  # запись в куче удалится лениво в _release
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.cancelled():
+                continue
+            self._queued -= 1
+            waiter.set_result(None)
+            return
+        self._active -= 1
+
+    def _record_wait(self, seconds: float) -> None:
+        self._wait_seconds += seconds
+        self._max_wait_seconds = max(self._max_wait_seconds, seconds)
+
+    def _reject(self, reason: str) -> None:
+        rejection = BulkheadRejected(self.name, reason, max(1, math.ceil(self.max_wait)))
+        rejections = _rejections.get()
+        if rejections is not None:
+            rejections.append(rejection)
+        logger.warning(f"Bulkhead {self.name} rejected a call: {reason}")
+        raise rejection
+
+    def stats(self) -> dict:
+        """Счётчики с момента запуска: загрузка, очередь, отказы и время ожидания"""
+        admitted = sum(self._admitted.values())
+        waited = admitted + self._shed_deadline
+        return {
+            "backend": self.name,
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "active": self._active,
+            "queued": self._queued,
+            "admitted_critical": self._admitted[Priority.CRITICAL],
+            "admitted_interactive": self._admitted[Priority.INTERACTIVE],
+            "admitted_bulk": self._admitted[Priority.BULK],
+            "rejected_queue_full": self._rejected_queue_full,
+            "shed_deadline": self._shed_deadline,
+            "avg_queue_wait_ms": round(self._wait_seconds * 1000 / waited, 3) if waited else 0.0,
+            "max_queue_wait_ms": round(self._max_wait_seconds * 1000, 3),
+        }
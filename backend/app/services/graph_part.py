@@ -0,0 +1,141 @@
+import asyncio
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+
+# Исходящие триплеты узлов из GraphDB: узлы -> [(s, p, o, объект - URI?)]
+EdgeLoader = Callable[[list[str]], Awaitable[list[tuple[str, str, str, bool]]]]
+# Переход обхода: (s, p, o, объект - URI?) -> идти ли в o
+EdgeFilter = Callable[[str, str, str, bool], bool]
+
+
+class GraphPartTraversal:
+    """
+    Обход в ширину от start_uri не глубже depth, продолжаемый с места остановки.
+    Уровни раскрываются целиком и хранятся отсортированными по URI, поэтому порядок узлов -
+    ключ (distance, URI), а начало следующей страницы находится бинарным поиском по курсору.
+    Исходящие триплеты каждого узла запрашиваются один раз: при раскрытии его уровня
+    или когда узел впервые попадает на страницу (ради метки, типов и связей).
+    """
+
+    def __init__(self, start_uri: str, depth: int, generation: int, follow: EdgeFilter):
+        self.start_uri = start_uri
+        self.depth = depth
+        self.generation = generation
+        self._follow = follow
+        self._levels: list[list[str]] = [[start_uri]]
+        self._starts: list[int] = [0]  # позиция первого узла уровня в общем порядке
+        self._distances: dict[str, int] = {start_uri: 0}
+        self._edges: dict[str, list[tuple[str, str, str, bool]]] = {}
+        self._exhausted = depth == 0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return self._starts[-1] + len(self._levels[-1])
+
+    def distance(self, uri: str) -> int:
+        return self._distances[uri]
+
+    def edges(self, uri: str) -> list[tuple[str, str, str, bool]]:
+        """Исходящие триплеты узла, уже загруженные обходом"""
+        return self._edges.get(uri, [])
+
+    async def page(
+        self,
+        load_edges: EdgeLoader,
+        limit: int,
+        after: Optional[tuple[int, str]] = None,
+        offset: int = 0,
+    ) -> tuple[list[str], bool]:
+        """
+        Узлы после ключа after (или с позиции offset) - не больше limit, и есть ли следующая страница.
+        Уровни раскрываются, только пока их не хватает на страницу; у узлов страницы
+        исходящие триплеты загружены.
+        """
+        async with self._lock:
+            if after is not None:
+                while len(self._levels) <= after[0] and await self._discover(load_edges):
+                    pass
+                first = self._position(after)
+            else:
+                first = offset
+
+            while len(self) <= first + limit and await self._discover(load_edges):
+                pass
+            page = self._slice(first, first + limit + 1)
+            await self._load([uri for uri in page[:limit] if uri not in self._edges], load_edges)
+        return page[:limit], len(page) > limit
+
+    def _position(self, after: tuple[int, str]) -> int:
+        """Число узлов с ключом не больше after"""
+        distance, uri = after
+        if distance >= len(self._levels):
+            return len(self)
+        return self._starts[distance] + bisect_right(self._levels[distance], uri)
+
+    def _slice(self, start: int, stop: int) -> list[str]:
+        result = []
+        level = max(0, bisect_right(self._starts, start) - 1)
+        while level < len(self._levels) and len(result) < stop - start:
+            first = self._starts[level]
+            nodes = self._levels[level]
+            result.extend(nodes[max(0, start - first):stop - first])
+            level += 1
+        return result
+
+    async def _discover(self, load_edges: EdgeLoader) -> bool:
+        """Раскрыть последний уровень и добавить следующий; False - обход закончен"""
+        if self._exhausted:
+            return False
+        distance = len(self._levels)
+        last = self._levels[-1]
+        await self._load([uri for uri in last if uri not in self._edges], load_edges)
+
+        found = {
+            o
+            for uri in last
+            for s, p, o, is_uri in self._edges[uri]
+            if o not in self._distances and self._follow(s, p, o, is_uri)
+        }
+        if not found:
+            self._exhausted = True
+            return False
+
+        level = sorted(found)
+        for uri in level:
+            self._distances[uri] = distance
+        self._starts.append(len(self))
+        self._levels.append(level)
+        self._exhausted = distance >= self.depth
+        return True
+
+    async def _load(self, uris: list[str], load_edges: EdgeLoader) -> None:
+        if not uris:
+            return
+        for uri in uris:
+            self._edges[uri] = []
+        for s, p, o, is_uri in await load_edges(uris):
+            self._edges[s].append((s, p, o, is_uri))
+
+
+class GraphPartCache:
+    """
+    LRU обходов get_graph_part: следующая страница того же (узел, глубина) продолжает обход,
+    а не повторяет его с начала. Обход привязан к поколению графа и после записи строится заново.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self._maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, int], GraphPartTraversal] = OrderedDict()
+
+    def traversal(self, start_uri: str, depth: int, generation: int, follow: EdgeFilter) -> GraphPartTraversal:
+        key = (start_uri, depth)
+        traversal = self._entries.get(key)
+        if traversal is None or traversal.generation != generation:
+            traversal = GraphPartTraversal(start_uri, depth, generation, follow)
+        self._entries[key] = traversal
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+        return traversal
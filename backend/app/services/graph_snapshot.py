@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Awaitable, Callable, Iterable, Optional
+import orjson
+
+
+logger = logging.getLogger(__name__)
+
+# Несистемный триплет графа: (субъект, предикат, объект, объект - URI?)
+GraphRow = tuple[str, str, str, bool]
+
+
+class GraphView:
+    """
+    Несистемные триплеты графа с индексами, из которых собирается {nodes, links} для фронтенда.
+    Узлы - субъекты и URI-объекты, не встречающиеся как предикаты; связи - триплеты с URI-объектом.
+    Добавление и удаление триплета стоят O(1), поэтому запись обновляет снимок по дельте,
+    не перечитывая граф из GraphDB. Повторное добавление или удаление триплета ничего не меняет.
+    """
+
+    def __init__(self, make_node: Callable[[str], dict]):
+        self._make_node = make_node
+        self._rows: set[GraphRow] = set()
+        self._node_refs: dict[str, int] = {}  # URI -> число триплетов, где он субъект или URI-объект
+        self._predicate_refs: dict[str, int] = {}
+        self._nodes: dict[str, dict] = {}
+        self._links: dict[tuple[str, str, str], dict] = {}
+        self._links_by_source: dict[str, dict[tuple[str, str, str], dict]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def clear(self) -> None:
+        self._rows.clear()
+        self._node_refs.clear()
+        self._predicate_refs.clear()
+        self._nodes.clear()
+        self._links.clear()
+        self._links_by_source.clear()
+
+    def add(self, row: GraphRow) -> None:
+        if row in self._rows:
+            return
+        self._rows.add(row)
+        s, p, o, is_uri = row
+        self._predicate_refs[p] = self._predicate_refs.get(p, 0) + 1
+        self._sync_node(p)
+        self._ref(s, 1)
+        if is_uri:
+            self._ref(o, 1)
+            link = {"source": s, "target": o, "predicate": p}
+            self._links[(s, p, o)] = link
+            self._links_by_source.setdefault(s, {})[(s, p, o)] = link
+
+    def remove(self, row: GraphRow) -> None:
+        if row not in self._rows:
+            return
+        self._rows.discard(row)
+        s, p, o, is_uri = row
+        self._predicate_refs[p] -= 1
+        if not self._predicate_refs[p]:
+            del self._predicate_refs[p]
+        self._sync_node(p)
+        self._ref(s, -1)
+        if is_uri:
+            self._ref(o, -1)
+            del self._links[(s, p, o)]
+            source_links = self._links_by_source[s]
+            del source_links[(s, p, o)]
+            if not source_links:
+                del self._links_by_source[s]
+
+    def _ref(self, uri: str, delta: int) -> None:
+        count = self._node_refs.get(uri, 0) + delta
+        if count > 0:
+            self._node_refs[uri] = count
+        else:
+            self._node_refs.pop(uri, None)
+        self._sync_node(uri)
+
+    def _sync_node(self, uri: str) -> None:
+        """Привести наличие узла uri в соответствие со счётчиками"""
+        if uri in self._node_refs and uri not in self._predicate_refs:
+            if uri not in self._nodes:
+                self._nodes[uri] = self._make_node(uri)
+        else:
+            self._nodes.pop(uri, None)
+
+    def links_from(self, sources: Iterable[str]) -> list[dict]:
+        """Связи, исходящие из узлов sources"""
+        return [link for source in sources for link in self._links_by_source.get(source, {}).values()]
+
+    def predicates(self) -> frozenset[str]:
+        """URI, встречающиеся как предикаты несистемных триплетов"""
+        return frozenset(self._predicate_refs)
+
+    def payload(self) -> dict:
+        return {"nodes": list(self._nodes.values()), "links": list(self._links.values())}
+
+
+class GraphVersionConflict(Exception):
+    """Граф изменился после того, как его прочитал клиент или запись"""
+
+
+@dataclass(frozen=True)
+class GraphSnapshot:
+    """Снимок полного графа; тело ответа и ETag сериализуются при первом обращении"""
+    generation: int
+    payload: dict
+
+    @cached_property
+    def body(self) -> bytes:
+        return orjson.dumps(self.payload)
+
+    @cached_property
+    def etag(self) -> str:
+        return f'"{hashlib.blake2b(self.body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match (слабое сравнение, как требует RFC 9110)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class GraphSnapshotCache:
+    """
+    Процессный кэш преобразованного графа {nodes, links}.
+    Снимок привязан к поколению репозитория: каждая запись в граф вызывает apply() со своей дельтой
+    (или invalidate(), если дельта неизвестна). Если снимок был актуален, apply() обновляет его
+    по дельте без GraphDB, иначе следующий get() перестраивает его через loader.
+    Двойная буферизация: пока строится снимок текущего поколения, остальные читатели получают
+    предыдущий и не ждут GraphDB. Ждёт запрос, запустивший перестроение, запросы при холодном старте
+    и запросы после записи, пока идёт перестроение более старого поколения: иначе запрос,
+    следующий за записью, получил бы снимок без неё.
+    """
+
+    def __init__(self):
+        self._generation = 0
+        self._current: Optional[GraphSnapshot] = None
+        self._view: Optional[GraphView] = None  # триплеты, из которых собран _current
+        self._rebuild: Optional[asyncio.Future] = None
+        self._rebuild_generation = -1
+        self._predicates: Optional[tuple[int, frozenset[str]]] = None  # (поколение, предикаты)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self) -> int:
+        """Увеличить поколение репозитория после записи в граф"""
+        self._generation += 1
+        return self._generation
+
+    def apply(self, added: Iterable[GraphRow] = (), removed: Iterable[GraphRow] = (), reset: bool = False) -> int:
+        """Увеличить поколение после записи уже применённой дельты; актуальный снимок обновляется на месте"""
+        current, view = self._current, self._view
+        up_to_date = current is not None and current.generation == self._generation
+        self._generation += 1
+        if not up_to_date:
+            return self._generation
+
+        if reset:
+            view.clear()
+        for row in removed:
+            view.remove(row)
+        for row in added:
+            view.add(row)
+        self._current = GraphSnapshot(generation=self._generation, payload=view.payload())
+        return self._generation
+
+    def links_from(self, snapshot: GraphSnapshot, sources: Iterable[str]) -> list[dict]:
+        """Связи снимка, исходящие из sources; GraphVersionConflict, если снимок уже заменён"""
+        if snapshot is not self._current:
+            raise GraphVersionConflict("Graph changed while it was being read")
+        return self._view.links_from(sources)
+
+    async def predicates(self, loader: Callable[[], Awaitable[Iterable[str]]]) -> frozenset[str]:
+        """
+        Предикаты графа текущего поколения: из актуального снимка, иначе через loader.
+        Результат loader запоминается до следующей записи, так что страницы потоковой выдачи
+        не перечитывают предикаты из GraphDB каждая.
+        """
+        generation = self._generation
+        if self._current is not None and self._current.generation == generation:
+            return self._view.predicates()
+        if self._predicates is not None and self._predicates[0] == generation:
+            return self._predicates[1]
+
+        predicates = frozenset(await loader())
+        if self._generation == generation:
+            self._predicates = (generation, predicates)
+        return predicates
+
+    async def get(self, loader: Callable[[], Awaitable[GraphView]], fresh: bool = False) -> GraphSnapshot:
+        """
+        Вернуть актуальный снимок, при необходимости построив его через loader.
+        fresh=True - не отдавать предыдущий буфер, а дождаться снимка текущего поколения.
+        """
+        current = self._current
+        if current is not None and current.generation == self._generation:
+            return current
+
+        rebuild = self._rebuild
+        if rebuild is not None and not rebuild.done() and self._rebuild_generation == self._generation:
+            if current is not None and not fresh:
+                # Перестроение текущего поколения уже идёт - отдаём предыдущий буфер
+                return current
+            return await asyncio.shield(rebuild)
+
+        # Перестроения нет или оно строит поколение до последней записи - нужен новый снимок.
+        # Старое перестроение доработает само, но не заменит более новый снимок
+        self._rebuild = asyncio.ensure_future(self._build(loader, self._generation))
+        self._rebuild_generation = self._generation
+        return await asyncio.shield(self._rebuild)
+
+    async def _build(self, loader: Callable[[], Awaitable[GraphView]], generation: int) -> GraphSnapshot:
+        view = await loader()
+        payload = view.payload()
+        snapshot = GraphSnapshot(generation=generation, payload=payload)
+
+        if self._current is None or self._current.generation <= generation:
+            self._current, self._view = snapshot, view
+        logger.info(
+            f"Graph snapshot rebuilt for generation {generation}: "
+            f"{len(payload['nodes'])} nodes, {len(payload['links'])} links"
+        )
+        return snapshot
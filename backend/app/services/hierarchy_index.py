@@ -0,0 +1,553 @@
+import heapq
+import logging
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Callable, Generator, Hashable, Iterable, Iterator, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+HAS_SUB_COMPETENCE = "http://example.org/hasSubCompetence"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+# Уровни компетенций задаются предикатами :hasLevel1 .. :hasLevel{MAX_LEVEL}
+MAX_LEVEL = 5
+
+
+def level_predicates(namespace: str) -> dict[str, int]:
+    """Предикаты уровней в namespace онтологии: {URI предиката: уровень}"""
+    return {f"{namespace}hasLevel{level}": level for level in range(1, MAX_LEVEL + 1)}
+
+
+def level_matches(node_level: Optional[int], level: Optional[int], max_level: Optional[int]) -> bool:
+    """Фильтр по уровню; узел без уровня проходит, только если фильтр не задан"""
+    if level is None and max_level is None:
+        return True
+    if node_level is None:
+        return False
+    return (level is None or node_level == level) and (max_level is None or node_level <= max_level)
+
+
+def _merge_intervals(intervals: list[tuple[int, int]]) -> tuple[tuple[int, int], ...]:
+    """Объединяет пересекающиеся и соседние интервалы в отсортированный кортеж"""
+    intervals.sort()
+    merged = [intervals[0]]
+    for start, end in intervals[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            if end > last_end:
+                merged[-1] = (last_start, end)
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+def _build_csr(node_count: int, sources: array, targets: array) -> tuple[array, array]:
+    """Строит CSR (смещения + соседи) по спискам рёбер; порядок соседей сохраняется"""
+    offsets = array("i", bytes(4 * (node_count + 1)))
+    for u in sources:
+        offsets[u + 1] += 1
+    for i in range(node_count):
+        offsets[i + 1] += offsets[i]
+
+    neighbors = array("i", bytes(4 * len(sources)))
+    position = array("i", offsets[:-1])
+    for u, v in zip(sources, targets):
+        neighbors[position[u]] = v
+        position[u] += 1
+    return offsets, neighbors
+
+
+# Запрос к источнику рёбер: (фронтир, направление вперёд?) -> {узел: соседи}
+PathSearch = Generator[tuple[list, bool], dict, list]
+
+
+def shortest_path_search(start: Hashable, end: Hashable, max_length: Optional[int] = None) -> PathSearch:
+    """
+    Двунаправленный обход в ширину от start (по рёбрам) и от end (против рёбер).
+    Генератор не ходит за рёбрами сам: он отдаёт (фронтир, вперёд?) и получает через send()
+    словарь соседей, поэтому один алгоритм работает и поверх индекса, и поверх GraphDB.
+    Каждый раз раскрывается меньший фронтир целым уровнем. Возвращает узлы пути
+    start -> end длиной не более max_length рёбер или пустой список.
+    """
+    if start == end:
+        return []
+    distances = ({start: 0}, {end: 0})
+    parents = ({start: None}, {end: None})
+    frontiers = ([start], [end])
+    length = 0
+
+    while frontiers[0] and frontiers[1] and (max_length is None or length < max_length):
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        other = 1 - side
+        neighbors = yield frontiers[side], side == 0
+
+        next_frontier = []
+        best, best_length = None, None
+        for node in frontiers[side]:
+            for neighbor in neighbors.get(node, ()):
+                if neighbor not in distances[side]:
+                    distances[side][neighbor] = distances[side][node] + 1
+                    parents[side][neighbor] = node
+                    next_frontier.append(neighbor)
+                    if neighbor in distances[other]:
+                        total = distances[side][neighbor] + distances[other][neighbor]
+                        if best_length is None or total < best_length:
+                            best, best_length = neighbor, total
+        frontiers[side][:] = next_frontier
+        length += 1
+
+        if best is not None:
+            path = []
+            node = best
+            while node is not None:
+                path.append(node)
+                node = parents[0][node]
+            path.reverse()
+            node = parents[1][best]
+            while node is not None:
+                path.append(node)
+                node = parents[1][node]
+            return path
+    return []
+
+
+class HierarchyIndex:
+    """
+    Индекс иерархии hasSubCompetence в памяти процесса.
+    URI интернируются в целые id, прямые и обратные рёбра хранятся в CSR на array.
+    Изменения после построения накапливаются в дельте (добавленные/удалённые рёбра);
+    когда дельта превышает порог, CSR пересобирается.
+    Поверх рёбер лениво строится интервальная разметка (post-order номера, для DAG - несколько
+    интервалов на узел): проверка предка - сравнение с интервалом, поддерево - скан диапазона.
+    Разметка сбрасывается при изменении рёбер; если в иерархии есть цикл, используется обход.
+    Также хранится уровень каждого узла (наименьший N из :hasLevelN).
+    Для постраничной выдачи предков/потомков отсортированные по URI замыкания последних
+    запрошенных узлов запоминаются до изменения рёбер (LRU на sorted_cache_size узлов).
+    Пока индекс не построен (ready=False), запросы должны идти в GraphDB.
+    """
+
+    def __init__(self, level_namespace: str = "", compact_threshold: int = 10000, sorted_cache_size: int = 256):
+        self._level_predicates = level_predicates(level_namespace)
+        self._compact_threshold = compact_threshold
+        self._sorted_cache_size = sorted_cache_size
+        self._journal: Optional[list[tuple]] = None
+        self._ready = False
+        self._clear()
+
+    def _clear(self) -> None:
+        self._ids: dict[str, int] = {}
+        self._uris: list[str] = []
+        # Метки и уровни узла с объектами триплетов, которые их дают:
+        # значение пропадает, только когда удалён последний такой триплет.
+        # Повторное добавление или удаление того же триплета ничего не меняет
+        self._labels: dict[str, dict[str, set[str]]] = {}
+        self._levels: dict[str, dict[int, set[str]]] = {}
+        self._base_nodes = 0
+        self._fwd_offsets, self._fwd = array("i", [0]), array("i")
+        self._rev_offsets, self._rev = array("i", [0]), array("i")
+        # Добавленные рёбра: {узел: {сосед: None}} - множество с порядком добавления
+        self._added_fwd: dict[int, dict[int, None]] = {}
+        self._added_rev: dict[int, dict[int, None]] = {}
+        self._added_count = 0
+        self._removed: set[tuple[int, int]] = set()
+        self._invalidate_labeling()
+
+    def _invalidate_labeling(self) -> None:
+        self._labeling_dirty = True
+        self._cyclic = False
+        self._post = array("i")
+        self._order = array("i")
+        self._intervals: list[tuple[tuple[int, int], ...]] = []
+        # (узел, предки?) -> предки или потомки узла, отсортированные по URI
+        self._sorted_related: OrderedDict[tuple[int, bool], list[str]] = OrderedDict()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._fwd) - len(self._removed) + self._added_count
+
+    def _intern(self, uri: str) -> int:
+        node_id = self._ids.get(uri)
+        if node_id is None:
+            node_id = len(self._uris)
+            self._ids[uri] = node_id
+            self._uris.append(uri)
+        return node_id
+
+    def _base_neighbors(self, offsets: array, neighbors: array, node_id: int) -> array:
+        if node_id >= self._base_nodes:
+            return neighbors[0:0]
+        return neighbors[offsets[node_id]:offsets[node_id + 1]]
+
+    def _neighbors(self, node_id: int, reverse: bool = False) -> list[int]:
+        if reverse:
+            base = self._base_neighbors(self._rev_offsets, self._rev, node_id)
+            result = [u for u in base if (u, node_id) not in self._removed] if self._removed else list(base)
+            result.extend(self._added_rev.get(node_id, ()))
+        else:
+            base = self._base_neighbors(self._fwd_offsets, self._fwd, node_id)
+            result = [v for v in base if (node_id, v) not in self._removed] if self._removed else list(base)
+            result.extend(self._added_fwd.get(node_id, ()))
+        return result
+
+    def _has_edge(self, u: int, v: int) -> bool:
+        if v in self._added_fwd.get(u, ()):
+            return True
+        return (u, v) not in self._removed and v in self._base_neighbors(self._fwd_offsets, self._fwd, u)
+
+    def _edges(self) -> Iterable[tuple[int, int]]:
+        for u in range(len(self._uris)):
+            for v in self._neighbors(u):
+                yield u, v
+
+    def _load(
+        self,
+        edges: Iterable[tuple[str, str]],
+        labels: Iterable[tuple[str, str]],
+        levels: Iterable[tuple[str, int, str]],
+    ) -> None:
+        self._clear()
+        sources, targets = array("i"), array("i")
+        seen = set()
+        for parent, child in edges:
+            edge = (self._intern(parent), self._intern(child))
+            if edge not in seen:
+                seen.add(edge)
+                sources.append(edge[0])
+                targets.append(edge[1])
+        for uri, label in labels:
+            self._track(self._labels, uri, label, label, True)
+        for uri, level, value in levels:
+            self._track(self._levels, uri, level, value, True)
+        self._compact(sources, targets)
+
+    def _compact(self, sources: Optional[array] = None, targets: Optional[array] = None) -> None:
+        """Пересобрать CSR из всех текущих рёбер и обнулить дельту"""
+        if sources is None:
+            sources, targets = array("i"), array("i")
+            for u, v in self._edges():
+                sources.append(u)
+                targets.append(v)
+        node_count = len(self._uris)
+        self._fwd_offsets, self._fwd = _build_csr(node_count, sources, targets)
+        self._rev_offsets, self._rev = _build_csr(node_count, targets, sources)
+        self._base_nodes = node_count
+        self._added_fwd.clear()
+        self._added_rev.clear()
+        self._added_count = 0
+        self._removed.clear()
+        self._invalidate_labeling()
+
+    def begin_build(self) -> None:
+        """Начать загрузку из GraphDB: изменения до finish_build будут переиграны поверх неё"""
+        self._journal = []
+
+    def finish_build(
+        self,
+        edges: Iterable[tuple[str, str]],
+        labels: Iterable[tuple[str, str]],
+        levels: Iterable[tuple[str, int, str]] = (),
+    ) -> None:
+        """
+        Заменить индекс загруженными рёбрами (родитель, потомок), метками (узел, метка)
+        и уровнями (узел, уровень, объект триплета :hasLevelN)
+        """
+        journal = self._journal or []
+        self._journal = None
+        self._load(edges, labels, levels)
+        for added, removed, reset in journal:
+            self._apply(added, removed, reset)
+        self._ready = True
+        logger.info(f"Hierarchy index built: {len(self._uris)} nodes, {self.edge_count} edges")
+
+    def abort_build(self) -> None:
+        self._journal = None
+
+    def invalidate(self) -> None:
+        """Граф изменён не дельтой (перенос данных): до следующей загрузки запросы идут в GraphDB"""
+        self._ready = False
+
+    def apply(self, added: Iterable[dict] = (), removed: Iterable[dict] = (), reset: bool = False) -> None:
+        """Применить изменения графа (триплеты в формате журнала изменений)"""
+        added, removed = list(added), list(removed)
+        if self._journal is not None:
+            self._journal.append((added, removed, reset))
+        self._apply(added, removed, reset)
+
+    def _apply(self, added: list[dict], removed: list[dict], reset: bool) -> None:
+        if reset:
+            self._clear()
+            return
+
+        for triple in removed:
+            if triple["predicate"] == RDFS_LABEL:
+                self._track(self._labels, triple["subject"], triple["object"], triple["object"], False)
+            elif triple["predicate"] in self._level_predicates:
+                level = self._level_predicates[triple["predicate"]]
+                self._track(self._levels, triple["subject"], level, triple["object"], False)
+            elif triple["predicate"] == HAS_SUB_COMPETENCE and triple.get("object_type", "uri") == "uri":
+                self._remove_edge(triple["subject"], triple["object"])
+
+        for triple in added:
+            if triple["predicate"] == RDFS_LABEL:
+                self._track(self._labels, triple["subject"], triple["object"], triple["object"], True)
+            elif triple["predicate"] in self._level_predicates:
+                level = self._level_predicates[triple["predicate"]]
+                self._track(self._levels, triple["subject"], level, triple["object"], True)
+            elif triple["predicate"] == HAS_SUB_COMPETENCE and triple.get("object_type", "uri") == "uri":
+                self._add_edge(triple["subject"], triple["object"])
+
+        if len(self._removed) + self._added_count > self._compact_threshold:
+            self._compact()
+
+    @staticmethod
+    def _track(values: dict[str, dict], uri: str, value: Hashable, source: str, present: bool) -> None:
+        """Учесть добавление или удаление триплета с объектом source, дающего узлу значение (метку или уровень)"""
+        node_values = values.setdefault(uri, {})
+        sources = node_values.setdefault(value, set())
+        if present:
+            sources.add(source)
+        else:
+            sources.discard(source)
+        if not sources:
+            del node_values[value]
+        if not node_values:
+            del values[uri]
+
+    def _add_edge(self, parent: str, child: str) -> None:
+        u, v = self._intern(parent), self._intern(child)
+        if self._has_edge(u, v):
+            return
+        self._invalidate_labeling()
+        if (u, v) in self._removed:
+            self._removed.discard((u, v))
+        else:
+            self._added_fwd.setdefault(u, {})[v] = None
+            self._added_rev.setdefault(v, {})[u] = None
+            self._added_count += 1
+
+    def _remove_edge(self, parent: str, child: str) -> None:
+        u, v = self._ids.get(parent), self._ids.get(child)
+        if u is None or v is None or not self._has_edge(u, v):
+            return
+        self._invalidate_labeling()
+        if v in self._added_fwd.get(u, ()):
+            del self._added_fwd[u][v]
+            del self._added_rev[v][u]
+            self._added_count -= 1
+        else:
+            self._removed.add((u, v))
+
+    def _ensure_labeling(self) -> bool:
+        """Построить интервальную разметку, если она сброшена; False - иерархия содержит цикл"""
+        if not self._labeling_dirty:
+            return not self._cyclic
+
+        node_count = len(self._uris)
+        children = [self._neighbors(u) for u in range(node_count)]
+        has_parent = bytearray(node_count)
+        for node_children in children:
+            for child in node_children:
+                has_parent[child] = 1
+
+        # Post-order обход в глубину; 1 - узел на стеке, 2 - обработан
+        post = array("i", [-1]) * node_count
+        order = array("i")
+        state = bytearray(node_count)
+        roots = [u for u in range(node_count) if not has_parent[u]]
+        for root in roots + list(range(node_count)):
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [(root, iter(children[root]))]
+            while stack:
+                node, pending = stack[-1]
+                for child in pending:
+                    if state[child] == 0:
+                        state[child] = 1
+                        stack.append((child, iter(children[child])))
+                        break
+                    if state[child] == 1:
+                        self._labeling_dirty = False
+                        self._cyclic = True
+                        logger.warning("Hierarchy contains a cycle, interval labeling disabled")
+                        return False
+                else:
+                    stack.pop()
+                    state[node] = 2
+                    post[node] = len(order)
+                    order.append(node)
+
+        # Интервалы узла - его номер плюс интервалы детей (дети размечены раньше родителей)
+        intervals: list[tuple[tuple[int, int], ...]] = [()] * node_count
+        for node in order:
+            spans = [(post[node], post[node])]
+            for child in children[node]:
+                spans.extend(intervals[child])
+            intervals[node] = _merge_intervals(spans)
+
+        self._post, self._order, self._intervals = post, order, intervals
+        self._labeling_dirty = False
+        return True
+
+    def is_descendant(self, uri: str, ancestor: str) -> bool:
+        """Находится ли uri в поддереве ancestor (сам узел потомком не считается)"""
+        node_id, ancestor_id = self._ids.get(uri), self._ids.get(ancestor)
+        if node_id is None or ancestor_id is None:
+            return False
+        if not self._ensure_labeling():
+            return uri in self._reachable(ancestor, reverse=False)
+        if node_id == ancestor_id:
+            return False
+
+        position = self._post[node_id]
+        spans = self._intervals[ancestor_id]
+        if len(spans) == 1:
+            return spans[0][0] <= position <= spans[0][1]
+        i = bisect_right(spans, (position, len(self._order))) - 1
+        return i >= 0 and spans[i][0] <= position <= spans[i][1]
+
+    def label(self, uri: str) -> str:
+        """Первая из оставшихся меток узла или сам URI"""
+        node_labels = self._labels.get(uri)
+        return next(iter(node_labels)) if node_labels else uri
+
+    def level(self, uri: str) -> Optional[int]:
+        node_levels = self._levels.get(uri)
+        return min(node_levels) if node_levels else None
+
+    def _walk(self, uri: str, reverse: bool) -> Iterator[str]:
+        """Обход в ширину от узла (ближайшие первыми), лениво"""
+        start = self._ids.get(uri)
+        if start is None:
+            return
+        visited = set()
+        queue = deque([start])
+        while queue:
+            for neighbor in self._neighbors(queue.popleft(), reverse):
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    yield self._uris[neighbor]
+                    queue.append(neighbor)
+
+    def _reachable(self, uri: str, reverse: bool) -> list[str]:
+        return list(self._walk(uri, reverse))
+
+    def _iter_descendants(self, uri: str) -> Iterator[str]:
+        """
+        Потомки узла, лениво. С разметкой - скан диапазонов post-order в обратном порядке
+        (родители раньше детей), без неё (цикл) - обход в ширину.
+        """
+        node_id = self._ids.get(uri)
+        if node_id is None:
+            return iter(())
+        if not self._ensure_labeling():
+            return self._walk(uri, reverse=False)
+
+        def scan():
+            for start, end in reversed(self._intervals[node_id]):
+                for position in range(end, start - 1, -1):
+                    descendant = self._order[position]
+                    if descendant != node_id:
+                        yield self._uris[descendant]
+
+        return scan()
+
+    def ancestors(self, uri: str) -> list[str]:
+        """Все предки узла в порядке обхода в ширину (ближайшие первыми)"""
+        return self._reachable(uri, reverse=True)
+
+    def descendants(self, uri: str, offset: int = 0, limit: Optional[int] = None) -> list[str]:
+        """Потомки узла (порядок - см. _iter_descendants), страница [offset, offset + limit)"""
+        stop = None if limit is None else offset + limit
+        return list(islice(self._iter_descendants(uri), offset, stop))
+
+    def _sorted(self, uri: str, ancestors: bool) -> list[str]:
+        """Предки или потомки узла, отсортированные по URI (запоминаются до изменения рёбер)"""
+        node_id = self._ids.get(uri)
+        if node_id is None:
+            return []
+        key = (node_id, ancestors)
+        related = self._sorted_related.get(key)
+        if related is not None:
+            self._sorted_related.move_to_end(key)
+            return related
+
+        related = sorted(set(self.ancestors(uri) if ancestors else self.descendants(uri)))
+        self._sorted_related[key] = related
+        while len(self._sorted_related) > self._sorted_cache_size:
+            self._sorted_related.popitem(last=False)
+        return related
+
+    def related_page(
+        self,
+        uri: str,
+        ancestors: bool,
+        limit: int,
+        after: Optional[str] = None,
+        offset: int = 0,
+        keep: Optional[Callable[[str], bool]] = None,
+    ) -> tuple[list[str], bool]:
+        """
+        Страница предков/потомков узла в порядке URI: после URI after или с позиции offset
+        (среди узлов, прошедших фильтр keep). Начало страницы находится бинарным поиском,
+        дальше просматриваются только узлы до limit + 1 подходящих.
+        Возвращает (узлы страницы, есть ли следующая страница).
+        """
+        related = self._sorted(uri, ancestors)
+        start = bisect_right(related, after) if after is not None else 0
+        if keep is None:
+            start += offset
+            page = related[start:start + limit + 1]
+        else:
+            matching = (related[i] for i in range(start, len(related)) if keep(related[i]))
+            page = list(islice(matching, offset, offset + limit + 1))
+        return page[:limit], len(page) > limit
+
+    def related_many(
+        self,
+        uris: Iterable[str],
+        ancestors: bool,
+        limit: int,
+        keep: Optional[Callable[[str], bool]] = None,
+    ) -> dict[str, list[str]]:
+        """
+        Первые по URI limit предков/потомков каждого узла (среди прошедших фильтр keep).
+        Каждый узел обходится один раз, даже если повторяется в uris; в памяти держится
+        только limit лучших, а не всё замыкание. Запомненное отсортированное замыкание
+        (после related_page) используется без обхода.
+        """
+        result = {}
+        for uri in uris:
+            if uri in result:
+                continue
+            node_id = self._ids.get(uri)
+            cached = self._sorted_related.get((node_id, ancestors)) if node_id is not None else None
+            if cached is not None:
+                matching = cached if keep is None else filter(keep, cached)
+                result[uri] = list(islice(matching, limit))
+                continue
+            related = self._walk(uri, reverse=True) if ancestors else self._iter_descendants(uri)
+            result[uri] = heapq.nsmallest(limit, related if keep is None else filter(keep, related))
+        return result
+
+    def find_path(self, start: str, end: str, max_length: Optional[int] = None) -> list[str]:
+        """Кратчайший путь start -> end по hasSubCompetence; пустой список, если пути нет"""
+        source, target = self._ids.get(start), self._ids.get(end)
+        if source is None or target is None:
+            return []
+
+        search = shortest_path_search(source, target, max_length)
+        try:
+            frontier, forward = next(search)
+            while True:
+                neighbors = {node: self._neighbors(node, reverse=not forward) for node in frontier}
+                frontier, forward = search.send(neighbors)
+        except StopIteration as stop:
+            return [self._uris[node] for node in stop.value]
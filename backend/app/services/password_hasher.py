@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import math
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable, Optional, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """Пул хеширования паролей и его очередь заполнены; повторить через retry_after секунд"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Password hashing capacity exhausted, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Отдельный пул потоков для bcrypt (hash_password/verify_password из TokenService).
+    bcrypt отпускает GIL, поэтому хеширование в потоках не блокирует цикл событий
+    и выполняется параллельно. Одновременно в пуле не больше workers + max_queue задач:
+    сверх этого вызов сразу получает PasswordHasherBusy, а не ждёт в очереди.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 32):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+        self._lock = threading.Lock()
+        self._pending = 0  # в очереди и выполняются
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._work_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """Выполнить func(*args) в пуле; PasswordHasherBusy, если очередь заполнена"""
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._rejected += 1
+                retry_after = self._retry_after()
+                logger.warning(f"Password hasher saturated: {self._pending} pending, rejecting")
+                raise PasswordHasherBusy(retry_after)
+            self._pending += 1
+
+        submitted = perf_counter()
+        try:
+            future = self._executor.submit(self._execute, submitted, func, args)
+        except BaseException:
+            self._release()
+            raise
+        # Место освобождается, когда задача завершена или отменена в очереди: отмена запроса
+        # (например, клиент отключился) отменяет задачу, и _execute для неё уже не вызовется.
+        # Уже начатая задача не отменяется, и место занято, пока bcrypt не доработает
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future: Optional[Future] = None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _execute(self, submitted: float, func: Callable[..., T], args: tuple) -> T:
+        started = perf_counter()
+        with self._lock:
+            self._running += 1
+        failed = False
+        try:
+            return func(*args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._failed += failed
+                self._wait_seconds += started - submitted
+                self._max_wait_seconds = max(self._max_wait_seconds, started - submitted)
+                self._work_seconds += perf_counter() - started
+
+    def _retry_after(self) -> int:
+        """Оценка времени, за которое пул разберёт текущую очередь, секунды (под self._lock)"""
+        average = self._work_seconds / self._completed if self._completed else 0.25
+        return max(1, math.ceil(self._pending / self.workers * average))
+
+    def stats(self) -> dict:
+        """Метрики пула для подбора workers/max_queue отдельно от пропускной способности API"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_seconds * 1000 / self._completed, 3) if self._completed else 0.0,
+                "max_wait_ms": round(self._max_wait_seconds * 1000, 3),
+                "avg_hash_ms": round(self._work_seconds * 1000 / self._completed, 3) if self._completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,221 @@
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+from dependencies.graphdb import GraphDBClient
+from services.bulkhead import Bulkhead, BulkheadRejected, Priority, track_rejections, use_priority
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def hold(bulkhead: Bulkhead, started: asyncio.Event, release: asyncio.Event, priority=Priority.INTERACTIVE):
+    with use_priority(priority):
+        async with bulkhead.slot():
+            started.set()
+            await release.wait()
+
+
+def test_admits_up_to_limit_and_queues_the_rest():
+    async def scenario():
+        bulkhead = Bulkhead("test", limit=2, max_queue=10, max_wait=5.0)
+        release = asyncio.Event()
+        events = [asyncio.Event() for _ in range(3)]
+        tasks = [asyncio.create_task(hold(bulkhead, event, release)) for event in events]
+        await asyncio.sleep(0.01)
+        assert [event.is_set() for event in events] == [True, True, False]
+        assert bulkhead.stats()["active"] == 2
+        assert bulkhead.stats()["queued"] == 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+        stats = bulkhead.stats()
+        assert stats["active"] == 0 and stats["queued"] == 0
+        assert stats["admitted_interactive"] == 3
+
+    run(scenario())
+
+
+def test_rejects_when_queue_is_full_and_records_rejection():
+    async def scenario():
+        bulkhead = Bulkhead("test", limit=1, max_queue=1, max_wait=5.0)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(bulkhead, asyncio.Event(), release)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+
+        with track_rejections() as rejections:
+            with pytest.raises(BulkheadRejected) as error:
+                async with bulkhead.slot():
+                    pass
+        assert error.value.reason == "queue is full"
+        assert error.value.retry_after == 5
+        assert rejections == [error.value]
+        assert bulkhead.stats()["rejected_queue_full"] == 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+
+    run(scenario())
+
+
+def test_sheds_after_max_wait():
+    async def scenario():
+        bulkhead = Bulkhead("test", limit=1, max_queue=5, max_wait=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(bulkhead, asyncio.Event(), release))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(BulkheadRejected):
+            async with bulkhead.slot():
+                pass
+        stats = bulkhead.stats()
+        assert stats["shed_deadline"] == 1
+        assert stats["queued"] == 0
+
+        release.set()
+        await holder
+        assert bulkhead.stats()["active"] == 0
+
+    run(scenario())
+
+
+def test_interactive_served_before_bulk():
+    async def scenario():
+        bulkhead = Bulkhead("test", limit=1, max_queue=10, max_wait=5.0)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(bulkhead, asyncio.Event(), release))
+        await asyncio.sleep(0.01)
+
+        order = []
+
+        async def call(name: str, priority: Priority):
+            with use_priority(priority):
+                async with bulkhead.slot():
+                    order.append(name)
+
+        waiters = [
+            asyncio.create_task(call("bulk", Priority.BULK)),
+            asyncio.create_task(call("interactive", Priority.INTERACTIVE)),
+            asyncio.create_task(call("critical", Priority.CRITICAL)),
+        ]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        assert order == ["critical", "interactive", "bulk"]
+
+    run(scenario())
+
+
+def test_critical_is_never_shed():
+    async def scenario():
+        bulkhead = Bulkhead("test", limit=1, max_queue=0, max_wait=0.01)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(bulkhead, asyncio.Event(), release))
+        await asyncio.sleep(0.01)
+
+        done = asyncio.Event()
+
+        async def critical():
+            with use_priority(Priority.CRITICAL):
+                async with bulkhead.slot():
+                    done.set()
+
+        task = asyncio.create_task(critical())
+        await asyncio.sleep(0.05)
+        assert not done.is_set()
+        release.set()
+        await asyncio.gather(holder, task)
+        assert bulkhead.stats()["admitted_critical"] == 1
+
+    run(scenario())
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        bulkhead = Bulkhead("test", limit=1, max_queue=5, max_wait=5.0)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(bulkhead, asyncio.Event(), release))
+        await asyncio.sleep(0.01)
+
+        waiter = asyncio.create_task(hold(bulkhead, asyncio.Event(), asyncio.Event()))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert bulkhead.stats()["queued"] == 0
+
+        release.set()
+        await holder
+        async with bulkhead.slot():
+            assert bulkhead.stats()["active"] == 1
+        assert bulkhead.stats()["active"] == 0
+
+    run(scenario())
+
+
+def graphdb_handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/transactions"):
+        return httpx.Response(201, headers={"Location": "http://g/repositories/r/transactions/1"})
+    if "/transactions/" in request.url.path:
+        return httpx.Response(204)
+    if request.headers.get("accept") == "text/tab-separated-values":
+        return httpx.Response(200, content=b"?s\n<http://e/a>\n<http://e/b>\n")
+    return httpx.Response(200, content=orjson.dumps({"results": {"bindings": []}}))
+
+
+def graphdb_client(bulkhead: Bulkhead, stream_bulkhead: Bulkhead) -> GraphDBClient:
+    http = httpx.AsyncClient(transport=httpx.MockTransport(graphdb_handler))
+    return GraphDBClient(http, "http://g/repositories/r", bulkhead, stream_bulkhead)
+
+
+def test_open_stream_holds_stream_slot_only():
+    async def scenario():
+        bulkhead = Bulkhead("graphdb", limit=1, max_queue=0, max_wait=5.0)
+        streams = Bulkhead("graphdb_streams", limit=1, max_queue=0, max_wait=5.0)
+        client = graphdb_client(bulkhead, streams)
+
+        # Клиент API прочитал первую строку и не читает дальше
+        rows = client.stream_query("SELECT ?s WHERE { ?s ?p ?o }")
+        assert (await anext(rows))["s"]["value"] == "http://e/a"
+        assert streams.stats()["active"] == 1
+        assert bulkhead.stats()["active"] == 0
+
+        # Обычные запросы проходят, второй поток получает отказ
+        assert await client.query("ASK {}") == {"results": {"bindings": []}}
+        with pytest.raises(BulkheadRejected):
+            await anext(client.stream_statements())
+
+        await rows.aclose()
+        assert streams.stats()["active"] == 0
+
+    run(scenario())
+
+
+def test_transaction_actions_take_slots_and_commit_is_critical():
+    async def scenario():
+        bulkhead = Bulkhead("graphdb", limit=1, max_queue=0, max_wait=5.0)
+        client = graphdb_client(bulkhead, Bulkhead("graphdb_streams", limit=1, max_queue=0, max_wait=5.0))
+        transaction = await client.begin_transaction()
+
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(bulkhead, asyncio.Event(), release))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(BulkheadRejected):
+            await transaction.add(b"<http://e/a> <http://e/p> <http://e/b> .\n")
+
+        # Фиксация ждёт места, но не сбрасывается
+        commit = asyncio.create_task(transaction.commit())
+        await asyncio.sleep(0.05)
+        assert not commit.done()
+        release.set()
+        await asyncio.gather(holder, commit)
+
+        stats = bulkhead.stats()
+        assert stats["admitted_critical"] == 1
+        assert stats["admitted_interactive"] == 2
+        assert stats["active"] == 0
+
+    run(scenario())
@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import asyncpg
+import pytest
+from pydantic import ValidationError
+
+from dao.comments import CommentsDAO
+from models.comments import INT4_MAX, MAX_TEXT_INDEX, Comment
+
+
+# База с применёнными миграциями; каждый тест работает в транзакции, которая откатывается
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+requires_database = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+def comment(start: int, end: int) -> dict:
+    return {"filename": "f", "startIndex": start, "endIndex": end, "subject": "s", "predicate": "p", "object": "o"}
+
+
+def test_text_index_leaves_room_for_point_span():
+    assert Comment(**comment(MAX_TEXT_INDEX, MAX_TEXT_INDEX)).end_index == MAX_TEXT_INDEX
+    with pytest.raises(ValidationError):
+        Comment(**comment(INT4_MAX, INT4_MAX))
+
+
+def overlapping(spans: list[tuple[int, int]], range_from, range_to) -> list[tuple[int, int]]:
+    async def scenario():
+        conn = await asyncpg.connect(TEST_DATABASE_URL)
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            for start, end in spans:
+                await CommentsDAO.create("f", start, end, "s", "p", "o", "author", db_pool=conn)
+            rows = await CommentsDAO.get_overlapping("f", range_from, range_to, db_pool=conn)
+            return [(row["start_index"], row["end_index"]) for row in rows]
+        finally:
+            await transaction.rollback()
+            await conn.close()
+
+    return asyncio.run(scenario())
+
+
+SPANS = [(0, 5), (5, 10), (7, 7), (10, 10)]
+
+
+@requires_database
+@pytest.mark.parametrize(
+    "range_from, range_to, expected",
+    [
+        (7, 7, [(5, 10), (7, 7)]),
+        (5, 9, [(5, 10), (7, 7)]),
+        (0, 5, [(0, 5)]),
+        (10, 10, [(10, 10)]),
+        (10, None, [(10, 10)]),
+        (None, None, SPANS),
+    ],
+)
+def test_point_comments_are_found_by_range(range_from, range_to, expected):
+    assert overlapping(SPANS, range_from, range_to) == expected
+
+
+@requires_database
+def test_point_span_at_max_text_index():
+    spans = [(MAX_TEXT_INDEX, MAX_TEXT_INDEX)]
+    assert overlapping(spans, MAX_TEXT_INDEX, MAX_TEXT_INDEX) == spans
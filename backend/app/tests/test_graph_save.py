@@ -0,0 +1,163 @@
+import asyncio
+import urllib.parse
+
+import httpx
+import orjson
+import pytest
+from dependency_injector import providers
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.v1.competencies import router
+from dao.competency_dao import CompetencyDAO
+from dependencies import Container
+from dependencies.graphdb import GraphDBClient, parse_n_triples
+from services.graph_snapshot import GraphVersionConflict
+
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+RDFS_CLASS = "http://www.w3.org/2000/01/rdf-schema#Class"
+HAS = "http://e/has"
+
+
+def uri(name: str) -> str:
+    return f"http://e/{name}"
+
+
+class FakeGraphDB:
+    """Репозиторий GraphDB в памяти: SELECT по триплетам и транзакции RDF4J с фиксацией"""
+
+    def __init__(self, triples):
+        # (s, p, o, o - литерал)
+        self.triples = set(triples)
+        self.transactions = 0
+        self._pending = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/transactions"):
+            self.transactions += 1
+            self._pending = []
+            return httpx.Response(201, headers={"Location": "http://g/repositories/r/transactions/1"})
+        if "/transactions/" in path:
+            return self._transaction(request)
+        query = urllib.parse.parse_qs(request.content.decode())["query"][0]
+        rows = self.triples
+        if "VALUES ?s" in query:
+            # Описания узлов: rdf:type и rdfs:label перечисленных субъектов
+            rows = {row for row in rows if f"<{row[0]}>" in query and row[1] in (RDF_TYPE, RDFS_LABEL)}
+        bindings = [
+            {
+                "s": {"type": "uri", "value": s},
+                "p": {"type": "uri", "value": p},
+                "o": {"type": "literal" if is_literal else "uri", "value": o},
+            }
+            for s, p, o, is_literal in rows
+        ]
+        return httpx.Response(200, content=orjson.dumps({"results": {"bindings": bindings}}))
+
+    def _transaction(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "DELETE":
+            self._pending = []
+            return httpx.Response(204)
+        action = request.url.params["action"]
+        if action in ("ADD", "DELETE"):
+            for line in request.content.decode().splitlines():
+                s, p, o = parse_n_triples(line)
+                self._pending.append((action, (s["value"], p["value"], o["value"], o["type"] == "literal")))
+        elif action == "COMMIT":
+            for action, triple in self._pending:
+                if action == "ADD":
+                    self.triples.add(triple)
+                else:
+                    self.triples.discard(triple)
+            self._pending = []
+        return httpx.Response(204)
+
+
+def node_triples(name: str):
+    return [(uri(name), RDF_TYPE, RDFS_CLASS, False), (uri(name), RDFS_LABEL, name.upper(), True)]
+
+
+def link(source: str, target: str):
+    return uri(source), HAS, uri(target), False
+
+
+@pytest.fixture
+def graphdb():
+    store = FakeGraphDB(
+        [triple for name in "abc" for triple in node_triples(name)]
+        + [link("a", "b"), link("a", "c"), link("b", "c")]
+    )
+    container = Container()
+    http = httpx.AsyncClient(transport=httpx.MockTransport(store.handler))
+    container.graphdb_client.override(providers.Object(GraphDBClient(http, "http://g/repositories/r")))
+    # Журнал изменений и версии недоступны: их ошибки только логируются
+    container.db_pool.override(providers.Object(None))
+    container.wire(packages=["api.v1", "dao"])
+    yield store, container
+    container.unwire()
+
+
+def graph_data(nodes, links):
+    return {
+        "nodes": [{"id": uri(name), "label": name.upper(), "type": "class"} for name in nodes],
+        "links": [{"source": uri(s), "predicate": HAS, "target": uri(t)} for s, t in links],
+    }
+
+
+def test_partial_save_removes_only_stale_links_of_sent_nodes(graphdb):
+    store, container = graphdb
+
+    async def scenario():
+        etag = (await container.graph_snapshot().get(CompetencyDAO.load_graph_view)).etag
+        return await CompetencyDAO.save_graph_to_db(graph_data("a", [("a", "b")]), if_match=etag)
+
+    result = asyncio.run(scenario())
+    assert result["added"] == []
+    assert [(t["subject"], t["object"]) for t in result["removed"]] == [(uri("a"), uri("c"))]
+    # Связь b -> c исходит из узла, которого нет в запросе
+    assert link("b", "c") in store.triples
+    assert link("a", "c") not in store.triples
+    assert set(node_triples("c")) <= store.triples
+
+
+def test_stale_if_match_conflicts_without_writing(graphdb):
+    store, container = graphdb
+    before = set(store.triples)
+
+    async def scenario():
+        etag = (await container.graph_snapshot().get(CompetencyDAO.load_graph_view)).etag
+        container.graph_snapshot().apply(added=[(uri("c"), HAS, uri("a"), True)])
+        await CompetencyDAO.save_graph_to_db(graph_data("a", [("a", "b")]), if_match=etag)
+
+    with pytest.raises(GraphVersionConflict):
+        asyncio.run(scenario())
+    assert store.transactions == 0
+    assert store.triples == before
+
+
+def test_save_endpoint_requires_current_etag(graphdb):
+    store, container = graphdb
+    app = FastAPI()
+    app.include_router(router)
+
+    @app.middleware("http")
+    async def authenticate(request, call_next):
+        request.state.user_id = 1
+        return await call_next(request)
+
+    data = graph_data("ab", [("a", "b")])
+    with TestClient(app) as client:
+        assert client.post("/competencies/graph", json=data).status_code == 428
+
+        etag = client.get("/competencies/graph").headers["etag"]
+        response = client.post("/competencies/graph", json=data, headers={"If-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["removed"] == 2
+        assert response.headers["etag"] != etag
+        assert response.headers["etag"] == client.get("/competencies/graph").headers["etag"]
+
+        assert client.post("/competencies/graph", json=data, headers={"If-Match": etag}).status_code == 409
+        assert client.post("/competencies/graph", json=data, headers={"If-Match": "*"}).status_code == 200
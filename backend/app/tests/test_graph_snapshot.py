@@ -0,0 +1,213 @@
+import asyncio
+
+from services.graph_snapshot import GraphSnapshotCache, GraphView, etag_matches
+
+
+def make_node(uri: str) -> dict:
+    return {"id": uri}
+
+
+def view_of(*rows) -> GraphView:
+    view = GraphView(make_node)
+    for row in rows:
+        view.add(row)
+    return view
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    """Дать запущенным задачам дойти до ожидания"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+AB = ("a", "p", "b", True)
+AL = ("a", "label", "A", False)
+BC = ("b", "p", "c", True)
+
+
+def test_view_tracks_nodes_and_links_by_reference():
+    view = view_of(AB, AL, AB)
+    assert len(view) == 2
+    assert {node["id"] for node in view.payload()["nodes"]} == {"a", "b"}
+    assert view.payload()["links"] == [{"source": "a", "target": "b", "predicate": "p"}]
+
+    view.remove(AB)
+    view.remove(AB)
+    assert {node["id"] for node in view.payload()["nodes"]} == {"a"}
+    assert view.payload()["links"] == []
+
+    # URI, который встречается как предикат, не узел
+    view.add(("x", "a", "y", True))
+    assert "a" not in {node["id"] for node in view.payload()["nodes"]}
+    assert view.predicates() == {"label", "a"}
+
+
+def test_loader_runs_once_per_generation():
+    async def scenario():
+        cache = GraphSnapshotCache()
+        loads = []
+
+        async def loader():
+            loads.append(cache.generation)
+            return view_of(AB)
+
+        first = await cache.get(loader)
+        assert await cache.get(loader) is first
+        assert loads == [0]
+        assert first.etag == (await cache.get(loader)).etag
+
+    run(scenario())
+
+
+def test_apply_updates_up_to_date_snapshot_in_place():
+    async def scenario():
+        cache = GraphSnapshotCache()
+        loads = []
+
+        async def loader():
+            loads.append(cache.generation)
+            return view_of(AB)
+
+        before = await cache.get(loader)
+        generation = cache.apply(added=[BC], removed=[AB])
+        after = await cache.get(loader)
+
+        assert generation == cache.generation == 1
+        assert after.generation == 1
+        assert after.payload["links"] == [{"source": "b", "target": "c", "predicate": "p"}]
+        assert after.etag != before.etag
+        assert loads == [0]
+
+        cache.apply(reset=True)
+        assert (await cache.get(loader)).payload == {"nodes": [], "links": []}
+        assert loads == [0]
+
+    run(scenario())
+
+
+def test_stale_snapshot_is_rebuilt_instead_of_patched():
+    async def scenario():
+        cache = GraphSnapshotCache()
+        graph = [AB]
+
+        async def loader():
+            return view_of(*graph)
+
+        await cache.get(loader)
+        cache.invalidate()  # запись с неизвестной дельтой
+        graph.append(BC)
+        # Дельта поверх устаревшего снимка не применяется
+        cache.apply(added=[("x", "p", "y", True)])
+        snapshot = await cache.get(loader, fresh=True)
+        assert snapshot.generation == cache.generation == 2
+        assert len(snapshot.payload["links"]) == 2
+
+    run(scenario())
+
+
+def test_rebuild_started_before_a_write_is_not_served_after_it():
+    async def scenario():
+        cache = GraphSnapshotCache()
+        graph = [AB]
+        gates = []
+
+        async def loader():
+            rows = list(graph)
+            gate = asyncio.Event()
+            gates.append(gate)
+            await gate.wait()
+            return view_of(*rows)
+
+        cold = asyncio.ensure_future(cache.get(loader))
+        await settle()
+
+        # Запись завершилась, пока строился снимок поколения 0
+        graph.append(BC)
+        cache.invalidate()
+        after_write = asyncio.ensure_future(cache.get(loader))
+        await settle()
+        assert len(gates) == 2
+
+        gates[0].set()
+        assert (await cold).generation == 0
+        await settle()
+        assert not after_write.done()
+
+        gates[1].set()
+        snapshot = await after_write
+        assert snapshot.generation == 1
+        assert len(snapshot.payload["links"]) == 2
+
+    run(scenario())
+
+
+def test_readers_get_previous_buffer_while_rebuilding():
+    async def scenario():
+        cache = GraphSnapshotCache()
+        gate = asyncio.Event()
+        loads = 0
+
+        async def loader():
+            nonlocal loads
+            loads += 1
+            if loads > 1:
+                await gate.wait()
+            return view_of(AB)
+
+        previous = await cache.get(loader)
+        cache.invalidate()
+        rebuilding = asyncio.ensure_future(cache.get(loader))
+        await settle()
+
+        assert await cache.get(loader) is previous
+        fresh = asyncio.ensure_future(cache.get(loader, fresh=True))
+        await settle()
+        assert not fresh.done()
+
+        gate.set()
+        assert (await fresh).generation == 1
+        assert (await rebuilding).generation == 1
+        assert loads == 2
+
+    run(scenario())
+
+
+def test_predicates_are_memoized_per_generation():
+    async def scenario():
+        cache = GraphSnapshotCache()
+        calls = 0
+
+        async def load_predicates():
+            nonlocal calls
+            calls += 1
+            return ["p", "q"]
+
+        assert await cache.predicates(load_predicates) == {"p", "q"}
+        assert await cache.predicates(load_predicates) == {"p", "q"}
+        assert calls == 1
+        cache.invalidate()
+        await cache.predicates(load_predicates)
+        assert calls == 2
+
+        async def loader():
+            return view_of(AB)
+
+        await cache.get(loader)
+        assert await cache.predicates(load_predicates) == {"p"}
+        assert calls == 2
+
+    run(scenario())
+
+
+def test_etag_matches():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"x", "abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"x"', etag)
+    assert not etag_matches(None, etag)
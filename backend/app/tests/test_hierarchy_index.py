@@ -0,0 +1,196 @@
+import random
+
+import pytest
+
+from services.hierarchy_index import HAS_SUB_COMPETENCE, RDFS_LABEL, HierarchyIndex, level_predicates
+
+
+NS = "http://example.org/ns#"
+LEVEL = {level: uri for uri, level in level_predicates(NS).items()}
+
+
+def edge(parent: str, child: str) -> dict:
+    return {"subject": parent, "predicate": HAS_SUB_COMPETENCE, "object": child, "object_type": "uri"}
+
+
+def label(uri: str, value: str) -> dict:
+    return {"subject": uri, "predicate": RDFS_LABEL, "object": value, "object_type": "literal"}
+
+
+def level(uri: str, n: int, value: str = "1") -> dict:
+    return {"subject": uri, "predicate": LEVEL[n], "object": value, "object_type": "literal"}
+
+
+def reachable(edges: set[tuple[str, str]], uri: str, reverse: bool = False) -> set[str]:
+    """Эталон: замыкание обходом по списку рёбер"""
+    found, stack = set(), [uri]
+    while stack:
+        node = stack.pop()
+        for parent, child in edges:
+            source, target = (child, parent) if reverse else (parent, child)
+            if source == node and target not in found:
+                found.add(target)
+                stack.append(target)
+    return found
+
+
+def random_dag(seed: int, nodes: int = 40, edges: int = 90) -> set[tuple[str, str]]:
+    rng = random.Random(seed)
+    result = set()
+    for _ in range(edges):
+        a, b = sorted(rng.sample(range(nodes), 2))
+        result.add((f"n{a:02}", f"n{b:02}"))
+    return result
+
+
+def build(edges, labels=(), levels=(), **kwargs) -> HierarchyIndex:
+    index = HierarchyIndex(NS, **kwargs)
+    index.begin_build()
+    index.finish_build(list(edges), list(labels), list(levels))
+    return index
+
+
+def assert_matches(index: HierarchyIndex, edges: set[tuple[str, str]]) -> None:
+    nodes = {uri for pair in edges for uri in pair}
+    for uri in nodes:
+        assert set(index.descendants(uri)) == reachable(edges, uri)
+        assert set(index.ancestors(uri)) == reachable(edges, uri, reverse=True)
+        for other in nodes:
+            assert index.is_descendant(other, uri) == (other in reachable(edges, uri))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_labeling_matches_traversal(seed):
+    edges = random_dag(seed)
+    index = build(edges)
+    assert index.ready
+    assert index.edge_count == len(edges)
+    assert_matches(index, edges)
+
+
+def test_descendants_page_slices_scan():
+    edges = random_dag(7)
+    index = build(edges)
+    full = index.descendants("n00")
+    assert index.descendants("n00", 2, 3) == full[2:5]
+    assert index.descendants("missing") == []
+
+
+@pytest.mark.parametrize("threshold", [1, 3, 10000])
+def test_overlay_and_compaction(threshold):
+    rng = random.Random(threshold)
+    edges = random_dag(threshold)
+    index = build(edges, compact_threshold=threshold)
+    for _ in range(30):
+        parent, child = sorted(rng.sample(range(45), 2))
+        pair = (f"n{parent:02}", f"n{child:02}")
+        if pair in edges and rng.random() < 0.5:
+            edges.discard(pair)
+            index.apply(removed=[edge(*pair)])
+        else:
+            edges.add(pair)
+            index.apply(added=[edge(*pair)])
+        assert index.edge_count == len(edges)
+    assert_matches(index, edges)
+
+
+def test_repeated_edge_changes_are_idempotent():
+    index = build({("a", "b")})
+    index.apply(added=[edge("a", "b"), edge("b", "c")])
+    index.apply(added=[edge("b", "c")])
+    assert index.edge_count == 2
+    index.apply(removed=[edge("b", "c"), edge("b", "c"), edge("x", "y")])
+    assert index.edge_count == 1
+    assert index.descendants("a") == ["b"]
+
+
+def test_changes_during_build_are_replayed():
+    index = HierarchyIndex(NS)
+    index.begin_build()
+    index.apply(added=[edge("b", "c")])
+    index.apply(removed=[edge("a", "b")])
+    # Загрузка прочитала граф до этих изменений
+    index.finish_build([("a", "b")], [])
+    assert set(index.descendants("a")) == set()
+    assert index.descendants("b") == ["c"]
+
+
+def test_reset_clears_index():
+    index = build({("a", "b")}, labels=[("a", "A")])
+    index.apply(reset=True)
+    assert index.edge_count == 0
+    assert index.label("a") == "a"
+
+
+def test_labels_and_levels_track_every_triple():
+    index = build(set(), labels=[("a", "A"), ("a", "Alpha")], levels=[("a", 2, "x")])
+    assert index.label("a") in {"A", "Alpha"}
+    index.apply(removed=[label("a", "A")])
+    assert index.label("a") == "Alpha"
+    index.apply(removed=[label("a", "Alpha"), label("a", "Alpha")])
+    assert index.label("a") == "a"
+
+    # Уровень держится, пока есть хотя бы один триплет :hasLevelN
+    index.apply(added=[level("a", 1, "x"), level("a", 1, "y"), level("a", 1, "y")])
+    assert index.level("a") == 1
+    index.apply(removed=[level("a", 1, "x")])
+    assert index.level("a") == 1
+    index.apply(removed=[level("a", 1, "y")])
+    assert index.level("a") == 2
+    index.apply(removed=[level("a", 2, "x")])
+    assert index.level("a") is None
+
+
+def test_cycle_falls_back_to_traversal():
+    edges = {("a", "b"), ("b", "c"), ("c", "a"), ("c", "d")}
+    index = build(edges)
+    assert set(index.descendants("a")) == {"a", "b", "c", "d"}
+    assert index.is_descendant("d", "b")
+    assert not index.is_descendant("a", "d")
+
+    # После разрыва цикла разметка строится снова
+    index.apply(removed=[edge("c", "a")])
+    edges.discard(("c", "a"))
+    assert_matches(index, edges)
+
+
+def test_find_path():
+    index = build({("a", "b"), ("b", "c"), ("a", "x"), ("x", "y"), ("y", "c")})
+    assert index.find_path("a", "c") == ["a", "b", "c"]
+    assert index.find_path("a", "c", max_length=1) == []
+    assert index.find_path("c", "a") == []
+
+
+def test_related_page_seeks_from_cursor():
+    edges = random_dag(11)
+    index = build(edges)
+    keep = lambda uri: int(uri[1:]) % 2 == 0  # noqa: E731
+    for ancestors, uri in ((False, "n00"), (True, "n39")):
+        for predicate in (None, keep):
+            expected = sorted(u for u in reachable(edges, uri, reverse=ancestors) if predicate is None or predicate(u))
+            pages, after = [], None
+            while True:
+                page, has_more = index.related_page(uri, ancestors, 4, after, keep=predicate)
+                pages.extend(page)
+                if not has_more:
+                    break
+                after = page[-1]
+            assert pages == expected
+            assert index.related_page(uri, ancestors, 3, offset=2, keep=predicate)[0] == expected[2:5]
+
+    # Закэшированное замыкание сбрасывается при изменении рёбер
+    index.apply(added=[edge("n00", "zz")])
+    assert "zz" in index.related_page("n00", False, 1000)[0]
+
+
+def test_related_many_returns_first_uris_per_node():
+    edges = random_dag(13)
+    index = build(edges)
+    keep = lambda uri: int(uri[1:]) % 3 != 0  # noqa: E731
+    for ancestors in (False, True):
+        for predicate in (None, keep):
+            result = index.related_many(["n00", "n20", "n00", "missing"], ancestors, 5, predicate)
+            assert set(result) == {"n00", "n20", "missing"}
+            for uri, related in result.items():
+                expected = sorted(u for u in reachable(edges, uri, reverse=ancestors) if predicate is None or predicate(u))
+                assert related == expected[:5]
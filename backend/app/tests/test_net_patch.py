@@ -0,0 +1,87 @@
+from dao.competency_dao import CompetencyDAO
+
+
+E = "http://e/"
+
+
+def t(s: str, p: str, o: str) -> dict:
+    return {"subject": E + s, "predicate": E + p, "object": E + o}
+
+
+def key(s: str, p: str, o: str) -> tuple[str, str, str]:
+    return E + s, E + p, E + o
+
+
+def triples(result: list[dict]) -> set[tuple[str, str, str]]:
+    return {(triple["subject"], triple["predicate"], triple["object"]) for triple in result}
+
+
+def test_last_operation_per_triple_wins():
+    operations = [
+        {"op": "add", "triple": t("a", "p", "b")},
+        {"op": "add", "triple": t("a", "p", "c")},
+        {"op": "remove", "triple": t("a", "p", "b")},
+        {"op": "replace", "triple": t("x", "p", "y"), "new_triple": t("x", "p", "z")},
+    ]
+    added, removed, statuses = CompetencyDAO.net_patch(operations)
+    assert triples(added) == {key("a", "p", "c"), key("x", "p", "z")}
+    assert triples(removed) == {key("a", "p", "b"), key("x", "p", "y")}
+    assert statuses == ["superseded", "applied", "applied", "applied"]
+    assert all(triple["object_type"] == "uri" for triple in added + removed)
+
+
+def test_replace_superseded_only_when_both_triples_are_overridden():
+    operations = [
+        {"op": "replace", "triple": t("a", "p", "b"), "new_triple": t("a", "p", "c")},
+        {"op": "add", "triple": t("a", "p", "b")},
+    ]
+    added, removed, statuses = CompetencyDAO.net_patch(operations)
+    assert triples(added) == {key("a", "p", "b"), key("a", "p", "c")}
+    assert removed == []
+    assert statuses == ["applied", "applied"]
+
+    operations.append({"op": "remove", "triple": t("a", "p", "c")})
+    _, _, statuses = CompetencyDAO.net_patch(operations)
+    assert statuses == ["superseded", "applied", "applied"]
+
+
+def test_existing_state_turns_operations_into_noop():
+    operations = [
+        {"op": "add", "triple": t("a", "p", "b")},
+        {"op": "remove", "triple": t("a", "p", "missing")},
+        {"op": "replace", "triple": t("x", "p", "y"), "new_triple": t("x", "p", "z")},
+        {"op": "add", "triple": t("a", "p", "new")},
+    ]
+    existing = {key("a", "p", "b"), key("x", "p", "z")}
+    added, removed, statuses = CompetencyDAO.net_patch(operations, existing)
+    assert triples(added) == {key("a", "p", "new")}
+    assert removed == []
+    assert statuses == ["noop", "noop", "noop", "applied"]
+
+
+def test_partially_effective_replace_is_applied():
+    operations = [{"op": "replace", "triple": t("x", "p", "y"), "new_triple": t("x", "p", "z")}]
+    added, removed, statuses = CompetencyDAO.net_patch(operations, {key("x", "p", "y"), key("x", "p", "z")})
+    assert added == []
+    assert triples(removed) == {key("x", "p", "y")}
+    assert statuses == ["applied"]
+
+
+def test_superseded_operation_stays_superseded_with_existing_state():
+    operations = [
+        {"op": "add", "triple": t("a", "p", "b")},
+        {"op": "remove", "triple": t("a", "p", "b")},
+    ]
+    added, removed, statuses = CompetencyDAO.net_patch(operations, set())
+    assert added == [] and removed == []
+    assert statuses == ["superseded", "noop"]
+
+
+def test_patch_keys_lists_each_touched_triple_once():
+    operations = [
+        {"op": "add", "triple": t("a", "p", "b")},
+        {"op": "replace", "triple": t("a", "p", "b"), "new_triple": t("a", "p", "c")},
+        {"op": "remove", "triple": t("a", "p", "c"), "new_triple": None},
+    ]
+    assert CompetencyDAO.patch_keys(operations) == [key("a", "p", "b"), key("a", "p", "c")]
+    assert CompetencyDAO.net_patch([]) == ([], [], [])
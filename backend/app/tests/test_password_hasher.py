@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_runs_function_in_pool():
+    async def scenario():
+        hasher = PasswordHasher(workers=2, max_queue=2)
+        try:
+            assert await hasher.run(lambda a, b: a + b, 2, 3) == 5
+            with pytest.raises(ValueError):
+                await hasher.run(int, "not a number")
+            stats = hasher.stats()
+            assert stats["completed"] == 2
+            assert stats["failed"] == 1
+            assert stats["running"] == 0 and stats["queued"] == 0
+        finally:
+            hasher.shutdown()
+
+    run(scenario())
+
+
+def test_rejects_when_pool_and_queue_are_full():
+    async def scenario():
+        hasher = PasswordHasher(workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(hasher.run(release.wait))
+            queued = asyncio.ensure_future(hasher.run(release.wait))
+            await asyncio.sleep(0.05)
+            with pytest.raises(PasswordHasherBusy) as error:
+                await hasher.run(release.wait)
+            assert error.value.retry_after >= 1
+            assert hasher.stats()["rejected"] == 1
+
+            release.set()
+            await asyncio.gather(running, queued)
+            assert hasher.stats()["queued"] == 0
+        finally:
+            release.set()
+            hasher.shutdown()
+
+    run(scenario())
+
+
+def test_cancelled_queued_job_releases_its_slot():
+    async def scenario():
+        hasher = PasswordHasher(workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(hasher.run(release.wait))
+            queued = asyncio.ensure_future(hasher.run(release.wait))
+            await asyncio.sleep(0.05)
+            assert hasher.stats()["queued"] == 1
+
+            # Клиент отключился, пока задача ждала в очереди
+            queued.cancel()
+            await asyncio.gather(queued, return_exceptions=True)
+            assert hasher.stats()["queued"] == 0
+
+            release.set()
+            await running
+            stats = hasher.stats()
+            assert stats["running"] == 0 and stats["queued"] == 0
+            assert stats["completed"] == 1
+
+            # Место снова доступно на всю ёмкость пула
+            assert await asyncio.gather(hasher.run(abs, -1), hasher.run(abs, -2)) == [1, 2]
+        finally:
+            release.set()
+            hasher.shutdown()
+
+    run(scenario())
+
+
+def test_cancelled_running_job_holds_slot_until_done():
+    async def scenario():
+        hasher = PasswordHasher(workers=1, max_queue=0)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(hasher.run(release.wait))
+            await asyncio.sleep(0.05)
+            running.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+
+            # bcrypt не прерывается: поток занят, пока функция не вернётся
+            with pytest.raises(PasswordHasherBusy):
+                await hasher.run(abs, -1)
+
+            release.set()
+            for _ in range(100):
+                if hasher.stats()["running"] == 0 and hasher.stats()["queued"] == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert await hasher.run(abs, -1) == 1
+        finally:
+            release.set()
+            hasher.shutdown()
+
+    run(scenario())
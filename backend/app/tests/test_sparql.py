@@ -0,0 +1,116 @@
+import pytest
+
+from dao.sparql import (
+    EMPTY,
+    STANDARD_PREFIXES,
+    Fragment,
+    SparqlFragment,
+    SparqlTemplate,
+    iri,
+    literal,
+    reset_template_stats,
+    template_stats,
+)
+
+
+SELECT = SparqlTemplate("test.select", """
+    SELECT ?o
+    WHERE {
+        GRAPH $iri:graph { $iri:subject ?p ?o . }
+        VALUES ?p { $iris:predicates }
+        FILTER (STR(?o) = $literal:value)
+        $fragment:extra
+    }
+    LIMIT $int:limit
+""", prefixes=STANDARD_PREFIXES)
+FILTER = SparqlFragment("FILTER (?o != $iri:object)")
+
+
+def render(**overrides) -> str:
+    params = {
+        "graph": "http://g",
+        "subject": "http://e/a",
+        "predicates": ["http://e/p", "http://e/q"],
+        "value": "x",
+        "extra": EMPTY,
+        "limit": 10,
+    }
+    params.update(overrides)
+    return SELECT.render(**params)
+
+
+def test_render_substitutes_every_kind():
+    query = render(extra=FILTER.render(object="http://e/b"))
+    assert query.startswith("PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>")
+    assert "GRAPH <http://g> { <http://e/a> ?p ?o . }" in query
+    assert "VALUES ?p { <http://e/p> <http://e/q> }" in query
+    assert 'FILTER (STR(?o) = "x")' in query
+    assert "FILTER (?o != <http://e/b>)" in query
+    assert query.endswith("LIMIT 10")
+
+
+def test_literal_escaping():
+    assert literal('a"b\\c\nd\re') == '"a\\"b\\\\c\\nd\\re"'
+    assert 'STR(?o) = "} ; DROP ALL ; \\""' in render(value='} ; DROP ALL ; "')
+    with pytest.raises(ValueError):
+        literal("\ud800")
+    with pytest.raises(ValueError):
+        literal(5)
+
+
+@pytest.mark.parametrize("value", ["relative", "http://e/a b", "http://e/<a>", 'http://e/"', "http://e/{x}", "", None])
+def test_invalid_iri_rejected(value):
+    with pytest.raises(ValueError):
+        iri(value)
+    with pytest.raises(ValueError):
+        render(subject=value)
+
+
+def test_iris_rejects_plain_string_and_bad_members():
+    with pytest.raises(TypeError):
+        render(predicates="http://e/p")
+    with pytest.raises(ValueError):
+        render(predicates=["http://e/p", "bad iri"])
+
+
+def test_int_rejects_non_integers():
+    for value in ("10", 1.5, True):
+        with pytest.raises(ValueError):
+            render(limit=value)
+
+
+def test_fragment_must_be_rendered():
+    with pytest.raises(TypeError):
+        render(extra="FILTER (true)")
+    assert isinstance(FILTER.render(object="http://e/b"), Fragment)
+
+
+def test_parameters_must_match_template():
+    with pytest.raises(TypeError):
+        SELECT.render(graph="http://g")
+    with pytest.raises(TypeError):
+        render(unexpected=1)
+
+
+def test_template_registration_and_kind_conflicts():
+    with pytest.raises(ValueError):
+        SparqlTemplate("test.select", "SELECT * WHERE { ?s ?p ?o }")
+    with pytest.raises(ValueError):
+        SparqlFragment("$iri:x $literal:x")
+
+
+def test_execution_stats():
+    reset_template_stats()
+    with SELECT.execution() as execution:
+        execution.rows = 3
+    with pytest.raises(RuntimeError):
+        with SELECT.execution():
+            raise RuntimeError("boom")
+
+    stats = next(item for item in template_stats() if item["template"] == "test.select")
+    assert stats["calls"] == 2
+    assert stats["errors"] == 1
+    assert stats["rows"] == 3
+    reset_template_stats()
+    stats = next(item for item in template_stats() if item["template"] == "test.select")
+    assert stats["calls"] == 0
@@ -0,0 +1,52 @@
+import time
+
+from middlewares.auth import TokenIdentity, VerifiedTokenCache
+
+
+def identity(user_id: int, ttl: float = 60.0) -> TokenIdentity:
+    return TokenIdentity(user_id=user_id, email=f"user{user_id}@example.org", expires_at=time.time() + ttl)
+
+
+def test_returns_cached_identity():
+    cache = VerifiedTokenCache(maxsize=10)
+    cache.put("token-1", identity(1))
+    assert cache.get("token-1").user_id == 1
+    assert cache.get("token-2") is None
+
+
+def test_expired_entries_are_dropped():
+    cache = VerifiedTokenCache(maxsize=10)
+    cache.put("expired", identity(1, ttl=-1))
+    assert cache.get("expired") is None
+    assert len(cache) == 0
+
+    cache.put("short", identity(2, ttl=0.05))
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_used():
+    cache = VerifiedTokenCache(maxsize=2)
+    cache.put("a", identity(1))
+    cache.put("b", identity(2))
+    assert cache.get("a") is not None  # "a" становится свежее "b"
+    cache.put("c", identity(3))
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a").user_id == 1
+    assert cache.get("c").user_id == 3
+
+
+def test_zero_size_disables_cache():
+    cache = VerifiedTokenCache(maxsize=0)
+    cache.put("a", identity(1))
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_keys_are_token_hashes():
+    cache = VerifiedTokenCache(maxsize=10)
+    cache.put("secret-token", identity(1))
+    assert all(isinstance(key, bytes) and len(key) == 32 for key in cache._entries)
+    assert "secret-token" not in cache._entries
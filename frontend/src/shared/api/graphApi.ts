@@ -7,12 +7,22 @@ interface GraphData {
   links: RDFLink[];
 }
 
+// ETag графа из последнего ответа сервера: сохранение передаёт его в If-Match,
+// и сервер отвечает 409, если граф успели изменить другие пользователи
+let graphEtag: string | undefined;
+
 const postGraph = async (graphData: GraphData) => {
-  return api.post('/competencies/graph', graphData);
+  const response = await api.post('/competencies/graph', graphData, {
+    headers: graphEtag ? { 'If-Match': graphEtag } : {},
+  });
+  graphEtag = response.headers['etag'] ?? graphEtag;
+  return response;
 }
 
 const getGraph = async () => {
-  return api.get<GraphData>('/competencies/graph');
+  const response = await api.get<GraphData>('/competencies/graph');
+  graphEtag = response.headers['etag'];
+  return response;
 }
 
 export { postGraph, getGraph };